@@ -1,11 +1,16 @@
 from PyQt5 import QtCore
+from PyQt5.QtCore import QByteArray
 from PyQt5.QtSql import QSqlQuery
 from pyheatmy import *
+import numpy as np
 from numpy import shape
 
-from ..utils.general import databaseDateToDatetime, datetimeToDatabaseDate
+from ..utils.general import databaseDatesToDatetime64, databaseUsesResultGrids, datetime64ToDatabaseDates, encodeGrid, fetchColumns
 from .SPointCoordinator import SPointCoordinator
 
+# Number of dates per row of the ResultGrid table
+RESULT_GRID_CHUNK = 1024
+
 
 class ColumnMCMCRunner(QtCore.QObject):
     """
@@ -126,6 +131,7 @@ class Compute(QtCore.QObject):
     - Launch the computation :
         - with given parameters : compute.compute_direct_model(params: tuple, nb_cells: int, sensorDir: str)
         - with parameters inferred from MCMC : compute.compute_MCMC(nb_iter: int, priors: dict, nb_cells: str, sensorDir: str)
+    If the database was created in grid mode (see databaseUsesResultGrids), the temperatures and heat flows are saved as compressed grids in the ResultGrid table instead of one row per date and depth in the TemperatureAndHeatFlows table.
     """
 
     # signals which will be connected to the updateAllViews function
@@ -140,30 +146,25 @@ class Compute(QtCore.QObject):
         self.con = coordinator.con
         self.pointID = coordinator.pointID
         self.coordinator = coordinator
+        self.compact_results = databaseUsesResultGrids(self.con)
         self.col = None
 
     def set_column(self):
         """
         Create the Column object associated to the current Point.
         """
-        press = []
-        temperatures = []
         cleaned_measures = self.coordinator.build_cleaned_measures(full_query=True)
-        if (not cleaned_measures.exec()) : print(cleaned_measures.lastError())
-        while cleaned_measures.next():
-            # Warning: temperatures are stored in °C. However, phyheatmy requires K to work!
-            temperatures.append(
-                [
-                    databaseDateToDatetime(cleaned_measures.value(0)),
-                    [cleaned_measures.value(i) + 273.15 for i in range(1, 5)],
-                ]
-            )  # Date and 4 Temperatures
-            press.append(
-                [
-                    databaseDateToDatetime(cleaned_measures.value(0)),
-                    [cleaned_measures.value(6), cleaned_measures.value(5) + 273.15],
-                ]
-            )  # Date, Pressure, Temperature
+        dates, temp1, temp2, temp3, temp4, tempBed, pressure = fetchColumns(
+            cleaned_measures, [object] + [np.float64] * 6, self.con.databaseName()
+        )
+        dates = databaseDatesToDatetime64(dates).tolist()  # datetime objects
+        # Warning: temperatures are stored in °C. However, phyheatmy requires K to work!
+        temperatures = [
+            [date, values] for date, values in zip(dates, (np.column_stack([temp1, temp2, temp3, temp4]) + 273.15).tolist())
+        ]  # Date and 4 Temperatures
+        press = [
+            [date, values] for date, values in zip(dates, np.column_stack([pressure, tempBed + 273.15]).tolist())
+        ]  # Date, Pressure, Temperature
 
         column_infos = self.build_column_infos()
         if (not column_infos.exec()) : print(column_infos.lastError())
@@ -328,10 +329,138 @@ class Compute(QtCore.QObject):
         if (not insertparams.exec()) : print(insertparams.lastError())
         self.con.commit()
 
+    def fetch_ids(self, table: str):
+        """
+        Return a dictionary giving, for the current point, the ID of every value of the Date or Depth table (the value column has the same name as the table).
+        If a value was stored several times, the first ID is kept, as a SELECT ... WHERE Value = ... would have returned it.
+        """
+        query = QSqlQuery(self.con)
+        query.prepare(
+            f"SELECT {table}.ID, {table}.{table} FROM {table} WHERE {table}.PointKey = {self.pointID} ORDER BY {table}.ID"
+        )
+        if (not query.exec()) : print(query.lastError())
+        ids = {}
+        while query.next():
+            ids.setdefault(query.value(1), query.value(0))
+        return ids
+
+    def date_ids_of(self, times, date_ids):
+        """
+        Return the list of the IDs of the times, given the dictionary date_ids returned by fetch_ids("Date").
+        All times are converted at once to the values stored in the database (strings or integer seconds, see SPointCoordinator.epoch_dates).
+        """
+        return [date_ids.get(date) for date in datetime64ToDatabaseDates(times, self.coordinator.epoch_dates).tolist()]
+
+    def exec_batch(self, query: QSqlQuery, columns: list[list], chunk_size=100000):
+        """
+        Execute the prepared query (with positional placeholders) once per row: columns holds the list of values of each placeholder.
+        The rows are bound by chunks of chunk_size so that large results don't need one huge list of QVariant.
+        """
+        nb_values = len(columns[0])
+        for start in range(0, nb_values, chunk_size):
+            for column in columns:
+                query.addBindValue(column[start : start + chunk_size])
+            if (not query.execBatch()) : print(query.lastError())
+
+    def insert_results(self, quantileID, times, depths, temperatures, date_ids, depth_ids, advecFlows=None, conduFlows=None):
+        """
+        Insert the temperatures (K, cells x times) of one quantile in the TemperatureAndHeatFlows table, with the heat flows if they are given.
+        date_ids and depth_ids come from fetch_ids: no query is made to find the Date and Depth of each row.
+        """
+        nb_rows, nb_cols = shape(temperatures)
+        dates = self.date_ids_of(times, date_ids)
+        cells = [depth_ids.get(float(depth)) for depth in depths]
+        # Rows are sorted by date then by depth, as the former loops did. Transposing before ravel gives this order,
+        # and tolist converts to python floats (SQL doesn't undestand np.float32 !)
+        columns = [
+            [date for date in dates for _ in range(nb_rows)],
+            cells * nb_cols,
+            (temperatures.T.astype(float).ravel() - 273.15).tolist(),  # Also convert to °C (pyheatmy returns K)
+        ]
+        if advecFlows is None:
+            # Note: we leave out the AdvectiveFlow, ConductiveFlow and TotalFlow for the quantiles. Why?
+            # Well theses values are not computed per quantile: instead, there are computed for the direct model.
+            # There is no need to store these values as they don't represent anything. Hence, we leave them out and they will be empty.
+            # This isn't a problem as they are never used: once again, only the values for the direct model are relevant.
+            insert = QSqlQuery(self.con)
+            insert.prepare(
+                "INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, PointKey, Quantile) VALUES (?, ?, ?, ?, ?)"
+            )
+        else:
+            insert = QSqlQuery(self.con)
+            insert.prepare(
+                """INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, AdvectiveFlow, ConductiveFlow, TotalFlow, PointKey, Quantile)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+            )
+            columns += [
+                advecFlows.T.astype(float).ravel().tolist(),
+                conduFlows.T.astype(float).ravel().tolist(),
+                (advecFlows + conduFlows).T.astype(float).ravel().tolist(),
+            ]
+        columns += [[self.pointID] * len(columns[0]), [quantileID] * len(columns[0])]
+        self.exec_batch(insert, columns)
+
+    def insert_grids(self, quantileID, depths, grids: dict, chunk_size=RESULT_GRID_CHUNK):
+        """
+        Insert the results of one quantile in the ResultGrid table. grids is a dictionary whose keys are the fields (Temperature, AdvectiveFlow, ConductiveFlow or TotalFlow) and values are arrays (cells x times) of the values to store.
+        Each grid is stored by chunks of chunk_size dates, with the depths sorted by increasing values as build_depths returns them.
+        """
+        order = np.argsort(depths)
+        insertGrid = QSqlQuery(self.con)
+        insertGrid.prepare(
+            "INSERT INTO ResultGrid (Field, FirstDate, NbDates, NbDepths, Data, PointKey, Quantile) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        )
+        for field, grid in grids.items():
+            grid = np.asarray(grid)[order].T  # dates x depths: a chunk of dates is contiguous
+            for start in range(0, grid.shape[0], chunk_size):
+                chunk = grid[start : start + chunk_size]
+                for value in (field, start, chunk.shape[0], chunk.shape[1], QByteArray(encodeGrid(chunk)), self.pointID, quantileID):
+                    insertGrid.addBindValue(value)
+                if (not insertGrid.exec()) : print(insertGrid.lastError())
+
+    def insert_water_flows(self, quantileID, times, waterFlows, date_ids):
+        """
+        Insert the water flows at the top of the column of one quantile in the WaterFlow table.
+        """
+        insertFlows = QSqlQuery(self.con)
+        insertFlows.prepare(
+            "INSERT INTO WaterFlow (WaterFlow, Date, PointKey, Quantile) VALUES (?, ?, ?, ?)"
+        )
+        nb_times = len(times)
+        self.exec_batch(
+            insertFlows,
+            [
+                [float(flow) for flow in waterFlows[:nb_times]],
+                self.date_ids_of(times, date_ids),
+                [self.pointID] * nb_times,
+                [quantileID] * nb_times,
+            ],
+        )
+
+    def insert_RMSE(self, quantileID, depthsensors, computedRMSE, depth_ids):
+        """
+        Insert the RMSE of one quantile at the three sensors in the RMSE table.
+        """
+        insertRMSE = QSqlQuery(self.con)
+        insertRMSE.prepare(
+            """INSERT INTO RMSE (Depth1, Depth2, Depth3, RMSE1, RMSE2, RMSE3, RMSETotal, PointKey, Quantile)
+                 VALUES (:Depth1, :Depth2, :Depth3, :RMSE1, :RMSE2, :RMSE3, :RMSETotal, :PointKey, :Quantile)"""
+        )
+        insertRMSE.bindValue(":PointKey", self.pointID)
+        insertRMSE.bindValue(":Quantile", quantileID)
+        for i in range(1, 4):
+            insertRMSE.bindValue(f":Depth{i}", depth_ids.get(float(depthsensors[i - 1])))
+            insertRMSE.bindValue(f":RMSE{i}", float(computedRMSE[i - 1]))
+        insertRMSE.bindValue(":RMSETotal", float(computedRMSE[3]))
+        if (not insertRMSE.exec()) : print(insertRMSE.lastError())
+
     def save_direct_model_results(self, save_dates=True):
         """
-        Query the database and save the direct model results.
+        Save the direct model results in the database.
+        Every row is written in a single transaction. The IDs of the dates and depths are read once and kept in memory,
+        so the rows are inserted by batches without looking up their Date and Depth.
         """
+        self.con.transaction()
         # Quantile 0
         insertquantiles = QSqlQuery(self.con)
         insertquantiles.prepare(
@@ -346,108 +475,47 @@ class Compute(QtCore.QObject):
         if save_dates:
             insertDepths = QSqlQuery(self.con)
             insertDepths.prepare(
-                "INSERT INTO Depth (Depth,PointKey) VALUES (:Depth, :PointKey)"
+                "INSERT INTO Depth (Depth,PointKey) VALUES (?, ?)"
             )
-            insertDepths.bindValue(":PointKey", self.pointID)
-            self.con.transaction()
-            for depth in depths:
-                insertDepths.bindValue(":Depth", float(depth))
-                if (not insertDepths.exec()) : print(insertDepths.lastError())
-            self.con.commit()
+            self.exec_batch(insertDepths, [[float(depth) for depth in depths], [self.pointID] * len(depths)])
 
-        # Temperature and heat flows
-        fetchDate = QSqlQuery(self.con)
-        fetchDate.prepare(
-            f"SELECT Date.ID FROM Date WHERE Date.PointKey = :PointKey AND Date.Date = :Date "
-        )
-        fetchDate.bindValue(":PointKey", self.pointID)
-        fetchDepth = QSqlQuery(self.con)
-        fetchDepth.prepare(
-            f"SELECT Depth.ID FROM Depth WHERE Depth.PointKey = :PointKey AND Depth.Depth = :Depth"
-        )
-        fetchDepth.bindValue(":PointKey", self.pointID)
+        date_ids = self.fetch_ids("Date")
+        depth_ids = self.fetch_ids("Depth")
+        times = self.col.get_times_solve()
 
+        # Temperature and heat flows
+        # We assume solvedtemperatures,advecFlows and conduFlows have the same shapes, and that the dates and depths are also identical, ie the first column of all three arrays corrresponds to the same fixed date.
         solvedtemperatures = self.col.get_temperatures_solve()
         advecFlows = self.col.get_advec_flows_solve()
         conduFlows = self.col.get_conduc_flows_solve()
-        times = self.col.get_times_solve()
-
-        inserttemperatures = QSqlQuery(self.con)
-        inserttemperatures.prepare(
-            """INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, AdvectiveFlow, ConductiveFlow, TotalFlow, PointKey, Quantile)
-            VALUES (:Date, :Depth, :Temperature, :AdvectiveFlow, :ConductiveFlow, :TotalFlow, :PointKey, :Quantile)"""
-        )
-        inserttemperatures.bindValue(":PointKey", self.pointID)
-        inserttemperatures.bindValue(":Quantile", quantileID)
-        # We assume solvedtemperatures,advecFlows and conduFlows have the same shapes, and that the dates and depths are also identical, ie the first column of all three arrays corrresponds to the same fixed date.
-
-        nb_rows, nb_cols = shape(solvedtemperatures)
-        self.con.transaction()
-        for j in range(nb_cols):
-            fetchDate.bindValue(":Date", datetimeToDatabaseDate(times[j]))
-            if (not fetchDate.exec()) : print(fetchDate.lastError())
-            fetchDate.next()
-            inserttemperatures.bindValue(":Date", fetchDate.value(0))
-            for i in range(nb_rows):
-                fetchDepth.bindValue(":Depth", float(depths[i]))
-                if (not fetchDepth.exec()) : print(fetchDepth.lastError())
-                fetchDepth.next()
-                inserttemperatures.bindValue(":Depth", fetchDepth.value(0))
-                # We need to convert into float, as SQL doesn't undestand np.float32 !
-                inserttemperatures.bindValue(
-                    ":Temperature", float(solvedtemperatures[i, j]) - 273.15
-                )  # Also convert to °C (pyheatmy returns K)
-                inserttemperatures.bindValue(":AdvectiveFlow", float(advecFlows[i, j]))
-                inserttemperatures.bindValue(":ConductiveFlow", float(conduFlows[i, j]))
-                inserttemperatures.bindValue(
-                    ":TotalFlow", float(advecFlows[i, j] + conduFlows[i, j])
-                )
-                if (not inserttemperatures.exec()) : print(inserttemperatures.lastError())
-        self.con.commit()
+        if self.compact_results:
+            self.insert_grids(
+                quantileID,
+                depths,
+                {
+                    "Temperature": solvedtemperatures.astype(float) - 273.15,  # Also convert to °C (pyheatmy returns K)
+                    "AdvectiveFlow": advecFlows,
+                    "ConductiveFlow": conduFlows,
+                    "TotalFlow": advecFlows + conduFlows,
+                },
+            )
+        else:
+            self.insert_results(
+                quantileID, times, depths, solvedtemperatures, date_ids, depth_ids, advecFlows, conduFlows
+            )
 
         # Water flows
         waterFlows = self.col.get_flows_solve(
             depths[0]
         )  # Water flows at the top of the column.
-        insertFlows = QSqlQuery(self.con)
-        insertFlows.prepare(
-            "INSERT INTO WaterFlow (WaterFlow, Date, PointKey, Quantile) VALUES (:WaterFlow,:Date, :PointKey, :Quantile)"
-        )
-        insertFlows.bindValue(":PointKey", self.pointID)
-        insertFlows.bindValue(":Quantile", quantileID)
-        self.con.transaction()
-        for j in range(nb_cols):
-            fetchDate.bindValue(":Date", datetimeToDatabaseDate(times[j]))
-            if (not fetchDate.exec()) : print(fetchDate.lastError())
-            fetchDate.next()
-            insertFlows.bindValue(":WaterFlow", float(waterFlows[j]))
-            insertFlows.bindValue(":Date", fetchDate.value(0))
-            if (not insertFlows.exec()) : print(insertFlows.lastError())
-        self.con.commit()
+        self.insert_water_flows(quantileID, times, waterFlows, date_ids)
 
         # RMSE
         sensorsID = self.col.get_id_sensors()
         depthsensors = [
             depths[i - 1] for i in sensorsID
         ]  # Python indexing starts a 0 but cells are indexed starting at 1
-        computedRMSE = self.col.get_RMSE()
-        insertRMSE = QSqlQuery(self.con)
-        insertRMSE.prepare(
-            """INSERT INTO RMSE (Depth1, Depth2, Depth3, RMSE1, RMSE2, RMSE3, RMSETotal, PointKey, Quantile)
-                 VALUES (:Depth1, :Depth2, :Depth3, :RMSE1, :RMSE2, :RMSE3, :RMSETotal, :PointKey, :Quantile)"""
-        )
-        insertRMSE.bindValue(":PointKey", self.pointID)
-        insertRMSE.bindValue(":Quantile", quantileID)
-
-        self.con.transaction()
-        for i in range(1, 4):
-            fetchDepth.bindValue(":Depth", float(depthsensors[i - 1]))
-            if (not fetchDepth.exec()) : print(fetchDepth.lastError())
-            fetchDepth.next()
-            insertRMSE.bindValue(f":Depth{i}", fetchDepth.value(0))
-            insertRMSE.bindValue(f":RMSE{i}", float(computedRMSE[i - 1]))
-        insertRMSE.bindValue(":RMSETotal", float(computedRMSE[3]))
-        if (not insertRMSE.exec()) : print(insertRMSE.lastError())
+        self.insert_RMSE(quantileID, depthsensors, self.col.get_RMSE(), depth_ids)
         self.con.commit()
 
     def compute_MCMC(
@@ -515,15 +583,15 @@ class Compute(QtCore.QObject):
 
     def save_MCMC_results(self):
         """
-        Query the database and save the MCMC results (distributions and quantiles)
-        Reuse Depths ID, Dates ID and Layers ID stored for direct model results.
+        Save the MCMC results (distributions and quantiles) in the database, in a single transaction.
+        Reuse Depths ID, Dates ID and Layers ID stored for direct model results: they are read once, then the rows are inserted by batches.
         """
         # TODO : BestParameters table no more used. To be restored ?
 
 
         # Quantiles for the MCMC
         
-        # WARNING: Quantile 0 (best parameters) is already stored by direct model
+        # WARNING: Quantile 0 (best parameters) is already stored by direct model
         #          Only store other quantiles
         quantiles = self.col.get_quantiles()
 
@@ -535,110 +603,48 @@ class Compute(QtCore.QObject):
             depths[i - 1] for i in sensorsID
         ]  # Python indexing starts at 0 but cells are indexed starting at 1
 
+        self.con.transaction()
+        # Dates and Depths (already existing)
+        date_ids = self.fetch_ids("Date")
+        depth_ids = self.fetch_ids("Depth")
+
         # Quantile
         insertquantiles = QSqlQuery(self.con)
         insertquantiles.prepare(
             f"INSERT INTO Quantile (Quantile, PointKey) VALUES (:Quantile,{self.pointID})"
         )
-        # Layers, Dates and Depths (already existing)
-        fetchLayer = QSqlQuery(self.con)
-        fetchLayer.prepare(
-            f"SELECT Layer.ID FROM Layer WHERE Layer.PointKey = :PointKey AND Layer.Depth = :Depth "
-        )
-        fetchLayer.bindValue(":PointKey", self.pointID)
-        fetchDate = QSqlQuery(self.con)
-        fetchDate.prepare(
-            f"SELECT Date.ID FROM Date WHERE Date.PointKey = :PointKey AND Date.Date = :Date "
-        )
-        fetchDate.bindValue(":PointKey", self.pointID)
-        fetchDepth = QSqlQuery(self.con)
-        fetchDepth.prepare(
-            f"SELECT Depth.ID FROM Depth WHERE Depth.PointKey = :PointKey AND Depth.Depth = :Depth"
-        )
-        fetchDepth.bindValue(":PointKey", self.pointID)
-        # Temperature and heat flows
-        inserttemperatures = QSqlQuery(self.con)
-        inserttemperatures.prepare(
-            """INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, AdvectiveFlow, ConductiveFlow, TotalFlow, PointKey, Quantile)
-            VALUES (:Date, :Depth, :Temperature, :AdvectiveFlow, :ConductiveFlow, :TotalFlow, :PointKey, :Quantile)"""
-        )
-        inserttemperatures.bindValue(":PointKey", self.pointID)
-        # Water Flows
-        insertFlows = QSqlQuery(self.con)
-        insertFlows.prepare(
-            "INSERT INTO WaterFlow (WaterFlow, Date, PointKey, Quantile) VALUES (:WaterFlow,:Date, :PointKey, :Quantile)"
-        )
-        insertFlows.bindValue(":PointKey", self.pointID)
-        # RMSE
-        insertRMSE = QSqlQuery(self.con)
-        insertRMSE.prepare(
-            """INSERT INTO RMSE (Depth1, Depth2, Depth3, RMSE1, RMSE2, RMSE3, RMSETotal, PointKey, Quantile)
-                 VALUES (:Depth1, :Depth2, :Depth3, :RMSE1, :RMSE2, :RMSE3, :RMSETotal, :PointKey, :Quantile)"""
-        )
-        insertRMSE.bindValue(":PointKey", self.pointID)
 
         for quantile in quantiles:
             insertquantiles.bindValue(":Quantile", quantile)
             if (not insertquantiles.exec()) : print(insertquantiles.lastError())
             quantileID = insertquantiles.lastInsertId()
 
-            inserttemperatures.bindValue(":Quantile", quantileID)
-            # We assume solvedtemperatures,advecFlows and conduFlows have the same shapes, and that the dates and depths are also identical, ie the first column of all three arrays corresponds to the same fixed date.
+            # Temperatures
+            # We assume the temperatures of every quantile have the same shape, and that the dates and depths are those of the direct model.
             solvedtemperatures = self.col.get_temperatures_quantile(quantile)
-            nb_rows, nb_cols = shape(solvedtemperatures)  #!!!!!! A VOIR !!!!!!
-            self.con.transaction()
-            for j in range(nb_cols):
-                fetchDate.bindValue(":Date", datetimeToDatabaseDate(times[j]))
-                if (not fetchDate.exec()) : print(fetchDate.lastError())
-                fetchDate.next()
-                inserttemperatures.bindValue(":Date", fetchDate.value(0))
-                # Note: we leave out the AdvectiveFlow, ConductiveFlow and TotalFlow. Why?
-                # Well theses values are not computed per quantile: instead, there are computed for the direct model.
-                # There is no need to store these values as they don't represent anything. Hence, we leave them out and they will be empty.
-                # This isn't a problem as they are never used: once again, only the values for the direct model are relevant.
-                for i in range(nb_rows):
-                    fetchDepth.bindValue(":Depth", float(depths[i]))
-                    if (not fetchDepth.exec()) : print(fetchDepth.lastError())
-                    fetchDepth.next()
-                    inserttemperatures.bindValue(":Depth", fetchDepth.value(0))
-                    inserttemperatures.bindValue(
-                        ":Temperature", float(solvedtemperatures[i, j]) - 273.15
-                    )  # Need to convert into float, as SQL doesn't undestand np.float32 !
-                    if (not inserttemperatures.exec()) : print(inserttemperatures.lastError())
-            self.con.commit()
+            if self.compact_results:
+                self.insert_grids(quantileID, depths, {"Temperature": solvedtemperatures.astype(float) - 273.15})
+            else:
+                self.insert_results(quantileID, times, depths, solvedtemperatures, date_ids, depth_ids)
 
             # Water flows
             waterFlows = self.col.get_flows_quantile(quantile)[
                 0, :
             ]  # Water flows at the top of the column.
-            insertFlows.bindValue(":Quantile", quantileID)
-            self.con.transaction()
-            for j in range(nb_cols):
-                fetchDate.bindValue(":Date", datetimeToDatabaseDate(times[j]))
-                if (not fetchDate.exec()) : print(fetchDate.lastError())
-                fetchDate.next()
-                insertFlows.bindValue(":WaterFlow", float(waterFlows[j]))
-                insertFlows.bindValue(":Date", fetchDate.value(0))
-                if (not insertFlows.exec()) : print(insertFlows.lastError())
-            self.con.commit()
+            self.insert_water_flows(quantileID, times, waterFlows, date_ids)
 
             # RMSE
-            computedRMSE = self.col.get_RMSE_quantile(quantile)
-            insertRMSE.bindValue(":Quantile", quantileID)
-
-            self.con.transaction()
-            for i in range(1, 4):
-                fetchDepth.bindValue(":Depth", float(depthsensors[i - 1]))
-                if (not fetchDepth.exec()) : print(fetchDepth.lastError())
-                fetchDepth.next()
-                insertRMSE.bindValue(f":Depth{i}", fetchDepth.value(0))
-                insertRMSE.bindValue(f":RMSE{i}", float(computedRMSE[i - 1]))
-            insertRMSE.bindValue(":RMSETotal", float(computedRMSE[3]))
-            if (not insertRMSE.exec()) : print(insertRMSE.lastError())
-            self.con.commit()
+            self.insert_RMSE(quantileID, depthsensors, self.col.get_RMSE_quantile(quantile), depth_ids)
 
         # Parameter distributions
 
+        # Layers (already existing)
+        fetchLayer = QSqlQuery(self.con)
+        fetchLayer.prepare(
+            f"SELECT Layer.ID FROM Layer WHERE Layer.PointKey = :PointKey AND Layer.Depth = :Depth "
+        )
+        fetchLayer.bindValue(":PointKey", self.pointID)
+
         layer_depths = self.coordinator.layers_depths()
         all_params = self.col.get_all_params()
         current_params_index = 0
@@ -646,25 +652,22 @@ class Compute(QtCore.QObject):
         insertdistribution = QSqlQuery(self.con)
         insertdistribution.prepare(
             """INSERT INTO ParametersDistribution (Permeability, Porosity, ThermConduct, HeatCapacity, Layer, PointKey)
-                VALUES (:Permeability, :Porosity, :ThermConduct, :HeatCapacity, :Layer, :PointKey)"""
+                VALUES (?, ?, ?, ?, ?, ?)"""
         )
-        insertdistribution.bindValue(":PointKey", self.pointID)
 
-        self.con.transaction()
         for depth in layer_depths:
             fetchLayer.bindValue(":Depth", depth)
             if (not fetchLayer.exec()) : print(fetchLayer.lastError())
             fetchLayer.next()
 
-            all_params_layer = all_params[current_params_index]
-            for params in all_params_layer:
-                # Convert everything to float as the parameters are of type np.float
-                insertdistribution.bindValue(":Permeability", float(params[0]))
-                insertdistribution.bindValue(":Porosity", float(params[1]))
-                insertdistribution.bindValue(":ThermConduct", float(params[2]))
-                insertdistribution.bindValue(":HeatCapacity", float(params[3]))
-                insertdistribution.bindValue(":Layer", fetchLayer.value(0))
-                if (not insertdistribution.exec()) : print(insertdistribution.lastError())
+            # Convert everything to float as the parameters are of type np.float
+            all_params_layer = np.atleast_2d(np.asarray(all_params[current_params_index], dtype=float))
+            nb_params = all_params_layer.shape[0]
+            self.exec_batch(
+                insertdistribution,
+                [all_params_layer[:, k].tolist() for k in range(4)]
+                + [[fetchLayer.value(0)] * nb_params, [self.pointID] * nb_params],
+            )
             current_params_index += 1
         self.con.commit()
 
@@ -113,6 +113,54 @@ CREATE TABLE Datalogger (
     Labo INTEGER REFERENCES Labo (ID),
     UNIQUE(Relay, Name)
 );
+-- Table: ResultGrid
+-- Compact storage of the results: each row holds a chunk of consecutive dates of one field
+-- (Temperature, AdvectiveFlow, ConductiveFlow or TotalFlow) for one quantile, as a zlib-compressed
+-- float32 array of NbDates x NbDepths values (dates sorted by Date.Date, depths sorted by Depth.Depth).
+-- FirstDate is the index of the first date of the chunk. Databases created before this table
+-- are upgraded when opened: every IF NOT EXISTS statement of this file is executed again.
+CREATE TABLE IF NOT EXISTS ResultGrid (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Field VARCHAR NOT NULL,
+    FirstDate INTEGER NOT NULL,
+    NbDates INTEGER NOT NULL,
+    NbDepths INTEGER NOT NULL,
+    Data BLOB NOT NULL,
+    PointKey INTEGER REFERENCES Point (ID),
+    Quantile INTEGER REFERENCES Quantile (ID)
+);
+CREATE INDEX IF NOT EXISTS ResultGridQuantile ON ResultGrid (Quantile, Field, FirstDate);
+
+-- Table: DateStorage
+-- Optional epoch mode, chosen when the database is created: when this table holds a row with Epoch = 1, the
+-- measure dates (Date.Date and the Date field of the RawMeasures tables) are integer seconds since
+-- 1970/01/01 00:00:00 instead of YYYY/MM/DD HH:MM:SS strings. Without any row (databases created before
+-- this table, which are upgraded when opened) the dates are strings.
+CREATE TABLE IF NOT EXISTS DateStorage (ID INTEGER PRIMARY KEY AUTOINCREMENT, Epoch INTEGER NOT NULL);
+
+-- Table: ResultStorage
+-- Optional grid mode, chosen when the database is created: when this table holds a row with Grids = 1, the
+-- temperatures and heat flows computed for a point are saved as compressed chunks in the ResultGrid table instead
+-- of one row per date and depth in TemperatureAndHeatFlows. Without any row (the default, and databases created
+-- before this table) they are saved in TemperatureAndHeatFlows. The results of both formats can be read.
+CREATE TABLE IF NOT EXISTS ResultStorage (ID INTEGER PRIMARY KEY AUTOINCREMENT, Grids INTEGER NOT NULL);
+
+-- Indexes of the queries run when a sampling point is opened (see SPointCoordinator): they filter on the
+-- sampling point, the point or the quantile and sort by date or depth. The last columns of some indexes are
+-- only read by these queries, so that the table itself is not visited.
+-- Databases created before these indexes are upgraded when opened, as for the ResultGrid table.
+CREATE INDEX IF NOT EXISTS RawMeasuresTempSamplingPoint ON RawMeasuresTemp (SamplingPoint, Date);
+CREATE INDEX IF NOT EXISTS RawMeasuresPressSamplingPoint ON RawMeasuresPress (SamplingPoint, Date, Voltage, TempBed);
+CREATE INDEX IF NOT EXISTS RawMeasuresVoltSamplingPoint ON RawMeasuresVolt (SamplingPoint, Date);
+CREATE INDEX IF NOT EXISTS DatePoint ON Date (PointKey, Date);
+CREATE INDEX IF NOT EXISTS DepthPoint ON Depth (PointKey, Depth);
+CREATE INDEX IF NOT EXISTS CleanedMeasuresDate ON CleanedMeasures (Date);
+CREATE INDEX IF NOT EXISTS QuantilePoint ON Quantile (PointKey, Quantile);
+CREATE INDEX IF NOT EXISTS TemperatureAndHeatFlowsQuantile ON TemperatureAndHeatFlows (Quantile, Date, Depth, Temperature);
+CREATE INDEX IF NOT EXISTS WaterFlowQuantile ON WaterFlow (Quantile, Date, WaterFlow);
+CREATE INDEX IF NOT EXISTS RMSEQuantile ON RMSE (Quantile);
+CREATE INDEX IF NOT EXISTS LayerPoint ON Layer (PointKey, Depth);
+CREATE INDEX IF NOT EXISTS ParametersDistributionLayer ON ParametersDistribution (Layer);
 COMMIT TRANSACTION;
 PRAGMA foreign_keys = on;
 
@@ -1,101 +1,116 @@
 import numpy as np
 from ..interactions.MoloModel import MoloModel
-from ..utils.general import build_picture, databaseDateToDatetime
+from ..utils.general import build_picture, databaseDatesToDatetime64, datetime64ToDatabaseDates, fetchColumns
 
 """
 This file regroups different models used to display graphs in the window showing the sampling point results.
 """
 
-class PressureDataModel(MoloModel):
+class ColumnsModel(MoloModel):
     """
-    A model to display the pressure as given by the captors (raw or cleaned data).
+    A model whose queries are executed and read column by column into numpy arrays. If databaseName is the path of the database file, the columns are fetched in bulk (see fetchColumns).
     """
-    def __init__(self, queries):
+    def __init__(self, queries, databaseName : str = ""):
         super().__init__(queries)
-        self.array_data = []
+        self.databaseName = databaseName
+
+    def exec(self):
+        """
+        The queries are executed by fetch when the data is updated, so that each one runs only once.
+        """
+        self.update_data()
+        self.dataChanged.emit()
+
+    def fetch(self, query, dtypes : list):
+        return fetchColumns(query, dtypes, self.databaseName)
+
+    def fetch_dates(self, query):
+        """
+        Return the dates selected by the query as an array of datetime64, whether the database stores strings or integer seconds.
+        """
+        dates, = self.fetch(query, [object])
+        return databaseDatesToDatetime64(dates)
+
+class PressureDataModel(ColumnsModel):
+    """
+    A model to display the pressure as given by the captors (raw or cleaned data).
+    """
+    def __init__(self, queries, databaseName : str = ""):
+        super().__init__(queries, databaseName)
+        self.dates = np.array([], dtype="datetime64[s]")
+        self.pressure = np.array([])
 
     def update_data(self):
         try:
-            while self.queries[0].next():
-                self.array_data.append([self.queries[0].value(0),self.queries[0].value(1)]) #Date, Pressure
-            self.array_data = np.array(self.array_data)
+            dates, self.pressure = self.fetch(self.queries[0], [object, np.float64]) #Date, Pressure
+            self.dates = databaseDatesToDatetime64(dates)
         except Exception:
             #Empty query or invalid query: then revert any changes done. The model is empty: nothing will be displayed.
             self.reset_data()
 
     def get_pressure(self):
-        try:
-            return self.array_data[:,1]
-        except Exception:
-            return np.array([])
+        return self.pressure
 
     def get_dates(self):
-        try:
-            return databaseDateToDatetime(self.array_data[:,0])
-        except Exception:
-            return np.array([])
+        return self.dates
 
     def reset_data(self):
-        self.array_data = []
+        self.dates = np.array([], dtype="datetime64[s]")
+        self.pressure = np.array([])
 
-class TemperatureDataModel(MoloModel):
+class TemperatureDataModel(ColumnsModel):
     """
     A model to display the presure as given by the captors (raw or cleaned data).
     """
-    def __init__(self, queries):
-        super().__init__(queries)
-        self.array_data = []
+    def __init__(self, queries, databaseName : str = ""):
+        super().__init__(queries, databaseName)
+        self.dates = np.array([], dtype="datetime64[s]")
+        self.temperatures = []
 
     def update_data(self):
         try:
-            while self.queries[0].next():
-                self.array_data.append([self.queries[0].value(0),self.queries[0].value(1),self.queries[0].value(2),self.queries[0].value(3),self.queries[0].value(4),self.queries[0].value(5)]) #Date, Temp1 to 4, TempBed
-            self.array_data = np.array(self.array_data)
+            dates, *temperatures = self.fetch(self.queries[0], [object] + [np.float64]*5) #Date, Temp1 to 4, TempBed
+            self.dates = databaseDatesToDatetime64(dates)
+            if self.dates.shape[0] > 0:
+                self.temperatures = temperatures
         except Exception:
             #Empty query or invalid query: then revert any changes done. The model is empty: nothing will be displayed.
             self.reset_data()
 
     def get_temperatures(self):
-        try:
-            return [self.array_data[:, i] for i in range(1,6)]
-        except Exception:
+        if len(self.temperatures) == 0:
+            #The model is empty!
             return np.array([])
+        return self.temperatures
 
     def get_dates(self):
-        try:
-            return databaseDateToDatetime(self.array_data[:,0])
-        except Exception:
-            return np.array([])
+        return self.dates
 
     def reset_data(self):
-        self.array_data = []
+        self.dates = np.array([], dtype="datetime64[s]")
+        self.temperatures = []
 
-class WaterFluxModel(MoloModel):
+class WaterFluxModel(ColumnsModel):
     """
     A model to display the water fluxes.
     """
-    def __init__(self, queries):
-        super().__init__(queries)
+    def __init__(self, queries, databaseName : str = ""):
+        super().__init__(queries, databaseName)
         self.flows = {}
         self.dates=[]
 
     def update_data(self):
         try:
-            #Initialize data structures
-            self.queries[0].next()
-            if self.queries[0].value(0) is not None and self.queries[0].value(2) is not None:
-                #There is at least a valid query so the model should not be empty
-                self.dates.append(self.queries[0].value(0))
-                self.flows[self.queries[0].value(2)] = [self.queries[0].value(1)]
-                while self.queries[0].next():
-                    self.dates.append(self.queries[0].value(0)) #Dates
-                    self.flows[self.queries[0].value(2)].append(self.queries[0].value(1)) #Flow
-                for i in range(1,len(self.queries)):
-                    self.queries[i].next()
-                    self.flows[self.queries[i].value(2)] = [self.queries[i].value(1)]
-                    #Add the other flows for the different quantiles if they exist
-                    while self.queries[i].next():
-                        self.flows[self.queries[i].value(2)].append(self.queries[i].value(1))
+            for i, query in enumerate(self.queries):
+                dates, flows, quantiles = self.fetch(query, [object, np.float64, np.float64]) #Date, Flow, Quantile
+                if dates.shape[0] == 0:
+                    #No flows for this quantile. If this is the first query, the model is empty.
+                    if i == 0:
+                        break
+                    continue
+                if i == 0:
+                    self.dates = databaseDatesToDatetime64(dates)
+                self.flows[float(quantiles[0])] = flows
         except Exception:
             #Empty query or invalid query: then revert any changes done. The model is empty: nothing will be displayed.
             self.reset_data()
@@ -105,46 +120,47 @@ class WaterFluxModel(MoloModel):
         Return a dictionnary with keys beings the quantiles and values being the arrays of associated flows.
         """
         try :
-            return self.flows[0], {key:np.array(value) for index, (key,value) in enumerate(self.flows.items()) if key !=0}
+            return self.flows[0], {key:value for key, value in self.flows.items() if key !=0}
         except Exception:
             # Quantile 0 (direct model) doesn't exists
             return np.array([]), {}
 
     def get_dates(self):
-        return databaseDateToDatetime(np.array(self.dates))
+        return np.asarray(self.dates, dtype="datetime64[s]")
 
     def reset_data(self):
         self.flows = {}
         self.dates=[]
 
-class SolvedTemperatureModel(MoloModel):
+class SolvedTemperatureModel(ColumnsModel):
     """
     A model to representing the temperature, depth and time. Can be used for umbrellas, temperature heat map or temperature per depth.
     """
-    def __init__(self, queries):
-        super().__init__(queries)
+    def __init__(self, queries, databaseName : str = ""):
+        super().__init__(queries, databaseName)
         self.dates = []
         self.data = {}
         self.depths = []
+        self.grids = None
+
+    def new_queries(self, queries, grids=None):
+        """
+        If the temperatures are stored in the ResultGrid table, grids is the dictionnary returned by SPointCoordinator.result_grids and queries only holds the dates and depths queries.
+        """
+        self.grids = grids
+        super().new_queries(queries)
 
     def update_data(self):
         try:
-            while self.queries[0].next():
-                self.dates.append(self.queries[0].value(0))
-            self.dates = np.array(self.dates)
-            while self.queries[1].next():
-                self.depths.append(np.float64(self.queries[1].value(0)))
-            self.depths = np.array(self.depths)
-
-            for i in range(2,len(self.queries)):
-                query = self.queries[i]
-                query.next()
-                array_data = [np.float64(query.value(0))]
-                quantile = query.value(1)
-                while query.next():
-                    array_data.append(np.float64(query.value(0)))
-                array_data = build_picture(np.array(array_data), nb_cells= len(self.depths))
-                self.data[quantile] = array_data
+            self.dates = self.fetch_dates(self.queries[0])
+            self.depths, = self.fetch(self.queries[1], [np.float64])
+
+            if self.grids is not None:
+                self.data = dict(self.grids)
+            for query in self.queries[2:]:
+                temperatures, quantiles = self.fetch(query, [np.float64, np.float64]) #Temperature, Quantile
+                if temperatures.shape[0] > 0:
+                    self.data[float(quantiles[0])] = build_picture(temperatures, nb_cells= len(self.depths))
         except Exception:
             #Empty query or invalid query: then revert any changes done. The model is empty: nothing will be displayed.
             self.reset_data()
@@ -163,21 +179,21 @@ class SolvedTemperatureModel(MoloModel):
         return np.array(self.depths)
 
     def get_dates(self):
-        return databaseDateToDatetime(np.array(self.dates))
+        return np.asarray(self.dates, dtype="datetime64[s]")
 
     def get_depth_by_temp(self, nb_dates):
         """
         Return a list and a dictionnary:
         -the list corresponds to the depths array
-        -the dictionnary has as many keys as nb_dates: these are equally spaced dates. The values are the temperature values.
+        -the dictionnary has as many keys as nb_dates: these are equally spaced dates (strings in the database format). The values are the temperature values.
         """
         try:
             n = self.dates.shape[0]
             step = n // nb_dates
             result = {}
             for i in range(nb_dates):
-                date = self.dates[i*step]
-                result[date] = self.data[0][:,np.where(self.dates==date)[0][0]]
+                date = str(datetime64ToDatabaseDates(self.dates[i*step]))
+                result[date] = self.data[0][:,i*step]
             return self.depths,result
         except Exception:
             return np.array([]), {}
@@ -196,32 +212,38 @@ class SolvedTemperatureModel(MoloModel):
         self.data = {}
         self.depths = []
 
-class HeatFluxesModel(MoloModel):
+class HeatFluxesModel(ColumnsModel):
     """
     A model to display the three heat fluxes (advective, conductive, total)
     """
-    def __init__(self, queries):
-        super().__init__(queries)
+    def __init__(self, queries, databaseName : str = ""):
+        super().__init__(queries, databaseName)
         self.dates = []
-        self.array_data = []
         self.depths = []
+        self.grids = None
+
+    def new_queries(self, queries, grids=None):
+        """
+        If the heat flows are stored in the ResultGrid table, grids is a dictionnary giving the AdvectiveFlow, ConductiveFlow and TotalFlow arrays of the direct model (see SPointCoordinator.result_grids) and queries only holds the dates and depths queries.
+        """
+        self.grids = grids
+        super().new_queries(queries)
 
     def update_data(self):
         try:
-            while self.queries[0].next():
-                self.dates.append(self.queries[0].value(0))
-            self.dates = np.array(self.dates)
-            while self.queries[1].next():
-                self.depths.append(np.float64(self.queries[1].value(0)))
-            self.depths = np.array(self.depths)
-
-            while self.queries[2].next():
-                self.array_data.append([np.float64(self.queries[2].value(1)),np.float64(self.queries[2].value(2)),np.float64(self.queries[2].value(3))]) #Advective, conductive, total
-            self.array_data = np.array(self.array_data)
-
-            self.advective = build_picture(self.array_data[:,0],nb_cells =len(self.depths))
-            self.conductive = build_picture(self.array_data[:,1],nb_cells =len(self.depths))
-            self.total = build_picture(self.array_data[:,2],nb_cells =len(self.depths))
+            self.dates = self.fetch_dates(self.queries[0])
+            self.depths, = self.fetch(self.queries[1], [np.float64])
+
+            if self.grids is not None:
+                self.advective = self.grids["AdvectiveFlow"]
+                self.conductive = self.grids["ConductiveFlow"]
+                self.total = self.grids["TotalFlow"]
+                return
+
+            _, advective, conductive, total, _ = self.fetch(self.queries[2], [str] + [np.float64]*4) #Date, advective, conductive, total, depth
+            self.advective = build_picture(advective,nb_cells =len(self.depths))
+            self.conductive = build_picture(conductive,nb_cells =len(self.depths))
+            self.total = build_picture(total,nb_cells =len(self.depths))
         except Exception:
             #Empty query or invalid query: then revert any changes done. The model is empty: nothing will be displayed.
             self.reset_data()
@@ -230,7 +252,7 @@ class HeatFluxesModel(MoloModel):
         return np.array(self.depths)
 
     def get_dates(self):
-        return databaseDateToDatetime(np.array(self.dates))
+        return np.asarray(self.dates, dtype="datetime64[s]")
 
     def get_advective_flow(self):
         if len(self.advective) ==0:
@@ -252,18 +274,17 @@ class HeatFluxesModel(MoloModel):
 
     def reset_data(self):
         self.dates = []
-        self.array_data = []
         self.depths = []
         self.advective = []
         self.conductive = []
         self.total = []
 
-class ParamsDistributionModel(MoloModel):
+class ParamsDistributionModel(ColumnsModel):
     """
     A model to display the information about the parameters distribution.
     """
-    def __init__(self, queries):
-        super().__init__(queries)
+    def __init__(self, queries, databaseName : str = ""):
+        super().__init__(queries, databaseName)
         self.log10k = []
         self.porosity = []
         self.conductivity = []
@@ -271,15 +292,7 @@ class ParamsDistributionModel(MoloModel):
 
     def update_data(self):
         try:
-            while self.queries[0].next():
-                self.log10k.append(self.queries[0].value(0))
-                self.porosity.append(self.queries[0].value(1))
-                self.conductivity.append(self.queries[0].value(2))
-                self.capacity.append(self.queries[0].value(3))
-            self.log10k = np.array(self.log10k)
-            self.porosity = np.array(self.porosity)
-            self.conductivity = np.array(self.conductivity)
-            self.capacity = np.array(self.capacity)
+            self.log10k, self.porosity, self.conductivity, self.capacity = self.fetch(self.queries[0], [np.float64]*4)
         except Exception:
             #Empty query or invalid query: then revert any changes done. The model is empty: nothing will be displayed.
             self.reset_data()
@@ -1,9 +1,10 @@
 from PyQt5.QtSql import QSqlQueryModel, QSqlQuery, QSqlDatabase #QSqlDatabase in used only for type hints
+import numpy as np
 import pandas as pd
 
 from ..interactions.InnerMessages import ComputationsState
 from .GraphsModels import PressureDataModel, TemperatureDataModel, SolvedTemperatureModel, HeatFluxesModel, WaterFluxModel, ParamsDistributionModel
-from ..utils.general import databaseDateFormat, databaseDateToDatetime
+from ..utils.general import databaseDateFormat, databaseUsesEpochDates, databaseDatesToDatetime64, datetime64ToDatabaseDates, decodeGrid, fetchColumns
 
 class SPointCoordinator:
     """
@@ -24,14 +25,16 @@ class SPointCoordinator:
         self.samplingPointID = spointID_query.value(0)
 
         self.pointID = self.find_or_create_point_ID()
+        self.epoch_dates = databaseUsesEpochDates(self.con)
 
-        #Create all models (empty for now)
-        self.pressuremodel = PressureDataModel([])
-        self.tempmodel = TemperatureDataModel([])
-        self.tempmap_model = SolvedTemperatureModel([])
-        self.heatfluxes_model = HeatFluxesModel([])
-        self.waterflux_model = WaterFluxModel([])
-        self.paramsdistr_model = ParamsDistributionModel([])
+        #Create all models (empty for now). They read the results directly from the database file.
+        databaseName = self.con.databaseName()
+        self.pressuremodel = PressureDataModel([], databaseName)
+        self.tempmodel = TemperatureDataModel([], databaseName)
+        self.tempmap_model = SolvedTemperatureModel([], databaseName)
+        self.heatfluxes_model = HeatFluxesModel([], databaseName)
+        self.waterflux_model = WaterFluxModel([], databaseName)
+        self.paramsdistr_model = ParamsDistributionModel([], databaseName)
 
     def find_or_create_point_ID(self):
         """
@@ -131,9 +134,9 @@ class SPointCoordinator:
         If raw_measures is true, the raw measures from the point are displayed, else cleaned measures are displayed
         """
         if raw_measures:
-            select_query = self.build_raw_measures(full_query=True)
+            select_query = self.build_raw_measures(full_query=True, text_dates=True)
         else:
-            select_query = self.build_cleaned_measures(full_query=True)
+            select_query = self.build_cleaned_measures(full_query=True, text_dates=True)
         if (not select_query.exec()) : print(select_query.lastError())
         self.tableModel = QSqlQueryModel()
         self.tableModel.setQuery(select_query)
@@ -145,11 +148,9 @@ class SPointCoordinator:
             -date (in datetime format), Temp1, Temp2, Temp3, Temp4, TempBed, Voltage
         """
         select_data = self.build_raw_measures(full_query=True)
-        if (not select_data.exec()) : print(select_data.lastError())
-        result = []
-        while select_data.next():
-            result.append([databaseDateToDatetime(select_data.value(0))]+ [select_data.value(i) for i in range(1,7)])
-        return result
+        dates, *measures = fetchColumns(select_data, [object] + [np.float64]*6, self.con.databaseName())
+        dates = databaseDatesToDatetime64(dates).tolist() #datetime objects
+        return [[date] + row for date, row in zip(dates, np.column_stack(measures).tolist())]
 
     def all_cleaned_measures(self):
         """
@@ -158,12 +159,9 @@ class SPointCoordinator:
         -the second element is a list holding pressure readings (date, pressure, temperature at the river bed)
         """
         select_data = self.build_cleaned_measures(full_query=True)
-        if (not select_data.exec()) : print(select_data.lastError())
-        result = []
-        while select_data.next():
-            result.append(([databaseDateToDatetime(select_data.value(0))] + [select_data.value(i) for i in range(1,5)],
-                           [databaseDateToDatetime(select_data.value(0)), select_data.value(6),select_data.value(5)]))
-        return result
+        dates, *measures = fetchColumns(select_data, [object] + [np.float64]*6, self.con.databaseName()) #Date, Temp1 to 4, TempBed, Pressure
+        dates = databaseDatesToDatetime64(dates).tolist() #datetime objects
+        return [([date] + row[:4], [date, row[5], row[4]]) for date, row in zip(dates, np.column_stack(measures).tolist())]
 
     def layers_depths(self):
         """
@@ -199,6 +197,25 @@ class SPointCoordinator:
 
         return directModelRMSE, globalRmse, [select_thermRMSE.value(i) for i in range(3)]
 
+    def result_grids(self, field : str):
+        """
+        Return the results stored in the ResultGrid table for the given field (Temperature, AdvectiveFlow, ConductiveFlow or TotalFlow).
+        The result is a dictionnary where the keys are the quantiles and the values are arrays (depths x dates), as build_picture would return them: no reshaping is needed.
+        The dictionnary is empty if the results of this point are stored in the TemperatureAndHeatFlows table (see Compute).
+        """
+        select_grids = self.build_result_grids(field)
+        if (not select_grids.exec()) : print(select_grids.lastError())
+        chunks = {}
+        quantilesID = {}
+        while select_grids.next():
+            quantile = select_grids.value(0)
+            if quantilesID.get(quantile) != select_grids.value(1):
+                #Chunks are sorted by quantile ID: if the same quantile was computed several times, the last computation is kept
+                quantilesID[quantile] = select_grids.value(1)
+                chunks[quantile] = []
+            chunks[quantile].append(decodeGrid(bytes(select_grids.value(4)), select_grids.value(2), select_grids.value(3)))
+        return {quantile : np.concatenate(grid).T.astype(np.float64) for quantile, grid in chunks.items()}
+
     def thermo_depth(self, depth_id : int):
         """
         Given a thermometer number (1, 2, 3), return depth of associated thermometer.
@@ -256,20 +273,30 @@ class SPointCoordinator:
         self.refresh_measures_plots(raw_measures_plot)
 
         #Plot the heat fluxes
-        select_heatfluxes= self.build_result_queries(result_type="2DMap",option="HeatFlows") #This is a list
         select_depths = self.build_depths()
         select_dates = self.build_dates()
-        self.heatfluxes_model.new_queries([select_dates,select_depths]+select_heatfluxes)
+        heatfluxes_grids = {field : self.result_grids(field).get(0) for field in ["AdvectiveFlow", "ConductiveFlow", "TotalFlow"]}
+        if heatfluxes_grids["AdvectiveFlow"] is not None:
+            #Results are stored in the ResultGrid table
+            self.heatfluxes_model.new_queries([select_dates,select_depths], grids=heatfluxes_grids)
+        else:
+            select_heatfluxes= self.build_result_queries(result_type="2DMap",option="HeatFlows") #This is a list
+            self.heatfluxes_model.new_queries([select_dates,select_depths]+select_heatfluxes)
 
         #Plot the water fluxes
         select_waterflux= self.build_result_queries(result_type="WaterFlux") #This is already a list
         self.waterflux_model.new_queries(select_waterflux)
 
         #Plot the temperatures
-        select_tempmap = self.build_result_queries(result_type="2DMap",option="Temperature") #This is a list of temperatures for all quantiles
         select_depths = self.build_depths()
         select_dates = self.build_dates()
-        self.tempmap_model.new_queries([select_dates,select_depths]+select_tempmap)
+        temperature_grids = self.result_grids("Temperature")
+        if temperature_grids:
+            #Results are stored in the ResultGrid table
+            self.tempmap_model.new_queries([select_dates,select_depths], grids=temperature_grids)
+        else:
+            select_tempmap = self.build_result_queries(result_type="2DMap",option="Temperature") #This is a list of temperatures for all quantiles
+            self.tempmap_model.new_queries([select_dates,select_depths]+select_tempmap)
 
         #Histogramms
         self.refresh_params_distr(layer)
@@ -287,8 +314,8 @@ class SPointCoordinator:
             -row[7] : Pressure with name Pressure
         Furthermore, they must be database friendly (ie no NaN, no empty field... Just full columns basically).
         """
-        #Convert datetime objects (here Timestamp objects) into a string with correct date format.
-        dfCleaned["Date"] = dfCleaned["Date"].dt.strftime(databaseDateFormat())
+        #Convert datetime objects (here Timestamp objects) into the values stored by the database: strings with correct date format or integer seconds.
+        dfCleaned["Date"] = datetime64ToDatabaseDates(dfCleaned["Date"], self.epoch_dates)
 
         query_dates = self.build_insert_date()
         query_dates.bindValue(":PointKey", self.pointID)
@@ -344,6 +371,7 @@ class SPointCoordinator:
         deleteTableQuery.exec(f'DELETE FROM WaterFlow WHERE WaterFlow.PointKey=(SELECT Point.ID FROM Point WHERE Point.ID ={self.pointID})')
         deleteTableQuery.exec(f'DELETE FROM RMSE WHERE PointKey=(SELECT Point.ID FROM Point WHERE Point.ID ={self.pointID})')
         deleteTableQuery.exec(f'DELETE FROM TemperatureAndHeatFlows WHERE PointKey=(SELECT Point.ID FROM Point WHERE Point.ID  = {self.pointID})')
+        deleteTableQuery.exec(f'DELETE FROM ResultGrid WHERE PointKey=(SELECT Point.ID FROM Point WHERE Point.ID  = {self.pointID})')
         deleteTableQuery.exec(f'DELETE FROM ParametersDistribution WHERE ParametersDistribution.PointKey=(SELECT Point.ID FROM Point WHERE Point.ID = {self.pointID})')
         deleteTableQuery.exec(f'DELETE FROM Parameters WHERE Parameters.PointKey=(SELECT Point.ID FROM Point WHERE Point.ID = {self.pointID})')
         deleteTableQuery.exec(f'DELETE FROM InputMCMC WHERE InputMCMC.PointKey=(SELECT Point.ID FROM Point WHERE Point.ID = {self.pointID})')
@@ -566,80 +594,83 @@ class SPointCoordinator:
             """)
             return query
 
-    def build_raw_measures(self, full_query : bool = False, field : str = ""):
+    def date_field(self, column : str, text_dates : bool = False):
+        """
+        Return the SQL expression selecting the date column. If text_dates is True and the database stores integer seconds (epoch mode), the dates are converted to strings in the database format so that they can be read in a table.
+        """
+        if text_dates and self.epoch_dates:
+            return f"strftime('{databaseDateFormat()}', {column}, 'unixepoch') AS Date"
+        return column
+
+    def build_raw_measures(self, full_query : bool = False, field : str = "", text_dates : bool = False):
         """
         Build an return a query getting the raw measures:
-        -if full_query is True, then extract the Date, Pressure and all Temperatures.
+        -if full_query is True, then extract the Date, Pressure and all Temperatures. If text_dates is also True, the dates are strings even in the epoch mode (see date_field).
         -if field is not an empty string, then it MUST be either "Temp" or "Pressure". Extract the Date and the corresponding field : either all the temperatures or just the pressure.
+        The temperature and pressure measures are matched by date. Each query reads the measures of the sampling point in date order through the (SamplingPoint, Date) indexes, so no sort is needed.
         """
         query = QSqlQuery(self.con)
         if full_query:
             query.prepare(f"""
-                SELECT RawMeasuresTemp.Date, RawMeasuresTemp.Temp1, RawMeasuresTemp.Temp2, RawMeasuresTemp.Temp3, RawMeasuresTemp.Temp4, RawMeasuresPress.TempBed, RawMeasuresPress.Voltage FROM RawMeasuresTemp, RawMeasuresPress
-                JOIN SamplingPoint AS SP_press ON RawMeasuresPress.SamplingPoint = SP_press.ID
-                JOIN SamplingPoint AS SP_temp ON RawMeasuresTemp.SamplingPoint = SP_temp.ID
-                WHERE RawMeasuresTemp.Date = RawMeasuresPress.Date
-                AND SP_press.ID = {self.samplingPointID}
-                AND SP_temp.ID = {self.samplingPointID}
+                SELECT {self.date_field("RawMeasuresTemp.Date", text_dates)}, RawMeasuresTemp.Temp1, RawMeasuresTemp.Temp2, RawMeasuresTemp.Temp3, RawMeasuresTemp.Temp4, RawMeasuresPress.TempBed, RawMeasuresPress.Voltage FROM RawMeasuresTemp
+                JOIN RawMeasuresPress
+                ON RawMeasuresPress.SamplingPoint = RawMeasuresTemp.SamplingPoint
+                AND RawMeasuresPress.Date = RawMeasuresTemp.Date
+                WHERE RawMeasuresTemp.SamplingPoint = {self.samplingPointID}
                 ORDER BY RawMeasuresTemp.Date
             """)
             return query
         elif field =="Temp":
             query.prepare(f"""
-                SELECT RawMeasuresTemp.Date, RawMeasuresTemp.Temp1, RawMeasuresTemp.Temp2, RawMeasuresTemp.Temp3, RawMeasuresTemp.Temp4, RawMeasuresPress.TempBed FROM RawMeasuresTemp, RawMeasuresPress
-                JOIN SamplingPoint AS SP_press ON RawMeasuresPress.SamplingPoint = SP_press.ID
-                 JOIN SamplingPoint AS SP_temp ON RawMeasuresTemp.SamplingPoint = SP_temp.ID
-                 WHERE RawMeasuresTemp.Date = RawMeasuresPress.Date
-                 AND SP_press.ID = {self.samplingPointID}
-                AND SP_temp.ID = {self.samplingPointID}
+                SELECT RawMeasuresTemp.Date, RawMeasuresTemp.Temp1, RawMeasuresTemp.Temp2, RawMeasuresTemp.Temp3, RawMeasuresTemp.Temp4, RawMeasuresPress.TempBed FROM RawMeasuresTemp
+                JOIN RawMeasuresPress
+                ON RawMeasuresPress.SamplingPoint = RawMeasuresTemp.SamplingPoint
+                AND RawMeasuresPress.Date = RawMeasuresTemp.Date
+                WHERE RawMeasuresTemp.SamplingPoint = {self.samplingPointID}
                 ORDER BY RawMeasuresTemp.Date
             """)
             return query
         elif field =="Pressure":
             query.prepare(f"""
                 SELECT RawMeasuresPress.Date,RawMeasuresPress.Voltage FROM RawMeasuresPress
-                JOIN SamplingPoint
-                ON RawMeasuresPress.SamplingPoint = SamplingPoint.ID
-                WHERE SamplingPoint.ID = {self.samplingPointID}
+                WHERE RawMeasuresPress.SamplingPoint = {self.samplingPointID}
                 ORDER BY RawMeasuresPress.Date
             """)
             return query
 
-    def build_cleaned_measures(self, full_query : bool = False, field : str = ""):
+    def build_cleaned_measures(self, full_query : bool = False, field : str = "", text_dates : bool = False):
         """
         Build an return a query getting the cleaned measures. This function behaves the same as build_raw_measures: see its docstrings for additional information.
+        The dates of the point are read in order through the (PointKey, Date) index, then each cleaned measure is found by its date.
         """
         query = QSqlQuery(self.con)
         if full_query:
                 query.prepare(f"""
-                    SELECT Date.Date, CleanedMeasures.Temp1, CleanedMeasures.Temp2, CleanedMeasures.Temp3, CleanedMeasures.Temp4, CleanedMeasures.TempBed, CleanedMeasures.Pressure FROM CleanedMeasures
-                    JOIN Date
+                    SELECT {self.date_field("Date.Date", text_dates)}, CleanedMeasures.Temp1, CleanedMeasures.Temp2, CleanedMeasures.Temp3, CleanedMeasures.Temp4, CleanedMeasures.TempBed, CleanedMeasures.Pressure FROM Date
+                    JOIN CleanedMeasures
                     ON CleanedMeasures.Date = Date.ID
-                    JOIN Point
-                    ON CleanedMeasures.PointKey = Point.ID
-                    WHERE Point.ID = {self.pointID}
+                    WHERE Date.PointKey = {self.pointID}
+                    AND CleanedMeasures.PointKey = {self.pointID}
                     ORDER BY Date.Date
                 """)
                 return query
         elif field =="Temp":
             query.prepare(f"""
-                SELECT Date.Date, CleanedMeasures.Temp1, CleanedMeasures.Temp2, CleanedMeasures.Temp3, CleanedMeasures.Temp4, CleanedMeasures.TempBed FROM CleanedMeasures
-                JOIN Date
+                SELECT Date.Date, CleanedMeasures.Temp1, CleanedMeasures.Temp2, CleanedMeasures.Temp3, CleanedMeasures.Temp4, CleanedMeasures.TempBed FROM Date
+                JOIN CleanedMeasures
                 ON CleanedMeasures.Date = Date.ID
-                JOIN Point
-                ON CleanedMeasures.PointKey = Point.ID
-                WHERE Point.ID = {self.pointID}
+                WHERE Date.PointKey = {self.pointID}
+                AND CleanedMeasures.PointKey = {self.pointID}
                 ORDER BY Date.Date
             """)
             return query
         elif field =="Pressure":
             query.prepare(f"""
-                SELECT Date.Date, CleanedMeasures.Pressure FROM CleanedMeasures
-                JOIN Date
+                SELECT Date.Date, CleanedMeasures.Pressure FROM Date
+                JOIN CleanedMeasures
                 ON CleanedMeasures.Date = Date.ID
-                JOIN Point
-                ON CleanedMeasures.PointKey = Point.ID
-                WHERE Point.ID = {self.pointID}
+                WHERE Date.PointKey = {self.pointID}
+                AND CleanedMeasures.PointKey = {self.pointID}
                 ORDER BY Date.Date
             """)
             return query
@@ -671,19 +702,19 @@ class SPointCoordinator:
         Build and return ONE AND ONLY ONE query concerning the results.
         -quantile must be a float, and is either 0 (direct result), 0.05,0.5 or 0.95
         -option can be a string (which 2D map should be displayed or a date for the umbrellas) or a float (depth required by user)
+        The queries walk through the dates of the point in order (index (PointKey, Date)) and find the results of each date with the (Quantile, Date, ...) indexes, so only the depths of one date need to be sorted. CROSS JOIN forces SQLite to keep this join order.
         """
         #Water Flux
         query = QSqlQuery(self.con)
         if result_type =="WaterFlux":
             query.prepare(f"""
-                SELECT Date.Date, WaterFlow.WaterFlow, Quantile.Quantile FROM WaterFlow
-                JOIN Date
-                ON WaterFlow.Date = Date.ID
-                JOIN Quantile
+                SELECT Date.Date, WaterFlow.WaterFlow, Quantile.Quantile FROM Date
+                CROSS JOIN Quantile
+                ON Quantile.PointKey = Date.PointKey
+                CROSS JOIN WaterFlow
                 ON WaterFlow.Quantile = Quantile.ID
-                JOIN Point
-                ON Quantile.PointKey = Point.ID
-                WHERE Point.ID = {self.pointID}
+                AND WaterFlow.Date = Date.ID
+                WHERE Date.PointKey = {self.pointID}
                 AND Quantile.Quantile = {quantile}
                 ORDER BY Date.Date
             """)
@@ -691,37 +722,50 @@ class SPointCoordinator:
         elif result_type =="2DMap":
             if option=="Temperature":
                 query.prepare(f"""
-                    SELECT TemperatureAndHeatFlows.Temperature, Quantile.Quantile FROM TemperatureAndHeatFlows
-                    JOIN Date
-                    ON TemperatureAndHeatFlows.Date = Date.ID
+                    SELECT TemperatureAndHeatFlows.Temperature, Quantile.Quantile FROM Date
+                    CROSS JOIN Quantile
+                    ON Quantile.PointKey = Date.PointKey
+                    CROSS JOIN TemperatureAndHeatFlows
+                    ON TemperatureAndHeatFlows.Quantile = Quantile.ID
+                    AND TemperatureAndHeatFlows.Date = Date.ID
                     JOIN Depth
                     ON TemperatureAndHeatFlows.Depth = Depth.ID
-                    JOIN Quantile
-                    ON TemperatureAndHeatFlows.Quantile = Quantile.ID
-                    JOIN Point
-                    ON Quantile.PointKey = Point.ID
-                    WHERE Point.ID = {self.pointID}
+                    WHERE Date.PointKey = {self.pointID}
                     AND Quantile.Quantile = {quantile}
                     ORDER BY Date.Date, Depth.Depth
                 """) #Column major: order by date
                 return query
             elif option=="HeatFlows":
                 query.prepare(f"""
-                    SELECT Date.Date, TemperatureAndHeatFlows.AdvectiveFlow,TemperatureAndHeatFlows.ConductiveFlow,TemperatureAndHeatFlows.TotalFlow, TemperatureAndHeatFlows.Depth FROM TemperatureAndHeatFlows
-                    JOIN Date
-                    ON TemperatureAndHeatFlows.Date = Date.ID
+                    SELECT Date.Date, TemperatureAndHeatFlows.AdvectiveFlow,TemperatureAndHeatFlows.ConductiveFlow,TemperatureAndHeatFlows.TotalFlow, TemperatureAndHeatFlows.Depth FROM Date
+                    CROSS JOIN Quantile
+                    ON Quantile.PointKey = Date.PointKey
+                    CROSS JOIN TemperatureAndHeatFlows
+                    ON TemperatureAndHeatFlows.Quantile = Quantile.ID
+                    AND TemperatureAndHeatFlows.Date = Date.ID
                     JOIN Depth
                     ON TemperatureAndHeatFlows.Depth = Depth.ID
-                    JOIN Quantile
-                    ON TemperatureAndHeatFlows.Quantile = Quantile.ID
-                    JOIN Point
-                    ON Quantile.PointKey = Point.ID
-                    WHERE Point.ID = {self.pointID}
+                    WHERE Date.PointKey = {self.pointID}
                     AND Quantile.Quantile = {quantile}
                     ORDER BY Date.Date, Depth.Depth
                 """)
                 return query
 
+    def build_result_grids(self, field : str):
+        """
+        Build and return a query giving the chunks of the ResultGrid table for the given field, sorted by quantile and by date.
+        """
+        query = QSqlQuery(self.con)
+        query.prepare(f"""
+            SELECT Quantile.Quantile, ResultGrid.Quantile, ResultGrid.NbDates, ResultGrid.NbDepths, ResultGrid.Data FROM ResultGrid
+            JOIN Quantile
+            ON ResultGrid.Quantile = Quantile.ID
+            WHERE ResultGrid.PointKey = {self.pointID}
+            AND ResultGrid.Field = '{field}'
+            ORDER BY ResultGrid.Quantile, ResultGrid.FirstDate
+        """)
+        return query
+
     def build_depths(self):
         """
         Build and return all the depths values.
@@ -729,9 +773,7 @@ class SPointCoordinator:
         query = QSqlQuery(self.con)
         query.prepare(f"""
             SELECT Depth.Depth FROM Depth
-            JOIN Point
-            ON Depth.PointKey = Point.ID
-            WHERE Point.ID = {self.pointID}
+            WHERE Depth.PointKey = {self.pointID}
             ORDER BY Depth.Depth
         """)
         return query
@@ -743,9 +785,7 @@ class SPointCoordinator:
         query = QSqlQuery(self.con)
         query.prepare(f"""
             SELECT Date.Date FROM Date
-            JOIN Point
-            ON Date.PointKey = Point.ID
-            WHERE Point.ID = {self.pointID}
+            WHERE Date.PointKey = {self.pointID}
             ORDER by Date.Date
         """)
         return query
@@ -757,9 +797,7 @@ class SPointCoordinator:
         query = QSqlQuery(self.con)
         query.prepare(f"""
             SELECT Quantile.Quantile FROM Quantile
-            JOIN Point
-            ON Quantile.PointKey = Point.ID
-            WHERE Point.ID = {self.pointID}
+            WHERE Quantile.PointKey = {self.pointID}
             ORDER BY Quantile.Quantile
         """)
         return query
@@ -5,7 +5,7 @@ import os, shutil
 from ..interactions.MoloModel import MoloModel
 from ..interactions.Containers import SamplingPoint
 
-from ..utils.general import databaseDateFormat
+from ..utils.general import databaseDateFormat, databaseUsesEpochDates, datetime64ToDatabaseDates
 
 class SamplingPointModel(MoloModel):
     """
@@ -87,9 +87,10 @@ class SamplingPointManager:
         """
         pointID = self.insert_new_point(pointName, psensorName, shaftName, noticefile, configfile, infoDF)
 
-        #Convert datetime objects (here Timestamp objects) into a string with correct date format.
-        trawDF["Date"] = trawDF["Date"].dt.strftime(databaseDateFormat())
-        prawDF["Date"] = prawDF["Date"].dt.strftime(databaseDateFormat())
+        #Convert datetime objects (here Timestamp objects) into the values stored by the database: strings with correct date format or integer seconds.
+        epoch = databaseUsesEpochDates(self.con)
+        trawDF["Date"] = datetime64ToDatabaseDates(trawDF["Date"], epoch)
+        prawDF["Date"] = datetime64ToDatabaseDates(prawDF["Date"], epoch)
 
         #Pressure records
         self.con.transaction()
@@ -1,117 +1,166 @@
-PRAGMA foreign_keys = off;
-BEGIN TRANSACTION;
-
--- Table: BestParameters
-CREATE TABLE BestParameters (ID INTEGER PRIMARY KEY AUTOINCREMENT, Permeability REAL, Porosity REAL, ThermConduct REAL, Capacity REAL, Layer INTEGER REFERENCES Layer (ID), PointKey INTEGER REFERENCES Point (ID));
-
--- Table: Parameters
-CREATE TABLE Parameters (ID INTEGER PRIMARY KEY AUTOINCREMENT, Permeability REAL, Porosity REAL, ThermConduct REAL, Capacity REAL, Layer INTEGER REFERENCES Layer (ID), PointKey INTEGER REFERENCES Point (ID));
-
--- Table: InputMCMC
-CREATE TABLE InputMCMC (ID INTEGER PRIMARY KEY AUTOINCREMENT, Niter INT, Delta INT, Nchains INT, NCR INT, C REAL, Cstar REAL, Kmin REAL, Kmax REAL, Ksigma REAL, PorosityMin REAL, PorosityMax REAL, PorositySigma REAL, TcondMin REAL, TcondMax REAL, TcondSigma REAL, TcapMin REAL, TcapMax REAL, TcapSigma REAL, Remanence REAL, tresh REAL, nb_sous_ech_iter INT, nb_sous_ech_space iNT, nb_sous_ech_time INT, Quantiles TEXT, PointKey INTEGER REFERENCES Point (ID));
-
--- Table: CleanedMeasures
-CREATE TABLE CleanedMeasures (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date INTEGER REFERENCES Date (ID), TempBed REAL NOT NULL, Temp1 REAL NOT NULL, Temp2 REAL NOT NULL, Temp3 REAL NOT NULL, Temp4 REAL NOT NULL, Pressure REAL NOT NULL, PointKey INTEGER REFERENCES Point (ID));
-
--- Table: Date
-CREATE TABLE Date (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME, PointKey REFERENCES Point (ID));
-
--- Table: Depth
-CREATE TABLE Depth (ID INTEGER PRIMARY KEY AUTOINCREMENT, Depth REAL, PointKey REFERENCES Point (ID));
-
--- Table: Labo
-CREATE TABLE Labo (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL UNIQUE);
-
--- Table: Layer
-CREATE TABLE Layer (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR, Depth REAL, PointKey REFERENCES Point (ID));
-
--- Table: ParametersDistribution
-CREATE TABLE ParametersDistribution (ID INTEGER PRIMARY KEY AUTOINCREMENT, Permeability REAL, Porosity REAL, ThermConduct REAL, HeatCapacity REAL, Layer INTEGER REFERENCES Layer (ID), PointKey INTEGER REFERENCES Point (ID));
-
--- Table: Point
-CREATE TABLE Point (ID INTEGER PRIMARY KEY AUTOINCREMENT, SamplingPoint INTEGER REFERENCES SamplingPoint (ID), IncertK REAL, IncertLambda REAL, DiscretStep INTEGER, IncertRho REAL, TempUncertainty REAL, IncertPressure REAL);
-
--- Table: PressureSensor
-CREATE TABLE PressureSensor (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR, Datalogger VARCHAR, DataloggerID INTEGER REFERENCES Datalogger (ID), Calibration DATETIME, Intercept REAL, DuDH REAL, DuDT REAL, Error REAL, ThermoModel INTEGER REFERENCES Thermometer (ID), Labo INTEGER REFERENCES Labo (ID));
-
--- Table: Quantile
-CREATE TABLE Quantile (ID INTEGER PRIMARY KEY AUTOINCREMENT, Quantile REAL NOT NULL, PointKey REFERENCES Point (ID));
-
--- Table: RawMeasuresPress
-CREATE TABLE RawMeasuresPress (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME NOT NULL, TempBed REAL, Voltage REAL, SamplingPoint INTEGER REFERENCES SamplingPoint (ID));
-
--- Table: RawMeasuresTemp
-CREATE TABLE RawMeasuresTemp (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME, Temp1 REAL, Temp2 REAL, Temp3 REAL, Temp4 REAL, SamplingPoint INTEGER REFERENCES SamplingPoint (ID));
-
--- Table: RawMeasuresVolt
-CREATE TABLE RawMeasuresVolt (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME, Volt1 REAL, Volt2 REAL, Volt3 REAL, Volt4 REAL, SamplingPoint INTEGER REFERENCES SamplingPoint (ID));
-
--- Table: RMSE
-CREATE TABLE RMSE (ID INTEGER PRIMARY KEY AUTOINCREMENT, Depth1 INTEGER REFERENCES Depth (ID), Depth2 INTEGER REFERENCES Depth (ID), Depth3 INTEGER REFERENCES Depth (ID), RMSE1 REAL, RMSE2 REAL, RMSE3 REAL, RMSETotal REAL, PointKey INTEGER REFERENCES Point (ID), Quantile INTEGER REFERENCES Quantile (ID));
-
--- Table: SamplingPoint
-CREATE TABLE SamplingPoint (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR, Notice VARCHAR, Setup DATETIME, LastTransfer DATETIME, "Offset" REAL, RiverBed REAL, Shaft INTEGER REFERENCES Shaft (ID), PressureSensor INTEGER REFERENCES PressureSensor (ID), Study INTEGER REFERENCES Study (ID), Scheme VARCHAR, CleanupScript VARCHAR);
-
--- Table: Shaft
-CREATE TABLE Shaft (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL, Datalogger VARCHAR NOT NULL, DataloggerID INTEGER REFERENCES Datalogger (ID), Depth1 REAL NOT NULL, Depth2 REAL NOT NULL, Depth3 REAL NOT NULL, Depth4 REAL NOT NULL, ThermoModel INTEGER REFERENCES Thermometer (ID), Labo INTEGER REFERENCES Labo (ID));
-
--- Table: Study
-CREATE TABLE Study (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL UNIQUE, Labo INTEGER REFERENCES Labo (ID));
-
--- Table: TemperatureAndHeatFlows
-CREATE TABLE TemperatureAndHeatFlows (
-            ID              INTEGER  PRIMARY KEY AUTOINCREMENT,
-            Date            INTEGER REFERENCES Date (ID),
-            Depth           INTEGER REFERENCES Depth (ID),
-            Temperature     REAL,
-            AdvectiveFlow   REAL,
-            ConductiveFlow  REAL,
-            TotalFlow       REAL,
-            PointKey        INTEGER REFERENCES Point (ID),
-            Quantile        INTEGER REFERENCES Quantile (ID)
-        );
-
--- Table: Thermometer
-CREATE TABLE Thermometer (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL, ManuName VARCHAR NOT NULL, ManuRef VARCHAR NOT NULL, Error REAL NOT NULL, beta REAL NOT NULL, V REAL NOT NULL, Labo INTEGER REFERENCES Labo (ID));
-
--- Table: WaterFlow
-CREATE TABLE WaterFlow (
-            ID            INTEGER  PRIMARY KEY AUTOINCREMENT,
-            WaterFlow           REAL,
-            Date                INTEGER REFERENCES Date (ID),
-            PointKey            INTEGER REFERENCES Point (ID),
-            Quantile            INTEGER REFERENCES Quantile (ID)
-        );
-
--- Table: Gateway
-CREATE TABLE Gateway (
-    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-    Name VARCHAR NOT NULL UNIQUE,
-    gatewayEUI VARCHAR NOT NULL UNIQUE,    -- Identifiant LoRaWAN unique de la gateway
-    TLS_Cert BLOB,               -- Certificat TLS
-    TLS_Key BLOB,                -- Clé privée TLS
-    CA_Cert BLOB,                -- Certificat d'autorité
-    Labo INTEGER REFERENCES Labo (ID)
-);
-
--- Table: Relay
-CREATE TABLE Relay (
-    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-    Name VARCHAR NOT NULL,
-    RelayEUI VARCHAR NOT NULL UNIQUE,  -- Identifiant LoRaWAN unique du relay
-    Gateway INTEGER NOT NULL REFERENCES Gateway (ID),  -- Lien vers la gateway parente
-    Labo INTEGER REFERENCES Labo (ID),
-    UNIQUE(Gateway, Name)                           -- Un nom de relay unique par gateway
-    );
-
--- Table: Datalogger
-CREATE TABLE Datalogger (
-    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-    Name VARCHAR NOT NULL,
-    DevEUI VARCHAR NOT NULL UNIQUE,     -- Ceci est l'identifiant unique (le 'datalogger EUI')
-    Relay INTEGER NOT NULL REFERENCES Relay (ID),    
-    Labo INTEGER REFERENCES Labo (ID),
-    UNIQUE(Relay, Name)
-);
-COMMIT TRANSACTION;
-PRAGMA foreign_keys = on;
\ No newline at end of file
+PRAGMA foreign_keys = off;
+BEGIN TRANSACTION;
+
+-- Table: BestParameters
+CREATE TABLE BestParameters (ID INTEGER PRIMARY KEY AUTOINCREMENT, Permeability REAL, Porosity REAL, ThermConduct REAL, Capacity REAL, Layer INTEGER REFERENCES Layer (ID), PointKey INTEGER REFERENCES Point (ID));
+
+-- Table: Parameters
+CREATE TABLE Parameters (ID INTEGER PRIMARY KEY AUTOINCREMENT, Permeability REAL, Porosity REAL, ThermConduct REAL, Capacity REAL, Layer INTEGER REFERENCES Layer (ID), PointKey INTEGER REFERENCES Point (ID));
+
+-- Table: InputMCMC
+CREATE TABLE InputMCMC (ID INTEGER PRIMARY KEY AUTOINCREMENT, Niter INT, Delta INT, Nchains INT, NCR INT, C REAL, Cstar REAL, Kmin REAL, Kmax REAL, Ksigma REAL, PorosityMin REAL, PorosityMax REAL, PorositySigma REAL, TcondMin REAL, TcondMax REAL, TcondSigma REAL, TcapMin REAL, TcapMax REAL, TcapSigma REAL, Remanence REAL, tresh REAL, nb_sous_ech_iter INT, nb_sous_ech_space iNT, nb_sous_ech_time INT, Quantiles TEXT, PointKey INTEGER REFERENCES Point (ID));
+
+-- Table: CleanedMeasures
+CREATE TABLE CleanedMeasures (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date INTEGER REFERENCES Date (ID), TempBed REAL NOT NULL, Temp1 REAL NOT NULL, Temp2 REAL NOT NULL, Temp3 REAL NOT NULL, Temp4 REAL NOT NULL, Pressure REAL NOT NULL, PointKey INTEGER REFERENCES Point (ID));
+
+-- Table: Date
+CREATE TABLE Date (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME, PointKey REFERENCES Point (ID));
+
+-- Table: Depth
+CREATE TABLE Depth (ID INTEGER PRIMARY KEY AUTOINCREMENT, Depth REAL, PointKey REFERENCES Point (ID));
+
+-- Table: Labo
+CREATE TABLE Labo (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL UNIQUE);
+
+-- Table: Layer
+CREATE TABLE Layer (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR, Depth REAL, PointKey REFERENCES Point (ID));
+
+-- Table: ParametersDistribution
+CREATE TABLE ParametersDistribution (ID INTEGER PRIMARY KEY AUTOINCREMENT, Permeability REAL, Porosity REAL, ThermConduct REAL, HeatCapacity REAL, Layer INTEGER REFERENCES Layer (ID), PointKey INTEGER REFERENCES Point (ID));
+
+-- Table: Point
+CREATE TABLE Point (ID INTEGER PRIMARY KEY AUTOINCREMENT, SamplingPoint INTEGER REFERENCES SamplingPoint (ID), IncertK REAL, IncertLambda REAL, DiscretStep INTEGER, IncertRho REAL, TempUncertainty REAL, IncertPressure REAL);
+
+-- Table: PressureSensor
+CREATE TABLE PressureSensor (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR, Datalogger VARCHAR, DataloggerID INTEGER REFERENCES Datalogger (ID), Calibration DATETIME, Intercept REAL, DuDH REAL, DuDT REAL, Error REAL, ThermoModel INTEGER REFERENCES Thermometer (ID), Labo INTEGER REFERENCES Labo (ID));
+
+-- Table: Quantile
+CREATE TABLE Quantile (ID INTEGER PRIMARY KEY AUTOINCREMENT, Quantile REAL NOT NULL, PointKey REFERENCES Point (ID));
+
+-- Table: RawMeasuresPress
+CREATE TABLE RawMeasuresPress (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME NOT NULL, TempBed REAL, Voltage REAL, SamplingPoint INTEGER REFERENCES SamplingPoint (ID));
+
+-- Table: RawMeasuresTemp
+CREATE TABLE RawMeasuresTemp (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME, Temp1 REAL, Temp2 REAL, Temp3 REAL, Temp4 REAL, SamplingPoint INTEGER REFERENCES SamplingPoint (ID));
+
+-- Table: RawMeasuresVolt
+CREATE TABLE RawMeasuresVolt (ID INTEGER PRIMARY KEY AUTOINCREMENT, Date DATETIME, Volt1 REAL, Volt2 REAL, Volt3 REAL, Volt4 REAL, SamplingPoint INTEGER REFERENCES SamplingPoint (ID));
+
+-- Table: RMSE
+CREATE TABLE RMSE (ID INTEGER PRIMARY KEY AUTOINCREMENT, Depth1 INTEGER REFERENCES Depth (ID), Depth2 INTEGER REFERENCES Depth (ID), Depth3 INTEGER REFERENCES Depth (ID), RMSE1 REAL, RMSE2 REAL, RMSE3 REAL, RMSETotal REAL, PointKey INTEGER REFERENCES Point (ID), Quantile INTEGER REFERENCES Quantile (ID));
+
+-- Table: SamplingPoint
+CREATE TABLE SamplingPoint (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR, Notice VARCHAR, Setup DATETIME, LastTransfer DATETIME, "Offset" REAL, RiverBed REAL, Shaft INTEGER REFERENCES Shaft (ID), PressureSensor INTEGER REFERENCES PressureSensor (ID), Study INTEGER REFERENCES Study (ID), Scheme VARCHAR, CleanupScript VARCHAR);
+
+-- Table: Shaft
+CREATE TABLE Shaft (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL, Datalogger VARCHAR NOT NULL, DataloggerID INTEGER REFERENCES Datalogger (ID), Depth1 REAL NOT NULL, Depth2 REAL NOT NULL, Depth3 REAL NOT NULL, Depth4 REAL NOT NULL, ThermoModel INTEGER REFERENCES Thermometer (ID), Labo INTEGER REFERENCES Labo (ID));
+
+-- Table: Study
+CREATE TABLE Study (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL UNIQUE, Labo INTEGER REFERENCES Labo (ID));
+
+-- Table: TemperatureAndHeatFlows
+CREATE TABLE TemperatureAndHeatFlows (
+            ID              INTEGER  PRIMARY KEY AUTOINCREMENT,
+            Date            INTEGER REFERENCES Date (ID),
+            Depth           INTEGER REFERENCES Depth (ID),
+            Temperature     REAL,
+            AdvectiveFlow   REAL,
+            ConductiveFlow  REAL,
+            TotalFlow       REAL,
+            PointKey        INTEGER REFERENCES Point (ID),
+            Quantile        INTEGER REFERENCES Quantile (ID)
+        );
+
+-- Table: Thermometer
+CREATE TABLE Thermometer (ID INTEGER PRIMARY KEY AUTOINCREMENT, Name VARCHAR NOT NULL, ManuName VARCHAR, ManuRef VARCHAR, Error REAL NOT NULL, Beta REAL, V REAL, Labo INTEGER REFERENCES Labo (ID));
+
+-- Table: WaterFlow
+CREATE TABLE WaterFlow (
+            ID            INTEGER  PRIMARY KEY AUTOINCREMENT,
+            WaterFlow           REAL,
+            Date                INTEGER REFERENCES Date (ID),
+            PointKey            INTEGER REFERENCES Point (ID),
+            Quantile            INTEGER REFERENCES Quantile (ID)
+        );
+
+-- Table: Gateway
+CREATE TABLE Gateway (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name VARCHAR NOT NULL UNIQUE,
+    gatewayEUI VARCHAR NOT NULL UNIQUE,    -- Identifiant LoRaWAN unique de la gateway
+    TLS_Cert BLOB,               -- Certificat TLS
+    TLS_Key BLOB,                -- Clé privée TLS
+    CA_Cert BLOB,                -- Certificat d'autorité
+    Labo INTEGER REFERENCES Labo (ID)
+);
+
+-- Table: Relay
+CREATE TABLE Relay (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name VARCHAR NOT NULL,
+    RelayEUI VARCHAR NOT NULL UNIQUE,  -- Identifiant LoRaWAN unique du relay
+    Gateway INTEGER NOT NULL REFERENCES Gateway (ID),  -- Lien vers la gateway parente
+    Labo INTEGER REFERENCES Labo (ID),
+    UNIQUE(Gateway, Name)                           -- Un nom de relay unique par gateway
+    );
+
+-- Table: Datalogger
+CREATE TABLE Datalogger (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name VARCHAR NOT NULL,
+    DevEUI VARCHAR NOT NULL UNIQUE,     -- Ceci est l'identifiant unique (le 'datalogger EUI')
+    Relay INTEGER NOT NULL REFERENCES Relay (ID),    
+    Labo INTEGER REFERENCES Labo (ID),
+    UNIQUE(Relay, Name)
+);
+-- Table: ResultGrid
+-- Compact storage of the results: each row holds a chunk of consecutive dates of one field
+-- (Temperature, AdvectiveFlow, ConductiveFlow or TotalFlow) for one quantile, as a zlib-compressed
+-- float32 array of NbDates x NbDepths values (dates sorted by Date.Date, depths sorted by Depth.Depth).
+-- FirstDate is the index of the first date of the chunk. Databases created before this table
+-- are upgraded when opened: every IF NOT EXISTS statement of this file is executed again.
+CREATE TABLE IF NOT EXISTS ResultGrid (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Field VARCHAR NOT NULL,
+    FirstDate INTEGER NOT NULL,
+    NbDates INTEGER NOT NULL,
+    NbDepths INTEGER NOT NULL,
+    Data BLOB NOT NULL,
+    PointKey INTEGER REFERENCES Point (ID),
+    Quantile INTEGER REFERENCES Quantile (ID)
+);
+CREATE INDEX IF NOT EXISTS ResultGridQuantile ON ResultGrid (Quantile, Field, FirstDate);
+
+-- Table: DateStorage
+-- Optional epoch mode, chosen when the database is created: when this table holds a row with Epoch = 1, the
+-- measure dates (Date.Date and the Date field of the RawMeasures tables) are integer seconds since
+-- 1970/01/01 00:00:00 instead of YYYY/MM/DD HH:MM:SS strings. Without any row (databases created before
+-- this table, which are upgraded when opened) the dates are strings.
+CREATE TABLE IF NOT EXISTS DateStorage (ID INTEGER PRIMARY KEY AUTOINCREMENT, Epoch INTEGER NOT NULL);
+
+-- Table: ResultStorage
+-- Optional grid mode, chosen when the database is created: when this table holds a row with Grids = 1, the
+-- temperatures and heat flows computed for a point are saved as compressed chunks in the ResultGrid table instead
+-- of one row per date and depth in TemperatureAndHeatFlows. Without any row (the default, and databases created
+-- before this table) they are saved in TemperatureAndHeatFlows. The results of both formats can be read.
+CREATE TABLE IF NOT EXISTS ResultStorage (ID INTEGER PRIMARY KEY AUTOINCREMENT, Grids INTEGER NOT NULL);
+
+-- Indexes of the queries run when a sampling point is opened (see SPointCoordinator): they filter on the
+-- sampling point, the point or the quantile and sort by date or depth. The last columns of some indexes are
+-- only read by these queries, so that the table itself is not visited.
+-- Databases created before these indexes are upgraded when opened, as for the ResultGrid table.
+CREATE INDEX IF NOT EXISTS RawMeasuresTempSamplingPoint ON RawMeasuresTemp (SamplingPoint, Date);
+CREATE INDEX IF NOT EXISTS RawMeasuresPressSamplingPoint ON RawMeasuresPress (SamplingPoint, Date, Voltage, TempBed);
+CREATE INDEX IF NOT EXISTS RawMeasuresVoltSamplingPoint ON RawMeasuresVolt (SamplingPoint, Date);
+CREATE INDEX IF NOT EXISTS DatePoint ON Date (PointKey, Date);
+CREATE INDEX IF NOT EXISTS DepthPoint ON Depth (PointKey, Depth);
+CREATE INDEX IF NOT EXISTS CleanedMeasuresDate ON CleanedMeasures (Date);
+CREATE INDEX IF NOT EXISTS QuantilePoint ON Quantile (PointKey, Quantile);
+CREATE INDEX IF NOT EXISTS TemperatureAndHeatFlowsQuantile ON TemperatureAndHeatFlows (Quantile, Date, Depth, Temperature);
+CREATE INDEX IF NOT EXISTS WaterFlowQuantile ON WaterFlow (Quantile, Date, WaterFlow);
+CREATE INDEX IF NOT EXISTS RMSEQuantile ON RMSE (Quantile);
+CREATE INDEX IF NOT EXISTS LayerPoint ON Layer (PointKey, Depth);
+CREATE INDEX IF NOT EXISTS ParametersDistributionLayer ON ParametersDistribution (Layer);
+COMMIT TRANSACTION;
+PRAGMA foreign_keys = on;
+
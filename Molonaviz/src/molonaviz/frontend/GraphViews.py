@@ -15,7 +15,7 @@ from ..backend.GraphsModels import TemperatureDataModel,SolvedTemperatureModel
 from ..interactions.MoloView import MoloView
 from ..backend.SPointCoordinator import SPointCoordinator
 from ..interactions.MoloView import MoloView
-from ..utils.general import dateToMdates
+from ..utils.general import datetime64ToMdates
 
 class GraphView(MoloView, FigureCanvasQTAgg):
     """
@@ -64,7 +64,7 @@ class GraphView1D(GraphView):
         This method allows to apply changes to the data on the x-axis (for example, format a date).
         """
         if self.time_dependent:
-            self.x = dateToMdates(self.x)
+            self.x = datetime64ToMdates(self.x)
             formatter = mdates.DateFormatter("%y/%m/%d %H:%M")
             self.ax.xaxis.set_major_formatter(formatter)
             self.ax.xaxis.set_major_locator(MaxNLocator(4))
@@ -127,7 +127,7 @@ class GraphView2D(GraphView):
         This method allows to apply changes to the data on the x-axis (for example, format a date).
         """
         if self.time_dependent:
-            self.x = dateToMdates(self.x)
+            self.x = datetime64ToMdates(self.x)
             formatter = mdates.DateFormatter("%y/%m/%d %H:%M")
             self.ax.xaxis.set_major_formatter(formatter)
             self.ax.xaxis.set_major_locator(MaxNLocator(4))
@@ -19,7 +19,7 @@ from .backend.StudyAndLabManager import StudyAndLabManager
 
 from .frontend.printThread import InterceptOutput, Receiver
 from .frontend.MoloTreeView import ThermometerTreeView, PSensorTreeViewModel, ShaftTreeView, SamplingPointTreeView
-from .utils.general import InvalidFile, displayCriticalMessage, createDatabaseDirectory, checkDbFolderIntegrity, extractDetectorsDF
+from .utils.general import InvalidFile, displayCriticalMessage, createDatabaseDirectory, checkDbFolderIntegrity, upgradeDatabase, extractDetectorsDF
 from .utils.get_files import get_ui_asset, get_imgs, get_interactions_asset, get_docs
 
 From_MainWindow = uic.loadUiType(get_ui_asset("mainwindow.ui"))[0]
@@ -137,6 +137,8 @@ class MainWindow(QtWidgets.QMainWindow,From_MainWindow):
         databaseDir = None
         createNewDatabase = False
         newDatabaseName = ""
+        epochDates = False
+        resultGrids = False
         remember = False
         self.actionChangeDatabase.setEnabled(True)
         if result is not None :
@@ -153,12 +155,16 @@ class MainWindow(QtWidgets.QMainWindow,From_MainWindow):
                 res = dlg.exec()
                 if res == QtWidgets.QDialog.Accepted:
                     databaseDir, createNewDatabase, newDatabaseName = dlg.getDir()
+                    epochDates = dlg.checkBoxEpochDates.isChecked()
+                    resultGrids = dlg.checkBoxResultGrids.isChecked()
                     remember = dlg.checkBoxRemember.isChecked()
                 else:
                     dlg.close()
             else :
                 if self.result == QtWidgets.QDialog.Accepted:
                     databaseDir, createNewDatabase, newDatabaseName = self.dialog.getDir()
+                    epochDates = self.dialog.checkBoxEpochDates.isChecked()
+                    resultGrids = self.dialog.checkBoxResultGrids.isChecked()
                     remember = self.dialog.checkBoxRemember.isChecked()
                 else :
                     self.dialog.close()
@@ -168,7 +174,7 @@ class MainWindow(QtWidgets.QMainWindow,From_MainWindow):
         #Now create or check the integrity of the folder given by databaseDir
         if createNewDatabase:
             #Create all folders and subfolders
-            noerror = createDatabaseDirectory(databaseDir, newDatabaseName, get_interactions_asset('sample_text.txt'), get_docs("ERD_structure.sql"))
+            noerror = createDatabaseDirectory(databaseDir, newDatabaseName, get_interactions_asset('sample_text.txt'), get_docs("ERD_structure.sql"), epochDates, resultGrids)
             if noerror:
                 databaseDir = os.path.join(databaseDir, newDatabaseName)
             else:
@@ -189,6 +195,8 @@ class MainWindow(QtWidgets.QMainWindow,From_MainWindow):
         self.con = QSqlDatabase.addDatabase("QSQLITE")
         self.con.setDatabaseName(databaseFile)
         self.con.open()
+        #Databases created by older versions of Molonaviz may lack the newest tables (for example ResultGrid)
+        upgradeDatabase(self.con, get_docs("ERD_structure.sql"))
 
         self.showDatabaseName()
 
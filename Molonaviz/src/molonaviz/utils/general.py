@@ -3,7 +3,9 @@ Some useful functions which can be used throughout the code.
 """
 from PyQt5 import QtWidgets
 import os
-from datetime import datetime
+import zlib
+import sqlite3
+from pathlib import Path
 import pandas as pd
 import numpy as np
 import matplotlib.dates as mdates
@@ -33,9 +35,11 @@ def displayWarningMessage(mainMessage: str, infoMessage: str = ''):
     msg.setInformativeText(infoMessage)
     msg.exec()
 
-def createDatabaseDirectory(directory, databaseName, sampleTextFile, sqlInitFile):
+def createDatabaseDirectory(directory, databaseName, sampleTextFile, sqlInitFile, epochDates=False, resultGrids=False):
     """
     Given a directory and the name of the database, create a folder with the name databaseName and the correct structure. Also create the empty database with correct table structure based on the sqlInitFile.
+    If epochDates is True, the measure dates of the database will be stored as integer seconds (see databaseUsesEpochDates).
+    If resultGrids is True, the computed temperatures and heat flows will be stored as compressed grids (see databaseUsesResultGrids).
     Return True if the directory was successfully created, False otherwise
     """
     databaseFolder = os.path.join(directory, databaseName)
@@ -59,9 +63,27 @@ def createDatabaseDirectory(directory, databaseName, sampleTextFile, sqlInitFile
     query = QSqlQuery(con)
     for q in sqlQueries:
         query.exec(q)
+    if epochDates:
+        if (not query.exec("INSERT INTO DateStorage (Epoch) VALUES (1)")) : print(query.lastError())
+    if resultGrids:
+        if (not query.exec("INSERT INTO ResultStorage (Grids) VALUES (1)")) : print(query.lastError())
     con.close()
     return True
 
+def upgradeDatabase(con, sqlInitFile):
+    """
+    Bring an existing database up to date with the sqlInitFile: every "CREATE TABLE IF NOT EXISTS" and "CREATE INDEX IF NOT EXISTS" statement is executed, so tables and indexes added after the database was created are also available.
+    Statements creating the original tables are skipped as these tables already exist.
+    """
+    with open(sqlInitFile, 'r') as f:
+        sqlQueries = f.read().split(";")
+    query = QSqlQuery(con)
+    for q in sqlQueries:
+        # Remove comments so that the statement can be recognised
+        statement = " ".join(line.split("--")[0] for line in q.splitlines()).strip()
+        if statement.upper().startswith(("CREATE TABLE IF NOT EXISTS", "CREATE INDEX IF NOT EXISTS")):
+            if (not query.exec(statement)) : print(query.lastError())
+
 def checkDbFolderIntegrity(dbPath):
     """
     Given the path to a database folder, check if it has all the subfolders and the database in it.
@@ -207,26 +229,58 @@ def databaseDateFormat():
     """
     return "%Y/%m/%d %H:%M:%S"
 
-def databaseDateToDatetime(date : str):
+def databaseUsesEpochDates(con):
     """
-    Given a date in the database format (YYYY/MM/DD HH:MM:SS), return the corresponding datetime object.
-    If a list is given instead, return the list of datetime objects.
+    Return True if the measure dates of the database (Date.Date and the Date field of the RawMeasures tables) are stored as integer seconds since 1970/01/01 00:00:00, False if they are strings in the database format (see databaseDateFormat).
+    The epoch mode is chosen when the database is created (see createDatabaseDirectory): it is recorded by a row of the DateStorage table.
     """
-    if isinstance(date, list) or isinstance(date, np.ndarray):
-        return [databaseDateToDatetime(d) for d in date]
-    return datetime.strptime(date, databaseDateFormat())
+    query = QSqlQuery(con)
+    if not query.exec("SELECT Epoch FROM DateStorage"):
+        #Databases created before the DateStorage table store strings
+        return False
+    return query.next() and bool(query.value(0))
 
-def datetimeToDatabaseDate(date : datetime):
+def databaseUsesResultGrids(con):
     """
-    Given a datetime oject, return a date (string) in the database format (YYYY/MM/DD HH:MM:SS).
+    Return True if the temperatures and heat flows computed for the points of the database are saved as compressed grids in the ResultGrid table, False if they are saved one row per date and depth in the TemperatureAndHeatFlows table.
+    The grid mode is chosen when the database is created (see createDatabaseDirectory): it is recorded by a row of the ResultStorage table. Both formats can be read (see SPointCoordinator.refresh_all_models).
     """
-    return date.strftime(databaseDateFormat())
+    query = QSqlQuery(con)
+    if not query.exec("SELECT Grids FROM ResultStorage"):
+        #Databases created before the ResultStorage table store rows
+        return False
+    return query.next() and bool(query.value(0))
+
+def databaseDatesToDatetime64(dates):
+    """
+    Given an array or a list of dates as stored in the database (strings in the database format, or integer seconds in the epoch mode), return the corresponding numpy array of datetime64[s].
+    The conversion is vectorised: it is done by numpy or pandas, not by a loop over the dates.
+    """
+    dates = np.asarray(dates)
+    if dates.dtype == object and dates.size > 0 and not isinstance(dates.flat[0], str):
+        dates = dates.astype(np.int64)
+    if dates.dtype.kind in "iuf":
+        return dates.astype(np.int64).astype("datetime64[s]")
+    if dates.size == 0:
+        return np.array([], dtype="datetime64[s]")
+    return pd.to_datetime(dates.ravel(), format=databaseDateFormat()).to_numpy().astype("datetime64[s]").reshape(dates.shape)
 
-def dateToMdates(dates : list[str]):
+def datetime64ToDatabaseDates(dates, epoch : bool = False):
     """
-    Given a list of datetime objects, return the corresponding list of matplotlib dates.
+    Given an array or a list of dates (datetime64, datetime or Timestamp objects), return the numpy array of the corresponding values to store in the database: integer seconds if epoch is True, else strings in the database format.
+    This is the inverse of databaseDatesToDatetime64 and it is also vectorised.
     """
-    return [mdates.date2num(date) for date in dates]
+    dates = np.asarray(dates, dtype="datetime64[s]")
+    if epoch:
+        return dates.astype(np.int64)
+    #datetime_as_string gives YYYY-MM-DDTHH:MM:SS
+    return np.char.replace(np.char.replace(np.datetime_as_string(dates, unit="s"), "-", "/"), "T", " ")
+
+def datetime64ToMdates(dates):
+    """
+    Given an array or a list of dates (datetime64 or datetime objects), return the corresponding array of matplotlib dates.
+    """
+    return mdates.date2num(np.asarray(dates, dtype="datetime64[s]"))
 
 def build_picture(oneDArray : np.array, nb_cells=100):
     """
@@ -235,4 +289,40 @@ def build_picture(oneDArray : np.array, nb_cells=100):
     nb_elems = oneDArray.shape[0] #Total number of elements
     y = nb_cells #One hundred cells
     x = nb_elems//y
-    return oneDArray.reshape(x,y).T#Now this is the color map with y-axis being the depth (number of cells) and x-axis being the time
\ No newline at end of file
+    return oneDArray.reshape(x,y).T#Now this is the color map with y-axis being the depth (number of cells) and x-axis being the time
+
+def encodeGrid(grid : np.array):
+    """
+    Given a 2D array (dates x depths), return the bytes stored in the Data field of the ResultGrid table: the values as float32, compressed with zlib.
+    """
+    return zlib.compress(np.ascontiguousarray(grid, dtype=np.float32).tobytes())
+
+def decodeGrid(data : bytes, nb_dates : int, nb_depths : int):
+    """
+    Given the Data field of the ResultGrid table and the shape of the chunk, return the corresponding array (dates x depths) of float32.
+    """
+    return np.frombuffer(zlib.decompress(data), dtype=np.float32).reshape(nb_dates, nb_depths)
+
+def fetchColumns(query : QSqlQuery, dtypes : list, databaseName : str = ""):
+    """
+    Given a prepared query which has not been executed yet and the type of each selected column (for example [str, np.float64] for a date and a value), execute it and return the result as a list of numpy arrays, one per column. NULL values become NaN in float columns.
+    If databaseName is the path of the database file, the query is only executed by the sqlite3 module which reads all rows in one go: this is much faster than reading the values one by one with QSqlQuery.next when there are millions of rows. sqlite3 opens its own connection to the file, so it doesn't see the writes of a transaction still open on the Qt connection: leave databaseName empty when reading inside a transaction.
+    Otherwise (no file, query with bound values or sqlite3 error), the query is executed by Qt and the rows are read from it.
+    """
+    rows = None
+    if databaseName and os.path.isfile(databaseName) and not query.boundValues():
+        try:
+            lite = sqlite3.connect(Path(databaseName).resolve().as_uri() + "?mode=ro", uri=True)
+            try:
+                rows = lite.execute(query.lastQuery()).fetchall()
+            finally:
+                lite.close()
+        except sqlite3.Error:
+            rows = None
+    if rows is None:
+        if (not query.exec()) : print(query.lastError())
+        rows = []
+        while query.next():
+            rows.append([query.value(i) for i in range(len(dtypes))])
+    table = np.array(rows, dtype=object).reshape(len(rows), len(dtypes))
+    return [table[:, i].astype(dtype) for i, dtype in enumerate(dtypes)]
@@ -0,0 +1,174 @@
+"""
+Build a Molonaviz database of realistic size and time the queries executed when a sampling point is opened.
+
+    python tests/benchmark_database.py [path] [nb_dates] [nb_depths] [nb_points]
+
+The default size is one year of measures every 15 minutes and 100 cells for two sampling points. That is
+about 14 million rows of TemperatureAndHeatFlows per point (direct model and three quantiles, see Compute).
+build_benchmark_database is also used with a small size by the tests of the query plans.
+"""
+
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+ERD_PATH = os.path.join(os.path.dirname(__file__), "..", "src", "molonaviz", "docs", "ERD_structure.sql")
+STUDY_NAME = "Benchmark"
+QUANTILES = (0, 0.05, 0.5, 0.95)
+
+
+def sampling_point_name(index):
+    return f"Point{index + 1}"
+
+
+def build_benchmark_database(path, nb_dates=35040, nb_depths=100, nb_points=2, quantiles=QUANTILES, epoch_dates=False):
+    """
+    Create the database path from ERD_structure.sql and fill it with nb_points sampling points (named by
+    sampling_point_name in the study STUDY_NAME). Each point has nb_dates raw and cleaned measures and the results
+    of a MCMC with the given quantiles, stored one row per date and depth in TemperatureAndHeatFlows.
+    If epoch_dates is True, the dates are stored as integer seconds (see the DateStorage table).
+    """
+    con = sqlite3.connect(path)
+    with open(ERD_PATH, "r") as f:
+        con.executescript(f.read())
+    con.execute("PRAGMA foreign_keys = off")
+
+    rng = np.random.default_rng(0)
+    t0 = datetime(2024, 1, 1)
+    times = [t0 + timedelta(minutes=15 * i) for i in range(nb_dates)]
+    if epoch_dates:
+        con.execute("INSERT INTO DateStorage (Epoch) VALUES (1)")
+        dates = [int(t.replace(tzinfo=timezone.utc).timestamp()) for t in times]
+    else:
+        dates = [t.strftime("%Y/%m/%d %H:%M:%S") for t in times]
+    depths = np.linspace(0.4 / nb_depths / 2, 0.4, nb_depths).tolist()
+
+    con.execute("INSERT INTO Labo (Name) VALUES ('Lab')")
+    con.execute(f"INSERT INTO Study (Name, Labo) VALUES ('{STUDY_NAME}', 1)")
+    for index in range(nb_points):
+        sampling_point = con.execute(
+            "INSERT INTO SamplingPoint (Name, Study) VALUES (?, 1)", (sampling_point_name(index),)
+        ).lastrowid
+        point = con.execute(
+            "INSERT INTO Point (SamplingPoint, DiscretStep) VALUES (?, ?)", (sampling_point, nb_depths)
+        ).lastrowid
+
+        temperatures = 285 + rng.normal(0, 1, (nb_dates, 5))
+        voltages = rng.normal(0, 1, nb_dates)
+        con.executemany(
+            "INSERT INTO RawMeasuresTemp (Date, Temp1, Temp2, Temp3, Temp4, SamplingPoint) VALUES (?, ?, ?, ?, ?, ?)",
+            ((date, *temperatures[i, :4].tolist(), sampling_point) for i, date in enumerate(dates)),
+        )
+        con.executemany(
+            "INSERT INTO RawMeasuresPress (Date, TempBed, Voltage, SamplingPoint) VALUES (?, ?, ?, ?)",
+            ((date, float(temperatures[i, 4]), float(voltages[i]), sampling_point) for i, date in enumerate(dates)),
+        )
+
+        first_date = con.execute("SELECT COALESCE(MAX(ID), 0) FROM Date").fetchone()[0] + 1
+        con.executemany("INSERT INTO Date (Date, PointKey) VALUES (?, ?)", ((date, point) for date in dates))
+        date_ids = range(first_date, first_date + nb_dates)
+        con.executemany(
+            """INSERT INTO CleanedMeasures (Date, TempBed, Temp1, Temp2, Temp3, Temp4, Pressure, PointKey)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                (date_id, float(temperatures[i, 4]), *temperatures[i, :4].tolist(), float(voltages[i]), point)
+                for i, date_id in enumerate(date_ids)
+            ),
+        )
+
+        first_depth = con.execute("SELECT COALESCE(MAX(ID), 0) FROM Depth").fetchone()[0] + 1
+        con.executemany("INSERT INTO Depth (Depth, PointKey) VALUES (?, ?)", ((depth, point) for depth in depths))
+        depth_ids = range(first_depth, first_depth + nb_depths)
+        layer = con.execute("INSERT INTO Layer (Name, Depth, PointKey) VALUES ('Layer 1', 0.4, ?)", (point,)).lastrowid
+        con.executemany(
+            """INSERT INTO ParametersDistribution (Permeability, Porosity, ThermConduct, HeatCapacity, Layer, PointKey)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            ((*rng.normal(size=4).tolist(), layer, point) for _ in range(1000)),
+        )
+
+        for quantile in quantiles:
+            quantile_id = con.execute(
+                "INSERT INTO Quantile (Quantile, PointKey) VALUES (?, ?)", (quantile, point)
+            ).lastrowid
+            values = rng.normal(12, 2, nb_depths)
+            con.executemany(
+                """INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, AdvectiveFlow, ConductiveFlow, TotalFlow, PointKey, Quantile)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    (date_id, depth_id, value, value, value, 2 * value, point, quantile_id)
+                    for date_id in date_ids
+                    for depth_id, value in zip(depth_ids, values.tolist())
+                ),
+            )
+            con.executemany(
+                "INSERT INTO WaterFlow (WaterFlow, Date, PointKey, Quantile) VALUES (?, ?, ?, ?)",
+                ((1e-6, date_id, point, quantile_id) for date_id in date_ids),
+            )
+            con.execute(
+                """INSERT INTO RMSE (Depth1, Depth2, Depth3, RMSE1, RMSE2, RMSE3, RMSETotal, PointKey, Quantile)
+                VALUES (?, ?, ?, 0.1, 0.1, 0.1, 0.3, ?, ?)""",
+                (depth_ids[nb_depths // 4], depth_ids[nb_depths // 2], depth_ids[3 * nb_depths // 4], point, quantile_id),
+            )
+    con.commit()
+    con.close()
+
+
+def viewer_queries(coordinator):
+    """
+    Return the queries executed when the window of a sampling point is opened, as a dictionary name -> query.
+    """
+    queries = {
+        "raw measures": coordinator.build_raw_measures(full_query=True),
+        "raw temperatures": coordinator.build_raw_measures(field="Temp"),
+        "raw pressure": coordinator.build_raw_measures(field="Pressure"),
+        "cleaned measures": coordinator.build_cleaned_measures(full_query=True),
+        "cleaned temperatures": coordinator.build_cleaned_measures(field="Temp"),
+        "cleaned pressure": coordinator.build_cleaned_measures(field="Pressure"),
+        "dates": coordinator.build_dates(),
+        "depths": coordinator.build_depths(),
+        "quantiles": coordinator.build_quantiles(),
+    }
+    for quantile in QUANTILES:
+        queries[f"temperatures {quantile}"] = coordinator.define_result_queries(result_type="2DMap", option="Temperature", quantile=quantile)
+        queries[f"water flows {quantile}"] = coordinator.define_result_queries(result_type="WaterFlux", quantile=quantile)
+    queries["heat flows"] = coordinator.define_result_queries(result_type="2DMap", option="HeatFlows", quantile=0)
+    return queries
+
+
+def main(path="benchmark.sqlite", nb_dates=35040, nb_depths=100, nb_points=2):
+    from PyQt5.QtCore import QCoreApplication
+    from PyQt5.QtSql import QSqlDatabase
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+    from molonaviz.backend.SPointCoordinator import SPointCoordinator
+
+    if not os.path.isfile(path):
+        start = time.perf_counter()
+        build_benchmark_database(path, int(nb_dates), int(nb_depths), int(nb_points))
+        print(f"Database built in {time.perf_counter() - start:.1f} s")
+
+    app = QCoreApplication([])
+    con = QSqlDatabase.addDatabase("QSQLITE")
+    con.setDatabaseName(path)
+    con.open()
+    coordinator = SPointCoordinator(con, STUDY_NAME, sampling_point_name(int(nb_points) - 1))
+    total = 0
+    for name, query in viewer_queries(coordinator).items():
+        start = time.perf_counter()
+        query.exec()
+        nb_rows = 0
+        while query.next():
+            nb_rows += 1
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        print(f"{name:<24} {nb_rows:10d} rows {elapsed:8.3f} s")
+    print(f"{'total':<24} {'':15} {total:8.3f} s")
+    con.close()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
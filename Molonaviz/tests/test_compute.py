@@ -0,0 +1,272 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+QtSql = pytest.importorskip("PyQt5.QtSql")
+pytest.importorskip("pyheatmy")
+from PyQt5.QtCore import QCoreApplication
+
+from benchmark_database import STUDY_NAME, build_benchmark_database, sampling_point_name
+from molonaviz.backend.Compute import RESULT_GRID_CHUNK, Compute
+from molonaviz.backend.SPointCoordinator import SPointCoordinator
+from molonaviz.utils.general import build_picture, datetime64ToDatabaseDates, fetchColumns
+
+NB_DATES = 50
+NB_CELLS = 8
+QUANTILES = (0.05, 0.5, 0.95)
+RESULT_TABLES = ["Depth", "Quantile", "TemperatureAndHeatFlows", "WaterFlow", "RMSE", "ParametersDistribution"]
+
+
+class SavedColumn:
+    """
+    The outputs of a pyheatmy Column which are saved by Compute, filled with random values.
+    """
+    def __init__(self, nb_dates, nb_cells, quantiles):
+        rng = np.random.default_rng(1)
+        self.times = [datetime(2024, 1, 1) + timedelta(minutes=15 * i) for i in range(nb_dates)]
+        self.depths = np.linspace(0.4 / nb_cells / 2, 0.4, nb_cells)
+        self.quantiles = quantiles
+        # pyheatmy returns float32 arrays (cells x dates), the temperatures in K
+        self.temperatures = {q: (285 + rng.normal(0, 2, (nb_cells, nb_dates))).astype(np.float32) for q in (0,) + quantiles}
+        self.flows = {q: rng.normal(0, 1e-6, (nb_cells, nb_dates)).astype(np.float32) for q in (0,) + quantiles}
+        self.advec_flows = rng.normal(0, 1, (nb_cells, nb_dates)).astype(np.float32)
+        self.conduc_flows = rng.normal(0, 1, (nb_cells, nb_dates)).astype(np.float32)
+        self.rmse = {q: rng.random(4) for q in (0,) + quantiles}
+        self.all_params = [rng.normal(size=(20, 5))]
+
+    def get_depths_solve(self):
+        return self.depths
+
+    get_depths_mcmc = get_depths_solve
+
+    def get_times_solve(self):
+        return self.times
+
+    get_times_mcmc = get_times_solve
+
+    def get_temperatures_solve(self):
+        return self.temperatures[0]
+
+    def get_advec_flows_solve(self):
+        return self.advec_flows
+
+    def get_conduc_flows_solve(self):
+        return self.conduc_flows
+
+    def get_flows_solve(self, depth):
+        return self.flows[0][np.argmin(np.abs(self.depths - depth))]
+
+    def get_id_sensors(self):
+        return [2, 4, 6]
+
+    def get_RMSE(self):
+        return self.rmse[0]
+
+    def get_quantiles(self):
+        return self.quantiles
+
+    def get_temperatures_quantile(self, quantile):
+        return self.temperatures[quantile]
+
+    def get_flows_quantile(self, quantile):
+        return self.flows[quantile]
+
+    def get_RMSE_quantile(self, quantile):
+        return self.rmse[quantile]
+
+    def get_all_params(self):
+        return self.all_params
+
+
+def point_database(path, connection_name, nb_dates=NB_DATES, nb_points=1, result_grids=False):
+    """
+    Sampling points with their measures and layer, but no depths and no results.
+    If result_grids is True, the database is in grid mode (see the ResultStorage table).
+    """
+    build_benchmark_database(path, nb_dates=nb_dates, nb_depths=NB_CELLS, nb_points=nb_points, quantiles=())
+    with sqlite3.connect(path) as lite:
+        lite.execute("DELETE FROM Depth")
+        lite.execute("DELETE FROM ParametersDistribution")
+        if result_grids:
+            lite.execute("INSERT INTO ResultStorage (Grids) VALUES (1)")
+    con = QtSql.QSqlDatabase.addDatabase("QSQLITE", connection_name)
+    con.setDatabaseName(path)
+    con.open()
+    return con
+
+
+def save_row_by_row(path, point, col):
+    """
+    The former save_direct_model_results then save_MCMC_results: one INSERT per row, after selecting the IDs of its date and depth.
+    """
+    lite = sqlite3.connect(path)
+
+    def date_id(time):
+        date, = datetime64ToDatabaseDates([time]).tolist()
+        return lite.execute("SELECT Date.ID FROM Date WHERE Date.PointKey = ? AND Date.Date = ?", (point, date)).fetchone()[0]
+
+    def depth_id(depth):
+        return lite.execute("SELECT Depth.ID FROM Depth WHERE Depth.PointKey = ? AND Depth.Depth = ?", (point, float(depth))).fetchone()[0]
+
+    def save_quantile(quantile, temperatures, waterFlows, computedRMSE, advecFlows=None, conduFlows=None):
+        quantileID = lite.execute("INSERT INTO Quantile (Quantile, PointKey) VALUES (?, ?)", (quantile, point)).lastrowid
+        if quantile == 0:
+            for depth in col.depths:
+                lite.execute("INSERT INTO Depth (Depth,PointKey) VALUES (?, ?)", (float(depth), point))
+        for j, time in enumerate(col.times):
+            for i, depth in enumerate(col.depths):
+                row = (date_id(time), depth_id(depth), float(temperatures[i, j]) - 273.15)
+                if advecFlows is None:
+                    lite.execute(
+                        "INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, PointKey, Quantile) VALUES (?, ?, ?, ?, ?)",
+                        row + (point, quantileID),
+                    )
+                else:
+                    lite.execute(
+                        """INSERT INTO TemperatureAndHeatFlows (Date, Depth, Temperature, AdvectiveFlow, ConductiveFlow, TotalFlow, PointKey, Quantile)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                        row + (float(advecFlows[i, j]), float(conduFlows[i, j]), float(advecFlows[i, j] + conduFlows[i, j]), point, quantileID),
+                    )
+        for j, time in enumerate(col.times):
+            lite.execute(
+                "INSERT INTO WaterFlow (WaterFlow, Date, PointKey, Quantile) VALUES (?, ?, ?, ?)",
+                (float(waterFlows[j]), date_id(time), point, quantileID),
+            )
+        depthsensors = [depth_id(col.depths[i - 1]) for i in col.get_id_sensors()]
+        lite.execute(
+            """INSERT INTO RMSE (Depth1, Depth2, Depth3, RMSE1, RMSE2, RMSE3, RMSETotal, PointKey, Quantile)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (*depthsensors, *[float(rmse) for rmse in computedRMSE], point, quantileID),
+        )
+
+    save_quantile(0, col.temperatures[0], col.flows[0][0], col.rmse[0], col.advec_flows, col.conduc_flows)
+    for quantile in col.quantiles:
+        save_quantile(quantile, col.temperatures[quantile], col.flows[quantile][0], col.rmse[quantile])
+    layer, = lite.execute("SELECT Layer.ID FROM Layer WHERE Layer.PointKey = ? AND Layer.Depth = 0.4", (point,)).fetchone()
+    for params in col.all_params[0]:
+        lite.execute(
+            """INSERT INTO ParametersDistribution (Permeability, Porosity, ThermConduct, HeatCapacity, Layer, PointKey)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            (*[float(param) for param in params[:4]], layer, point),
+        )
+    lite.commit()
+    lite.close()
+
+
+def table_rows(path, table):
+    with sqlite3.connect(path) as lite:
+        return lite.execute(f"SELECT * FROM {table} ORDER BY ID").fetchall()
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_saved_rows_match_row_by_row_inserts(app, tmp_path):
+    col = SavedColumn(NB_DATES, NB_CELLS, QUANTILES)
+    path = str(tmp_path / "batches.sqlite")
+    con = point_database(path, "computeBatches")
+    coordinator = SPointCoordinator(con, STUDY_NAME, sampling_point_name(0))
+    compute = Compute(coordinator)
+    assert not compute.compact_results
+    compute.col = col
+    compute.save_direct_model_results()
+    compute.save_MCMC_results()
+    con.close()
+
+    expected_path = str(tmp_path / "rows.sqlite")
+    point_database(expected_path, "computeRows").close()
+    save_row_by_row(expected_path, coordinator.pointID, col)
+
+    for table in RESULT_TABLES:
+        rows = table_rows(path, table)
+        assert len(rows) > 0, table
+        assert rows == table_rows(expected_path, table), table
+    assert len(table_rows(path, "TemperatureAndHeatFlows")) == NB_DATES * NB_CELLS * (1 + len(QUANTILES))
+
+
+def test_result_grids_match_row_pictures(app, tmp_path):
+    # more dates than a chunk of ResultGrid, and depths which are not saved in increasing order
+    nb_dates = RESULT_GRID_CHUNK + 37
+    col = SavedColumn(nb_dates, NB_CELLS, QUANTILES)
+    col.depths = np.random.default_rng(2).permutation(col.depths)
+    coordinators = {}
+    for compact_results in (False, True):
+        con = point_database(str(tmp_path / f"compact{compact_results}.sqlite"), f"computeCompact{compact_results}", nb_dates, result_grids=compact_results)
+        coordinators[compact_results] = SPointCoordinator(con, STUDY_NAME, sampling_point_name(0))
+        compute = Compute(coordinators[compact_results])
+        assert compute.compact_results == compact_results
+        compute.col = col
+        compute.save_direct_model_results()
+        compute.save_MCMC_results()
+    rows, grids = coordinators[False], coordinators[True]
+    databaseName = rows.con.databaseName()
+
+    assert rows.result_grids("Temperature") == {}
+    temperatures = grids.result_grids("Temperature")
+    assert sorted(temperatures) == [0] + list(QUANTILES)
+    for quantile, grid in temperatures.items():
+        query = rows.define_result_queries(result_type="2DMap", option="Temperature", quantile=quantile)
+        values, _ = fetchColumns(query, [np.float64, np.float64], databaseName)
+        # the grids hold float32 values
+        assert np.array_equal(grid, build_picture(values, nb_cells=NB_CELLS).astype(np.float32)), quantile
+    heatflows = rows.define_result_queries(result_type="2DMap", option="HeatFlows", quantile=0)
+    _, *flows, _ = fetchColumns(heatflows, [object] + [np.float64]*4, databaseName) #Date, advective, conductive, total, depth
+    for field, values in zip(["AdvectiveFlow", "ConductiveFlow", "TotalFlow"], flows):
+        grid, = grids.result_grids(field).values()
+        assert grid.shape == (NB_CELLS, nb_dates)
+        assert np.array_equal(grid, build_picture(values, nb_cells=NB_CELLS).astype(np.float32)), field
+
+    with sqlite3.connect(grids.con.databaseName()) as lite:
+        chunks = lite.execute("SELECT Field, FirstDate, NbDates FROM ResultGrid ORDER BY ID").fetchall()
+        assert lite.execute("SELECT COUNT(*) FROM TemperatureAndHeatFlows").fetchone()[0] == 0
+    assert len(chunks) == 2 * (4 + len(QUANTILES))
+    assert chunks[:2] == [("Temperature", 0, RESULT_GRID_CHUNK), ("Temperature", RESULT_GRID_CHUNK, 37)]
+
+    grids.delete_computations()
+    assert grids.result_grids("Temperature") == {}
+    with sqlite3.connect(grids.con.databaseName()) as lite:
+        assert lite.execute("SELECT COUNT(*) FROM ResultGrid").fetchone()[0] == 0
+    for coordinator in coordinators.values():
+        coordinator.con.close()
+
+
+def test_database_mixing_rows_and_grids(app, tmp_path):
+    # the first point is saved before the database switches to grid mode, the second one after
+    col = SavedColumn(NB_DATES, NB_CELLS, QUANTILES)
+    path = str(tmp_path / "mixed.sqlite")
+    con = point_database(path, "computeMixed", nb_points=2)
+    rows, grids = (SPointCoordinator(con, STUDY_NAME, sampling_point_name(i)) for i in range(2))
+    for coordinator in (rows, grids):
+        if coordinator is grids:
+            with sqlite3.connect(path) as lite:
+                lite.execute("INSERT INTO ResultStorage (Grids) VALUES (1)")
+        compute = Compute(coordinator)
+        assert compute.compact_results == (coordinator is grids)
+        compute.col = col
+        compute.save_direct_model_results()
+        compute.save_MCMC_results()
+
+    with sqlite3.connect(path) as lite:
+        assert lite.execute("SELECT DISTINCT PointKey FROM TemperatureAndHeatFlows").fetchall() == [(rows.pointID,)]
+        assert lite.execute("SELECT DISTINCT PointKey FROM ResultGrid").fetchall() == [(grids.pointID,)]
+    assert rows.result_grids("Temperature") == {}
+    temperatures = grids.result_grids("Temperature")
+    assert sorted(temperatures) == [0] + list(QUANTILES)
+    for quantile, grid in temperatures.items():
+        query = rows.define_result_queries(result_type="2DMap", option="Temperature", quantile=quantile)
+        values, _ = fetchColumns(query, [np.float64, np.float64], path)
+        assert np.array_equal(grid, build_picture(values, nb_cells=NB_CELLS).astype(np.float32)), quantile
+    # the other results are stored in the same way for both points
+    for table in ["WaterFlow", "RMSE", "ParametersDistribution"]:
+        assert len(table_rows(path, table)) > 0, table
+        with sqlite3.connect(path) as lite:
+            counts = dict(lite.execute(f"SELECT PointKey, COUNT(*) FROM {table} GROUP BY PointKey").fetchall())
+        assert counts[rows.pointID] == counts[grids.pointID], table
+
+    rows.delete_computations()
+    assert np.array_equal(grids.result_grids("Temperature")[0], temperatures[0])
+    con.close()
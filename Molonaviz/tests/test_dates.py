@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import matplotlib.dates as mdates
+import numpy as np
+import pytest
+
+QtSql = pytest.importorskip("PyQt5.QtSql")
+from PyQt5.QtCore import QCoreApplication
+
+from benchmark_database import STUDY_NAME, build_benchmark_database, sampling_point_name
+from molonaviz.backend.SPointCoordinator import SPointCoordinator
+from molonaviz.utils.general import databaseDatesToDatetime64, datetime64ToDatabaseDates, datetime64ToMdates
+
+NB_DATES = 200
+NB_DEPTHS = 10
+
+
+def test_conversions():
+    strings = np.array(["2024/01/01 00:00:00", "2024/03/05 12:15:30"], dtype=object)
+    dates = databaseDatesToDatetime64(strings)
+    assert dates.dtype == np.dtype("datetime64[s]")
+    assert dates.tolist() == [datetime(2024, 1, 1), datetime(2024, 3, 5, 12, 15, 30)]
+    assert datetime64ToDatabaseDates(dates).tolist() == strings.tolist()
+
+    seconds = datetime64ToDatabaseDates(dates.tolist(), epoch=True)
+    assert seconds.tolist() == [1704067200, 1709640930]
+    # integer seconds read by QSqlQuery or sqlite3 come in object arrays
+    assert np.array_equal(databaseDatesToDatetime64(np.array(seconds.tolist(), dtype=object)), dates)
+
+    assert np.allclose(datetime64ToMdates(dates), [mdates.date2num(date) for date in dates.tolist()])
+    assert databaseDatesToDatetime64([]).shape == (0,) and datetime64ToMdates([]).shape == (0,)
+
+
+@pytest.fixture(scope="module")
+def coordinators(tmp_path_factory):
+    """
+    The same sampling point in a database storing strings and in a database storing integer seconds.
+    """
+    app = QCoreApplication.instance() or QCoreApplication([])
+    connections = []
+    for epoch_dates in (False, True):
+        path = str(tmp_path_factory.mktemp("dates") / "Molonari.sqlite")
+        build_benchmark_database(path, nb_dates=NB_DATES, nb_depths=NB_DEPTHS, nb_points=2, epoch_dates=epoch_dates)
+        con = QtSql.QSqlDatabase.addDatabase("QSQLITE", f"epoch{epoch_dates}")
+        con.setDatabaseName(path)
+        con.open()
+        connections.append(con)
+    yield [SPointCoordinator(con, STUDY_NAME, sampling_point_name(1)) for con in connections]
+    for con in connections:
+        con.close()
+
+
+def test_epoch_dates(coordinators):
+    strings, epoch = coordinators
+    assert not strings.epoch_dates and epoch.epoch_dates
+
+    for coordinator in coordinators:
+        coordinator.refresh_all_models(raw_measures_plot=False, layer=0.4)
+    for get_model in ["get_pressure_model", "get_temp_model", "get_temp_map_model", "get_heatfluxes_model", "get_water_fluxes_model"]:
+        expected = getattr(strings, get_model)().get_dates()
+        assert len(expected) == NB_DATES
+        assert np.array_equal(getattr(epoch, get_model)().get_dates(), expected), get_model
+    assert epoch.get_temp_map_model().get_depth_by_temp(4)[1].keys() == strings.get_temp_map_model().get_depth_by_temp(4)[1].keys()
+
+    assert epoch.all_raw_measures() == strings.all_raw_measures()
+    assert epoch.all_cleaned_measures() == strings.all_cleaned_measures()
+    assert epoch.all_cleaned_measures()[1][0][0] == datetime(2024, 1, 1, 0, 15)
+
+    # the tables show the dates as strings in both modes
+    for raw_measures in (True, False):
+        table = epoch.get_table_model(raw_measures)
+        assert table.data(table.index(0, 0)) == "2024/01/01 00:00:00"
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+QtSql = pytest.importorskip("PyQt5.QtSql")
+from PyQt5.QtCore import QCoreApplication
+
+from benchmark_database import ERD_PATH, STUDY_NAME, build_benchmark_database, sampling_point_name, viewer_queries
+from molonaviz.backend.GraphsModels import HeatFluxesModel, PressureDataModel, SolvedTemperatureModel, TemperatureDataModel, WaterFluxModel
+from molonaviz.backend.SPointCoordinator import SPointCoordinator
+from molonaviz.utils.general import upgradeDatabase
+
+NB_DATES = 300
+NB_DEPTHS = 12
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("benchmark") / "Molonari.sqlite")
+    build_benchmark_database(path, nb_dates=NB_DATES, nb_depths=NB_DEPTHS, nb_points=3)
+    app = QCoreApplication.instance() or QCoreApplication([])
+    con = QtSql.QSqlDatabase.addDatabase("QSQLITE")
+    con.setDatabaseName(path)
+    con.open()
+    # second of the three points: its rows are neither the first nor the last of the tables
+    coordinator = SPointCoordinator(con, STUDY_NAME, sampling_point_name(1))
+    yield path, coordinator
+    con.close()
+
+
+def query_plan(path, query):
+    with sqlite3.connect(path) as lite:
+        return [row[3] for row in lite.execute("EXPLAIN QUERY PLAN " + query.lastQuery())]
+
+
+def test_viewer_queries_only_search_indexes(database):
+    path, coordinator = database
+    for name, query in viewer_queries(coordinator).items():
+        plan = query_plan(path, query)
+        # every table is reached through an index: no full scan, and at most the depths of one date are sorted
+        assert all(not step.startswith("SCAN") for step in plan), (name, plan)
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan, (name, plan)
+
+
+def test_viewer_queries_results(database):
+    path, coordinator = database
+    queries = viewer_queries(coordinator)
+    for name in ["raw measures", "cleaned measures", "dates", "water flows 0.5"]:
+        query = queries[name]
+        assert query.exec()
+        dates = []
+        while query.next():
+            dates.append(query.value(0))
+        assert len(dates) == NB_DATES and dates == sorted(dates), name
+
+    model = SolvedTemperatureModel([])
+    model.new_queries([coordinator.build_dates(), coordinator.build_depths()] + coordinator.build_result_queries(result_type="2DMap", option="Temperature"))
+    with sqlite3.connect(path) as lite:
+        expected = np.array(
+            lite.execute(
+                """SELECT Temperature FROM TemperatureAndHeatFlows
+                JOIN Quantile ON TemperatureAndHeatFlows.Quantile = Quantile.ID
+                WHERE Quantile.PointKey = ? AND Quantile.Quantile = 0.5 ORDER BY TemperatureAndHeatFlows.ID""",
+                (coordinator.pointID,),
+            ).fetchall()
+        ).reshape(NB_DATES, NB_DEPTHS).T
+    assert np.array_equal(model.get_temperatures_cmap(0.5), expected)
+    assert np.array_equal(model.get_depths(), np.sort(model.get_depths()))
+
+
+def test_models_bulk_fetch(database):
+    path, coordinator = database
+    coordinator.refresh_all_models(raw_measures_plot=False, layer=0.4)
+    # the bulk fetched queries are only executed by sqlite3, never by Qt
+    for get_model in ["get_pressure_model", "get_temp_model", "get_temp_map_model", "get_heatfluxes_model", "get_water_fluxes_model"]:
+        assert not any(query.isSelect() for query in getattr(coordinator, get_model)().queries), get_model
+
+    # same queries read row by row by models which do not know the database file
+    pressure = PressureDataModel([])
+    pressure.new_queries([coordinator.build_cleaned_measures(field="Pressure")])
+    temperature = TemperatureDataModel([])
+    temperature.new_queries([coordinator.build_cleaned_measures(field="Temp")])
+    water = WaterFluxModel([])
+    water.new_queries(coordinator.build_result_queries(result_type="WaterFlux"))
+    heat = HeatFluxesModel([])
+    heat.new_queries([coordinator.build_dates(), coordinator.build_depths()] + coordinator.build_result_queries(result_type="2DMap", option="HeatFlows"))
+    solved = SolvedTemperatureModel([])
+    solved.new_queries([coordinator.build_dates(), coordinator.build_depths()] + coordinator.build_result_queries(result_type="2DMap", option="Temperature"))
+
+    assert np.array_equal(coordinator.get_pressure_model().get_dates(), pressure.get_dates())
+    assert np.array_equal(coordinator.get_pressure_model().get_pressure(), pressure.get_pressure())
+    assert len(pressure.get_pressure()) == NB_DATES
+    for bulk, rows in zip(coordinator.get_temp_model().get_temperatures(), temperature.get_temperatures()):
+        assert np.array_equal(bulk, rows)
+
+    direct_model, flows = coordinator.get_water_fluxes_model().get_water_flow()
+    expected_direct_model, expected_flows = water.get_water_flow()
+    assert np.array_equal(direct_model, expected_direct_model) and len(direct_model) == NB_DATES
+    assert flows.keys() == expected_flows.keys() and all(np.array_equal(flows[q], expected_flows[q]) for q in flows)
+    assert np.array_equal(coordinator.get_water_fluxes_model().get_dates(), water.get_dates())
+
+    assert np.array_equal(coordinator.get_heatfluxes_model().get_total_flow(), heat.get_total_flow())
+    assert coordinator.get_heatfluxes_model().get_total_flow().shape == (NB_DEPTHS, NB_DATES)
+    for quantile in (0, 0.05, 0.5, 0.95):
+        assert np.array_equal(coordinator.get_temp_map_model().get_temperatures_cmap(quantile), solved.get_temperatures_cmap(quantile))
+    assert np.array_equal(coordinator.get_temp_map_model().get_depths(), solved.get_depths())
+
+
+def test_upgrade_creates_missing_indexes(tmp_path):
+    path = str(tmp_path / "Molonari.sqlite")
+    with sqlite3.connect(path) as lite:
+        with open(ERD_PATH, "r") as f:
+            lite.executescript(f.read())
+        indexes = [row[0] for row in lite.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")]
+        # database created before the indexes and the ResultGrid table
+        for index in indexes:
+            lite.execute(f"DROP INDEX {index}")
+        lite.execute("DROP TABLE ResultGrid")
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    con = QtSql.QSqlDatabase.addDatabase("QSQLITE", "upgrade")
+    con.setDatabaseName(path)
+    con.open()
+    upgradeDatabase(con, ERD_PATH)
+    upgradeDatabase(con, ERD_PATH)  # nothing to do the second time
+    con.close()
+
+    with sqlite3.connect(path) as lite:
+        names = {row[0] for row in lite.execute("SELECT name FROM sqlite_master")}
+    assert "ResultGrid" in names and set(indexes) <= names
+
+
+def test_erd_structure_copies_are_identical():
+    # the application creates and upgrades databases from docs/ERD_structure.sql, the receiver from backend/ERD_structure.sql
+    backend_erd = os.path.join(os.path.dirname(ERD_PATH), "..", "backend", "ERD_structure.sql")
+    with open(ERD_PATH, "rb") as docs, open(backend_erd, "rb") as backend:
+        assert docs.read() == backend.read()
@@ -0,0 +1,112 @@
+"""
+Points de reprise de la MCMC (arguments checkpoint, checkpoint_every et resume_from de Column.compute_mcmc).
+
+Un point de reprise contient l'état complet de l'échantillonneur au début d'une itération : états et énergies
+des chaînes, probabilités de crossover, accumulateur de Gelman-Rubin, archive de DREAM(ZS), trace et échantillons
+déjà stockés, ainsi que l'état des générateurs aléatoires (module random, état global de numpy et générateur des
+propositions DREAM). Un run repris avec resume_from produit donc exactement les mêmes résultats que le run
+ininterrompu.
+
+Le fichier est écrit à côté de sa destination puis renommé : un arrêt du processus pendant l'écriture laisse
+le point de reprise précédent intact.
+"""
+
+import os
+import pickle
+import random
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+TRACE_ARRAYS = ("params", "energy", "sigma2_temp", "accepted")
+
+
+def save_checkpoint(path, settings, state):
+    """
+    Écrit le point de reprise path. settings décrit le run (arguments de compute_mcmc dont dépendent les
+    résultats), state l'état de l'échantillonneur ; les états des générateurs aléatoires globaux y sont ajoutés.
+    """
+    path = os.path.expanduser(path)
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "settings": settings,
+        "state": state,
+        "python_random": random.getstate(),
+        "numpy_random": np.random.get_state(),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, settings):
+    """
+    Relit le point de reprise path et vérifie qu'il provient d'un run de mêmes réglages settings.
+
+    Returns
+    -------
+    checkpoint : dict
+        "state" (état de l'échantillonneur) et états des générateurs aléatoires, à restaurer par
+        restore_random_states au moment de reprendre.
+    """
+    with open(os.path.expanduser(path), "rb") as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"{path} is not a checkpoint of this version of pyheatmy (version {checkpoint.get('version')})"
+        )
+    mismatch = [
+        key
+        for key in sorted(set(settings) | set(checkpoint["settings"]))
+        if settings.get(key) != checkpoint["settings"].get(key)
+    ]
+    if mismatch:
+        raise ValueError(
+            f"Cannot resume from {path} : the run was started with different "
+            + ", ".join(
+                f"{key} ({checkpoint['settings'].get(key)!r} != {settings.get(key)!r})"
+                for key in mismatch
+            )
+        )
+    return checkpoint
+
+
+def restore_random_states(checkpoint):
+    """Remet le module random et l'état global de numpy dans l'état du point de reprise."""
+    random.setstate(checkpoint["python_random"])
+    np.random.set_state(checkpoint["numpy_random"])
+
+
+def samples_state(trace, temp, flows, nb_states, nb_samples, quantile_mode):
+    """
+    Partie remplie de la trace (nb_states premiers états) et des échantillons (nb_samples premiers) à
+    enregistrer. En mode "online" les estimateurs de quantiles sont enregistrés en entier ; en mode "disk" les
+    tableaux sont déjà sur disque et seul l'état initial de la trace est gardé, car l'initialisation de la
+    reprise le réécrit.
+    """
+    if quantile_mode == "disk":
+        nb_states = 1
+    state = {
+        "trace": {name: np.array(getattr(trace, name)[:nb_states]) for name in TRACE_ARRAYS}
+    }
+    if quantile_mode == "online":
+        state["samples"] = (temp, flows)
+    elif quantile_mode == "exact":
+        state["samples"] = (np.array(temp[:nb_samples]), np.array(flows[:nb_samples]))
+    return state
+
+
+def restore_samples(state, trace, temp, flows, quantile_mode):
+    """Recopie la trace et les échantillons enregistrés par samples_state, renvoie les échantillons (temp, flows)."""
+    for name, rows in state["trace"].items():
+        getattr(trace, name)[: len(rows)] = rows
+    if quantile_mode == "online":
+        return state["samples"]
+    if quantile_mode == "exact":
+        saved_temp, saved_flows = state["samples"]
+        temp[: len(saved_temp)] = saved_temp
+        flows[: len(saved_flows)] = saved_flows
+    return temp, flows
@@ -141,4 +141,8 @@ NBCHAINS = 10
 # MCMC parametrization
 NITMCMC = 200
 NBBURNING = 25
-NSAMPLEMIN = 200 #200 is the minimal number of sample for a proper calculation of the quantiles, pb of initialisation
\ No newline at end of file
+NSAMPLEMIN = 200 #200 is the minimal number of sample for a proper calculation of the quantiles, pb of initialisation
+# stockage sur disque des échantillons de la MCMC (quantile_mode="disk")
+MCMC_SAMPLES_DIR = "mcmc_samples"
+QUANTILE_CHUNK_BYTES = 2**28  # taille maximale d'un bloc d'échantillons chargé en mémoire pour le calcul des quantiles
+MISFIT_BUDGET_MARGIN = 1e-6  # marge relative sur le budget d'écart aux mesures avant d'interrompre un modèle direct de la MCMC
@@ -1,14 +1,13 @@
 from typing import List, Sequence, Union
 from random import random, choice
-from operator import attrgetter
 from numbers import Number
+from copy import deepcopy
 from datetime import datetime
 import sys
+import multiprocessing
 import psutil
-import types
 
 import numpy as np
-import copy
 import matplotlib.pyplot as plt
 from tqdm import trange
 from scipy.interpolate import interp1d
@@ -16,13 +15,23 @@ from matplotlib.colors import LinearSegmentedColormap
 
 from pyheatmy.lagrange import Lagrange
 from pyheatmy.params import Param, Prior, PARAM_LIST, calc_K
-from pyheatmy.state import State
+from pyheatmy.state import McmcTrace
 from pyheatmy.checker import checker
 from pyheatmy.config import *
 from pyheatmy.linear_system import *
 
 from pyheatmy.utils import *
 from pyheatmy.layers import Layer, getListParameters
+from pyheatmy.solver_context import SolverContext
+from pyheatmy.quantiles import P2Quantiles
+from pyheatmy.sample_store import DiskSampleStore, quantiles_by_time_chunks
+from pyheatmy.checkpoint import (
+    save_checkpoint,
+    load_checkpoint,
+    restore_random_states,
+    samples_state,
+    restore_samples,
+)
 
 
 # Column is a monolithic class and pyheatmy is executable from there. Calculation, retrieval and plots are methods from the column class
@@ -88,10 +97,13 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
         self._flows = None
         # le tableau contenant le flux advectif latéral (pseudo2D) à tout temps et à toute profondeur (lignes : flux) (colonnes : temps)
         self._lateral_advec_heat_flux = None
+        # tableaux réutilisés par compute_solve_transi(reuse_buffers=True) : (H_res, nablaH, T_res, source_heat_flux, flows)
+        self._result_buffers = None
+        # état initial du modèle direct imposé par set_initial_state (sinon profils interpolés au premier temps)
+        self._initial_state = None
 
-        # liste contenant des objets de classe état et de longueur le nombre d'états acceptés par la MCMC (<=nb_iter), passe à un moment par une longueur de 1000 pendant l'initialisation de MCMC
-        self._states = list()
-        self._acceptances = None
+        # trace (McmcTrace) des états des chaînes de la MCMC : paramètres, énergie, sigma2 et acceptation à chaque itération
+        self._trace = None
         # dictionnaire indexé par les quantiles (0.05,0.5,0.95) à qui on a associe un array de deux dimensions : dimension 1 les profondeurs, dimension 2 : liste des valeurs de températures associées au quantile, de longueur les temps de mesure
         self._quantiles_temperatures = None
         # dictionnaire indexé par les quantiles (0.05,0.5,0.95) à qui on a associe un array de deux dimensions : dimension 1 les profondeurs, dimension 2 : liste des valeurs de débits spécifiques associés au quantile, de longueur les temps de mesure
@@ -117,6 +129,16 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
             print(f"list of dates   : {self._times}")
         self.initialization(nb_cells)
 
+    def __getstate__(self):
+        # Les méthodes décorées par @checker sont rattachées à l'instance lors de leur premier appel (voir checker.py)
+        # et ne sont pas sérialisables : on ne les transmet pas (copie, pickle),
+        # elles seront rattachées de nouveau au prochain appel.
+        return {
+            key: value
+            for key, value in self.__dict__.items()
+            if not hasattr(value, "needed")
+        }
+
     def set_layers(
         self, layer: Union[Layer, List[Layer]]
     ):  # instancie une couche ou une liste de couches à la colonne, en s'assurant de bien ordonner les couches
@@ -200,473 +222,250 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
     #
     # #######################################################################################"
 
-    @checker
-    def compute_solve_transi(self, verbose=True):
-        layersList = self.all_layers
-        nb_cells = self._nb_cells
-
-        if len(layersList) == 1:
-            layer = layersList[
-                0
-            ]  # Cas homogène, formalisé en une seule couche faisant la taille de la colonne
-            dz = self._real_z[-1] / nb_cells  # profondeur d'une cellule
-            self._z_solve = dz / 2 + np.array(
-                [k * dz for k in range(nb_cells)]
-            )  # le tableau contenant la profondeur du milieu des cellules
-            self._id_sensors = [
-                np.argmin(np.abs(z - self._z_solve)) for z in self._real_z[1:-1]
-            ]
-
-            all_dt = np.array(
-                [
-                    (self._times[j + 1] - self._times[j]).total_seconds()
-                    for j in range(len(self._times) - 1)
-                ]
-            )  # le tableau des pas de temps (dépend des données d'entrée)
-            isdtconstant = np.all(all_dt == all_dt[0])
-
-            all_dt = np.array(
-                [
-                    (self._times[j + 1] - self._times[j]).total_seconds()
-                    for j in range(len(self._times) - 1)
-                ]
-            )  # le tableau des pas de temps (dépend des données d'entrée)
-            isdtconstant = np.all(all_dt == all_dt[0])
-
-            H_init = self._dH[0] - self._dH[0] * self._z_solve / self._real_z[-1]
-            # fixe toutes les charges de l'aquifère à 0 (à tout temps)
-            H_aq = np.zeros(len(self._times))
-
-            H_riv = self._dH  # self.dH contient déjà les charges de la rivière à tout temps, stocke juste dans une variable locale
+    def _build_direct_model(self, verbose=False, H_res=None):
+        """
+        Prépare le modèle direct pour les paramètres courants des couches : discrétisation,
+        conditions initiales et aux limites (SolverContext), et instance de H_stratified
+        (qui écrira les charges dans H_res s'il est fourni).
 
-            # crée les températures initiales (t=0) sur toutes les profondeurs (milieu des cellules)
-            if self.inter_mode == "lagrange":
-                T_init = np.array([self.lagr(z) for z in self._z_solve])
-            elif self.inter_mode == "linear":
-                T_init = self.linear(self._z_solve)
+        Returns
+        -------
+        H_strat : H_stratified
+            système linéaire de la charge, qui porte aussi les paramètres thermiques.
+        K_flows : float array
+            perméabilité de chaque cellule utilisée pour le débit spécifique (-K * nablaH).
+        """
+        solver_context = SolverContext(self, verbose)
+        self._z_solve = solver_context.z_solve
+        self._id_sensors = solver_context.id_sensors
+        return solver_context.build_direct_model(
+            self.get_list_current_params(), verbose, H_res
+        )
 
-            T_riv = self._T_riv
-            T_aq = self._T_aq
+    @checker
+    def compute_solve_transi(self, verbose=True, reuse_buffers=False):
+        """
+        Modèle direct pour les paramètres courants des couches.
 
-            IntrinK, n, lambda_s, rhos_cs, q_s = layer.get_physical_params()
-            if verbose:
-                print(
-                    "--- Compute Solve Transi ---",
-                    f"One layer : IntrinK = {IntrinK}, n = {n}, lambda_s = {lambda_s}, rhos_cs = {rhos_cs}, q_s = {q_s}",
-                    sep="\n",
+        Avec reuse_buffers=True, les résultats (charges, températures, débits) sont écrits dans des
+        tableaux détenus par la colonne et réutilisés d'un appel à l'autre au lieu d'être alloués :
+        les tableaux renvoyés par les getters sont alors écrasés par l'appel suivant. C'est le mode
+        utilisé par compute_mcmc, qui enchaîne les modèles directs.
+        """
+        out = None
+        if reuse_buffers:
+            shape = (self._nb_cells, len(self._times))
+            if self._result_buffers is None or self._result_buffers[0].shape != shape:
+                self._result_buffers = allocate_HT_buffers(*shape) + (
+                    np.empty(shape, np.float32),
                 )
+            out = self._result_buffers[:4]
 
-            heigth = abs(self._real_z[-1] - self._real_z[0])
-            Ss = n / heigth  # l'emmagasinement spécifique = porosité sur la hauteur
-
-            ## pour le cas uni-couche, on le simule dans H_stratified avec deux couches de mêmes paramètres
-            array_IntrinK = np.array([IntrinK, IntrinK])
-            # array_K = 10 ** (-array_IntrinK * 1.0)
-            array_K = (RHO_W * G * 10.0**-array_IntrinK) * 1.0 / MU
-            array_q_s = np.array([q_s, q_s])
-            array_Ss = np.array([Ss, Ss])
-            list_zLow = np.array([0.2])
-            inter_cara = np.array([[nb_cells // 2, 0]])
-            z_solve = self._z_solve.copy()
-            IntrinK_list, n_list, lambda_s_list, rhos_cs_list, q_s_list = (
-                getListParameters(layersList, nb_cells)
-            )
-            Ss_list = n_list / heigth
-
-            ##
-
-            H_strat = H_stratified(
-                Ss_list,
-                IntrinK_list,
-                n_list,
-                lambda_s_list,
-                rhos_cs_list,
-                all_dt,
-                q_s_list,
-                dz,
-                H_init,
-                H_riv,
-                H_aq,
-                T_init,
-                array_K,
-                array_Ss,
-                list_zLow,
-                z_solve,
-                inter_cara,
-                isdtconstant,
-                alpha=ALPHA,
-            )
-            H_res = H_strat.compute_H_stratified()
+        H_strat, K_flows = self._build_direct_model(
+            verbose, H_res=None if out is None else out[0]
+        )
+        multilayer = len(self.all_layers) > 1
 
-            nablaH = H_strat.nablaH()
+        # trajectoire complète H, nablaH (réparé aux interfaces en multicouche) et T en un seul appel compilé
+        H_res, nablaH, T_res, source_heat_flux = solve_HT_stratified(
+            H_strat, self._T_riv, self._T_aq, correct_interfaces=multilayer, out=out
+        )
 
-            T_strat = T_stratified(
+        self._H_res = H_res  # stocke les résultats
+        self._temperatures = T_res
+        # calcul du débit spécifique
+        if out is None:
+            self._flows = (-K_flows[:, np.newaxis] * nablaH).astype(np.float32)
+        else:
+            self._flows = np.multiply(
+                -K_flows[:, np.newaxis],
                 nablaH,
-                Ss_list,
-                IntrinK_list,
-                n_list,
-                lambda_s_list,
-                rhos_cs_list,
-                all_dt,
-                q_s_list,
-                dz,
-                H_init,
-                H_riv,
-                H_aq,
-                T_init,
-                T_riv,
-                T_aq,
-                alpha=ALPHA,
-                N_update_Mu=N_UPDATE_MU,
+                out=self._result_buffers[4],
+                casting="unsafe",
             )
-            T_res = T_strat.compute_T_stratified()
 
+        if not multilayer:
             # on récupère le flux de chaleur latéral (W.m-3) et on convertit en (W.m-2) en multipliant par dz
-            if hasattr(T_strat, "source_heat_flux"):
-                self._lateral_advec_heat_flux = T_strat.source_heat_flux * dz
+            self._lateral_advec_heat_flux = source_heat_flux * H_strat.dz
 
-            # calcule toutes les températures à tout temps et à toute profondeur
-
-            self._temperatures = T_res
-            self._H_res = H_res  # stocke les résultats
-
-            K = calc_K(
-                IntrinK
-            )  # NF it will need to be changed with the dependency to temperature
-            if verbose:
-                print(
-                    f"Solving the flow with intrinsec permeability {IntrinK}, and permeability {K}"
-                )
-            self._flows = -K * nablaH  # calcul du débit spécifique
+        if verbose:
+            print("Done.")
 
-            if verbose:
-                print("Done.")
+        if multilayer and (
+            np.isnan(self._temperatures).any() or np.isnan(self._flows).any()
+        ):
+            print(
+                f"Issue for the following parameters : {self.get_list_current_params()}"
+            )
+            print(f"Issue for the follwing number of layers : {len(self.all_layers)}")
+            raise ValueError("NaN values in compute_solve_transi")
 
-        else:  # case multiple layers
-            dz = self._real_z[-1] / nb_cells  # profondeur d'une cellule
-            self._z_solve = dz / 2 + np.array([k * dz for k in range(nb_cells)])
+    def compute_solve_transi_batch(self, X, verbose=False):
+        """
+        Modèle direct pour plusieurs jeux de paramètres à la fois, par exemple une proposition
+        par chaîne DREAM. Les systèmes tridiagonaux de tous les jeux sont résolus ensemble
+        à chaque pas de temps. Les paramètres des couches de la colonne ne sont pas modifiés.
 
-            self._id_sensors = [
-                np.argmin(np.abs(z - self._z_solve)) for z in self._real_z[1:-1]
-            ]
+        Parameters
+        ----------
+        X : float array (n_chains, n_layers, n_params)
+            paramètres de travail (MCMC) de chaque couche pour chaque jeu, comme X et X_proposal dans compute_mcmc.
 
-            all_dt = np.array(
-                [
-                    (self._times[j + 1] - self._times[j]).total_seconds()
-                    for j in range(len(self._times) - 1)
-                ]
-            )  # le tableau des pas de temps (dépend des données d'entrée)
-            isdtconstant = np.all(all_dt == all_dt[0])
-
-            H_init = (
-                self._dH[0] - self._dH[0] * self._z_solve / self._real_z[-1]
-            )  # linear interpolation not usabe in multiple case
-            # fixe toutes les charges de l'aquifère à 0 (à tout temps)
-            H_aq = np.zeros(len(self._times))
-            H_riv = self._dH  # self.dH contient déjà les charges de la rivière à tout temps, stocke juste dans une variable locale
-            # crée les températures initiales (t=0) sur toutes les profondeurs (milieu des cellules)
-
-            if self.inter_mode == "lagrange":
-                T_init = np.array([self.lagr(z) for z in self._z_solve])
-            elif self.inter_mode == "linear":
-                T_init = self.linear(self._z_solve)
-
-            T_riv = self._T_riv
-            T_aq = self._T_aq
-
-            IntrinK_list, n_list, lambda_s_list, rhos_cs_list, q_s_list = (
-                getListParameters(layersList, nb_cells)
-            )
+        Returns
+        -------
+        temperatures, flows : float32 arrays (n_chains, nb_cells, n_times)
+        """
+        return SolverContext(self).solve_batch(X, verbose)
 
-            array_IntrinK = np.array(
-                [
-                    float(layer.get_physical_params().IntrinK)
-                    for layer in self.all_layers
-                ]
-            )
-            array_k = 10 ** (-array_IntrinK)
-            array_K = calc_K(array_k)
-            heigth = abs(self._real_z[-1] - self._real_z[0])
-            array_Ss = (
-                np.array([float(x.get_physical_params().n) for x in layersList])
-                / heigth
+    def _evaluate_proposals(
+        self,
+        solver_context,
+        chain_pool,
+        n_workers,
+        X,
+        sigma2_temp,
+        sigma2_distrib,
+        ind_ref,
+        temp_ref,
+        sous_ech=None,
+        energy_budget=None,
+        coarse=False,
+    ):
+        """
+        Évalue les propositions de toutes les chaînes avec le contexte solver_context, dans ce processus
+        si chain_pool est None, sinon en répartissant les chaînes par blocs sur les processus du pool
+        (qui détiennent chacun une copie du contexte). Voir _evaluate_chains pour energy_budget.
+        coarse indique que solver_context est le modèle grossier de compute_mcmc, dont les processus du pool
+        détiennent aussi une copie : ind_ref et temp_ref sont alors ceux de ce modèle.
+        """
+        sigma2_density = np.array([sigma2_distrib(s) for s in sigma2_temp])
+        if chain_pool is None:
+            return _evaluate_chains(
+                solver_context,
+                X,
+                sigma2_temp,
+                sigma2_density,
+                ind_ref,
+                temp_ref,
+                sous_ech,
+                energy_budget,
+                solver_context.time_ratio,
             )
-            array_eps = np.zeros(len(layersList))  # eps de chaque couche
-            array_eps[0] = layersList[0].zLow
-
-            for idx in range(1, len(layersList)):
-                array_eps[idx] = layersList[idx].zLow - layersList[idx - 1].zLow
-            array_Hinter = np.zeros(
-                len(layersList) + 1
-            )  # charge hydraulique de chaque interface
-            array_Hinter[0] = self._dH[0]
-            array_Hinter[-1] = 0.0
-            N = len(array_Hinter) - 1
-            # calculate Hinter
-            H_gauche = np.zeros((N - 1, N - 1))
-            H_droite = np.zeros((N - 1, N - 1))
-            scalar_gauche = np.zeros(N - 1)
-            scalar_droite = np.zeros(N - 1)
-            scalar_gauche[0] = array_K[0] * array_Hinter[0] / array_eps[0]
-            scalar_droite[-1] = -array_K[-1] * array_Hinter[-1] / array_eps[-1]
-            H_gauche[0, 0] = -array_K[0] / array_eps[0]
-            for diag in range(1, N - 1):
-                H_gauche[diag, diag - 1] = array_K[diag] / array_eps[diag]
-                H_gauche[diag, diag] = -array_K[diag] / array_eps[diag]
-
-            H_droite[N - 2, N - 2] = array_K[-1] / array_eps[-1]
-            for diag in range(0, N - 2):
-                H_droite[diag, diag + 1] = -array_K[diag + 1] / array_eps[diag + 1]
-                H_droite[diag, diag] = array_K[diag + 1] / array_eps[diag + 1]
-
-            Matrix_b = scalar_gauche - scalar_droite
-            Matrix_A = H_droite - H_gauche
-            H_sol = np.linalg.solve(Matrix_A, Matrix_b)
-            for idx in range(len(H_sol)):
-                array_Hinter[idx + 1] = H_sol[idx]
-            #
-            # list_array_L: couper le profondeur selon l'épaisseur de chaque couche
-            list_array_L = []
-            cnt = 0
-            for idx in range(len(layersList) - 1):
-                cnt_start = cnt
-                while cnt < len(self._z_solve):
-                    if (
-                        self._z_solve[cnt] <= layersList[idx].zLow
-                        and self._z_solve[cnt + 1] > layersList[idx].zLow
-                    ):
-                        list_array_L.append(self._z_solve[cnt_start : cnt + 1])
-                        cnt += 1
-                        break
-                    else:
-                        cnt += 1
-            list_array_L.append(self._z_solve[cnt:])
-
-            #
-            # calculer H de chaque couche
-
-            list_array_H = []
-            for idx in range(len(list_array_L)):
-                if idx > 0:
-                    list_array_H.append(
-                        array_Hinter[idx]
-                        - (array_Hinter[idx] - array_Hinter[idx + 1])
-                        / array_eps[idx]
-                        * (list_array_L[idx] - layersList[idx - 1].zLow)
-                    )
-                else:
-                    list_array_H.append(
-                        array_Hinter[idx]
-                        - (array_Hinter[idx] - array_Hinter[idx + 1])
-                        / array_eps[idx]
-                        * (list_array_L[idx] - 0)
-                    )
-            # if verbose:
-            #     print("charge hydraulique sur chaque interface", array_Hinter)
-            #     for idx in range(len(list_array_L)):
-            #         plt.plot(list_array_H[idx], list_array_L[idx], label = 'couche ' + str(idx + 1))
-            #     plt.plot(H_init, self._z_solve, linestyle = '--', label = 'solution originale')
-            #     plt.legend()
-            #     plt.title("charge hydraulique stratifiée initialisé")
-            #     plt.xlabel('la charge hydraulique (m)')
-            #     plt.ylabel('le profondeur (m)')
-            #     plt.show()
-            H_init = list_array_H[0]
-            for idx in range(1, len(list_array_H)):
-                H_init = np.concatenate((H_init, list_array_H[idx]))
-
-            Ss_list = (
-                n_list / heigth
-            )  # l'emmagasinement spécifique = porosité sur la hauteur
-
-            if verbose:
-                print("--- Compute Solve Transi ---")
-                for layer in layersList:
-                    print(layer)
-                print("Hinter", array_Hinter)
+        blocks = [
+            block
+            for block in np.array_split(np.arange(len(X)), n_workers)
+            if len(block) > 0
+        ]
+        results = chain_pool.starmap(
+            _evaluate_chains_in_worker,
+            [
+                (
+                    X[block],
+                    sigma2_temp[block],
+                    sigma2_density[block],
+                    sous_ech,
+                    None if energy_budget is None else energy_budget[block],
+                    coarse,
+                )
+                for block in blocks
+            ],
+        )
+        energies, temperatures, flows = zip(*results)
+        if sous_ech is None:
+            return np.concatenate(energies), None, None
+        return (
+            np.concatenate(energies),
+            np.concatenate(temperatures),
+            np.concatenate(flows),
+        )
 
-            if verbose:
-                print("conditions aux limites")
-                print("H_riv", H_riv)
-                print("H_aq", H_aq)
-
-            list_zLow = []
-            for layer in layersList:
-                list_zLow.append(layer.zLow)
-            list_zLow.pop()
-            list_zLow = np.array(list_zLow)
-            z_solve = self._z_solve.copy()
-
-            ## Classification according to Klist on symmetry of interfaces
-            inter_cara = np.zeros((len(list_zLow), 2))
-            for zlow_idx in range(len(list_zLow)):
-                for z_idx in range(len(z_solve) - 1):
-                    if (
-                        z_solve[z_idx] <= list_zLow[zlow_idx]
-                        and z_solve[z_idx + 1] > list_zLow[zlow_idx]
-                    ):
-                        if verbose:
-                            print(
-                                "échantillons du profondeur: ... ",
-                                z_solve[z_idx],
-                                z_solve[z_idx + 1],
-                                " ...",
-                            )
-                            print("le profondeur d'interface: ", list_zLow[zlow_idx])
-                        if abs(z_solve[z_idx] - list_zLow[zlow_idx]) < EPSILON:
-                            inter_cara[zlow_idx, 0] = z_idx
-                            if verbose:
-                                print("type cara symetric")
-                        elif abs(z_solve[z_idx + 1] - list_zLow[zlow_idx]) < EPSILON:
-                            inter_cara[zlow_idx, 0] = z_idx + 1
-                            if verbose:
-                                print("type cara symetric")
-                        else:
-                            inter_cara[zlow_idx, 0] = z_idx
-                            inter_cara[zlow_idx, 1] = z_idx + 1
-                            if verbose:
-                                print("type cara asymetric")
-            ## end
-            # version zhan
-            a = 1  # à adapter
-            H_strat = H_stratified(
-                Ss_list,
-                IntrinK_list,
-                n_list,
-                lambda_s_list,
-                rhos_cs_list,
-                all_dt,
-                q_s_list,
-                dz,
-                H_init,
-                H_riv,
-                H_aq,
-                T_init,
-                array_K,
-                array_Ss,
-                list_zLow,
-                z_solve,
-                inter_cara,
-                isdtconstant,
-                alpha=ALPHA,
-            )
-            H_res = H_strat.compute_H_stratified()
-
-            self._H_res = H_res  # stocke les résultats
-
-            # ###
-            # H_res = HTK_stratified(a,Ss_list,IntrinK_list,n_list,lambda_s_list,rhos_cs_list,all_dt,dz,H_init,H_riv,H_aq,T_init,T_riv,T_aq,array_K,array_Ss,list_zLow,z_solve,inter_cara,isdtconstant,q_s_list,alpha=ALPHA,N_update_Mu=N_UPDATE_MU,).compute_HTK_stratified()
-            # ###
-
-            # création d'un tableau du gradient de la charge selon la profondeur, calculé à tout temps
-            # conversion of intrinsec permeability to permeability missing
-            # K_list = RHO_W * G * k_list * 1.0 / MU
-            K_list = calc_K(IntrinK_list)
-            # print(f"calculating flow in multilayer with permeability {K_list}")
-
-            nablaH = H_strat.nablaH()
-
-            flows = np.zeros((nb_cells, len(self._times)), np.float32)
-
-            for i in range(nb_cells):
-                flows[i, :] = -K_list[i] * nablaH[i, :]
-            # if verbose:
-            #     plt.plot(z_solve, flows[:,0], linestyle = '--', label = "avant réparation de dérivation")
-            for elem_idx in range(len(inter_cara)):
-                if inter_cara[elem_idx][1] == 0:
-                    if (
-                        K_list[int(inter_cara[elem_idx][0])]
-                        == K_list[int(inter_cara[elem_idx][0]) + 1]
-                    ):
-                        nablaH[int(inter_cara[elem_idx][0]), :] = nablaH[
-                            int(inter_cara[elem_idx][0]) + 1, :
-                        ]  ## +1
-                    if (
-                        K_list[int(inter_cara[elem_idx][0])]
-                        == K_list[int(inter_cara[elem_idx][0]) - 1]
-                    ):
-                        nablaH[int(inter_cara[elem_idx][0]), :] = nablaH[
-                            int(inter_cara[elem_idx][0]) - 1, :
-                        ]  ## +1
-
-                    flows[int(inter_cara[elem_idx][0]), :] = (
-                        -K_list[int(inter_cara[elem_idx][0])]
-                        * nablaH[int(inter_cara[elem_idx][0]), :]
-                    )
-                else:
-                    nablaH[int(inter_cara[elem_idx][0]), :] = (
-                        H_res[int(inter_cara[elem_idx][0]) + 1, :]
-                        - H_res[int(inter_cara[elem_idx][0]), :]
-                    ) / dz
-                    nablaH[int(inter_cara[elem_idx][1]), :] = (
-                        H_res[int(inter_cara[elem_idx][1]), :]
-                        - H_res[int(inter_cara[elem_idx][1]) - 1, :]
-                    ) / dz
-                    x = (
-                        list_zLow[elem_idx] - z_solve[int(inter_cara[elem_idx][0])]
-                    ) / (
-                        z_solve[int(inter_cara[elem_idx][1])]
-                        - z_solve[int(inter_cara[elem_idx][0])]
-                    )
-                    K_list[int(inter_cara[elem_idx][0])] = 1 / (
-                        x / K_list[int(inter_cara[elem_idx][0])]
-                        + (1 - x) / K_list[int(inter_cara[elem_idx][0]) + 1]
-                    )
-                    flows[int(inter_cara[elem_idx][0]), :] = (
-                        -K_list[int(inter_cara[elem_idx][0])]
-                        * nablaH[int(inter_cara[elem_idx][0]), :]
-                    )
-                    flows[int(inter_cara[elem_idx][1]), :] = (
-                        -K_list[int(inter_cara[elem_idx][0])]
-                        * nablaH[int(inter_cara[elem_idx][1]), :]
-                    )
+    def _evaluate_delayed_acceptance(
+        self,
+        rng,
+        coarse_context,
+        coarse_energy,
+        solver_context,
+        chain_pool,
+        n_workers,
+        X,
+        sigma2_temp,
+        sigma2_distrib,
+        ind_ref,
+        temp_ref,
+        Energy,
+        log_u,
+        sous_ech=None,
+    ):
+        """
+        Acceptation retardée en deux étages (Christen et Fox, 2005) des propositions X.
 
-            # if verbose:
-            #     plt.plot(z_solve, flows[:,0], label = "après réparation de dérivation")
-            #     plt.legend()
-            #     plt.title("flux")
-            #     plt.xlabel("le profondeur (m)")
-            #     plt.ylabel("débit (m/s)")
-            #     plt.show()
+        Premier étage : l'énergie de chaque proposition est calculée sur le modèle grossier coarse_context, et la
+        proposition n'est retenue que si log u' < coarse_energy - énergie grossière (u' tiré ici avec rng). Second étage :
+        seules les propositions retenues sont évaluées sur le modèle complet, la chaîne j acceptant ensuite si
+        log_u[j] < (Energy[j] - Energy_Proposal[j]) - (coarse_energy[j] - énergie grossière). Ce second rapport
+        corrige le premier : la loi a posteriori échantillonnée est celle du modèle complet.
+        Aux itérations stockées (sous_ech donné), toutes les propositions sont évaluées sur le modèle complet,
+        puisque leurs champs sont conservés.
 
-            ## zhan Nov8
-            T_strat = T_stratified(
-                nablaH,
-                Ss_list,
-                IntrinK_list,
-                n_list,
-                lambda_s_list,
-                rhos_cs_list,
-                all_dt,
-                q_s_list,
-                dz,
-                H_init,
-                H_riv,
-                H_aq,
-                T_init,
-                T_riv,
-                T_aq,
-                alpha=ALPHA,
-                N_update_Mu=N_UPDATE_MU,
+        Returns
+        -------
+        Energy_Proposal : float array
+            énergies sur le modèle complet, inf pour les propositions écartées au premier étage.
+        temp_proposal, flow_proposal :
+            champs sous-échantillonnés comme pour _evaluate_proposals.
+        log_ratio_coarse : float array
+            terme coarse_energy - énergie grossière à retrancher du log-rapport d'acceptation.
+        coarse_proposal : float array
+            énergies grossières des propositions, qui deviennent coarse_energy[j] si la chaîne j accepte.
+        """
+        nb_proposals = len(X)
+        log_u_coarse = np.log(rng.uniform(0, 1, nb_proposals))
+        coarse_proposal, _, _ = self._evaluate_proposals(
+            coarse_context,
+            chain_pool,
+            n_workers,
+            X,
+            sigma2_temp,
+            sigma2_distrib,
+            coarse_context.id_sensors,
+            coarse_context.temp_ref,
+            energy_budget=coarse_energy - log_u_coarse,
+            coarse=True,
+        )
+        log_ratio_coarse = coarse_energy - coarse_proposal
+        promising = log_u_coarse < log_ratio_coarse
+
+        Energy_Proposal = np.full(nb_proposals, np.inf)
+        temp_proposal = flow_proposal = None
+        evaluated = promising if sous_ech is None else np.ones(nb_proposals, bool)
+        if evaluated.any():
+            energy_budget = None
+            if sous_ech is None:
+                energy_budget = (Energy - log_ratio_coarse - log_u)[evaluated]
+            (
+                Energy_Proposal[evaluated],
+                temp_proposal,
+                flow_proposal,
+            ) = self._evaluate_proposals(
+                solver_context,
+                chain_pool,
+                n_workers,
+                X[evaluated],
+                sigma2_temp[evaluated],
+                sigma2_distrib,
+                ind_ref,
+                temp_ref,
+                sous_ech,
+                energy_budget,
             )
-            T_res = T_strat.compute_T_stratified()
-            self._temperatures = T_res
-
-            self._flows = flows  # calcul du débit spécifique
-            if verbose:
-                print("Done.")
-            # if verbose:
-            #     plt.scatter(range(len(KT_list)), KT_list, s = 0.7)
-            #     plt.show()
-
-            if np.isnan(self._temperatures).any() or np.isnan(self._flows).any():
-                print(
-                    f"Issue for the following parameters : {self.get_list_current_params()}"
-                )
-                print(
-                    f"Issue for the follwing number of layers : {len(self.all_layers)}"
-                )
-                raise ValueError("NaN values in compute_solve_transi")
+        Energy_Proposal[~promising] = np.inf
+        return (
+            Energy_Proposal,
+            temp_proposal,
+            flow_proposal,
+            np.where(promising, log_ratio_coarse, 0.0),
+            coarse_proposal,
+        )
 
     @compute_solve_transi.needed
     def get_id_sensors(self):
@@ -823,6 +622,104 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
     flows_solve = property(get_flows_solve)
     # récupération des débits spécifiques au cours du temps à toutes les profondeurs (par défaut) ou bien à une profondeur donnée
 
+    def _time_index(self, time):
+        """Indice de time parmi les temps de mesure de la colonne."""
+        try:
+            return self._times.index(time)
+        except ValueError:
+            raise ValueError(
+                f"{time} is not a measurement time of the column ({self._times[0]} to {self._times[-1]})"
+            ) from None
+
+    # erreur si pas déjà éxécuté compute_solve_transi, sinon l'attribut pas encore affecté à une valeur
+    @compute_solve_transi.needed
+    def get_state(self, time):
+        """
+        État du modèle direct au temps de mesure time du dernier compute_solve_transi, à passer à
+        set_initial_state (ou time_subrange) d'une colonne dont les mesures commencent à ce temps.
+        Il peut être enregistré avec snapshot.save_state.
+
+        Returns
+        -------
+        dict
+            "time" : datetime, "z" : profondeur du milieu des cellules, "H" et "T" : charge et température de
+            chaque cellule.
+        """
+        j = self._time_index(time)
+        return {
+            "time": self._times[j],
+            "z": np.array(self._z_solve),
+            "H": np.array(self._H_res[:, j]),
+            "T": np.array(self._temperatures[:, j]),
+        }
+
+    # erreur si pas déjà éxécuté compute_solve_transi, sinon l'attribut pas encore affecté à une valeur
+    @compute_solve_transi.needed
+    def get_end_state(self):
+        """État du modèle direct au dernier temps (voir get_state)."""
+        return self.get_state(self._times[-1])
+
+    def set_initial_state(self, state):
+        """
+        Impose l'état initial du modèle direct (dictionnaire de get_state ou get_end_state) au lieu des profils de charge et
+        de température déduits des mesures au premier temps : la simulation d'une colonne dont les mesures
+        prolongent celles d'une autre reprend là où la précédente s'est arrêtée, sans refaire tout l'historique.
+        L'état est interpolé sur les cellules du modèle si les maillages diffèrent. state=None revient aux
+        profils déduits des mesures.
+        """
+        if state is not None:
+            if state["time"] != self._times[0]:
+                raise ValueError(
+                    f"The state is at {state['time']} but the measures of the column start at {self._times[0]}"
+                )
+            if not len(state["z"]) == len(state["H"]) == len(state["T"]):
+                raise ValueError("z, H and T of the state must have the same length")
+            state = {
+                "time": state["time"],
+                **{key: np.array(state[key], np.float64) for key in ("z", "H", "T")},
+            }
+        self._initial_state = state
+
+    def time_subrange(self, start=None, end=None, initial_state=None):
+        """
+        Nouvelle colonne restreinte aux mesures des temps start à end (inclus), de mêmes capteurs, maillage et
+        couches (copiées). Avec initial_state (état de get_state ou de snapshot.load_state), start est par défaut
+        le temps de l'état et le modèle direct de la nouvelle colonne en part : reprendre une simulation à ce temps
+        ne coûte que la simulation du sous-intervalle.
+        """
+        if start is None:
+            start = self._times[0] if initial_state is None else initial_state["time"]
+        i0 = self._time_index(start)
+        i1 = len(self._times) - 1 if end is None else self._time_index(end)
+        if i1 <= i0:
+            raise ValueError(f"end ({end}) must be after start ({start})")
+        times = self._times[i0 : i1 + 1]
+        column = Column(
+            river_bed=self.zbed,
+            depth_sensors=self.depth_sensors,
+            offset=self.offset,
+            dH_measures=list(
+                zip(times, zip(self._dH[i0 : i1 + 1], self._T_riv[i0 : i1 + 1]))
+            ),
+            T_measures=list(
+                zip(
+                    times,
+                    np.column_stack(
+                        [self._T_measures[i0 : i1 + 1], self._T_aq[i0 : i1 + 1]]
+                    ),
+                )
+            ),
+            inter_mode=self.inter_mode,
+            eps=self.eps,
+            nb_cells=self._nb_cells,
+            rac=self._dir_print,
+        )
+        column._q_s_list = self._q_s_list[:, i0 : i1 + 1].copy()
+        column.set_layers(deepcopy(self.all_layers))
+        if initial_state is not None:
+            column.set_initial_state(initial_state)
+        return column
+
     def perturbation_DREAM(
         self,
         nb_chain,
@@ -908,6 +805,144 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
 
         return (X_proposal, dX, id_layer)
 
+    @staticmethod
+    def perturbation_DREAM_chains(
+        rng, X, delta, c, c_star, cr_vec, pcr, ranges, is_param_fixed, Z=None
+    ):
+        """
+        Propositions DREAM de toutes les chaînes à la fois, tirées avec le générateur rng (numpy.random.Generator).
+
+        Chaque proposition suit la même loi que celle de perturbation_DREAM pour la chaîne correspondante :
+        pour chaque couche, un indice de crossover tiré selon pcr, les paramètres variables perturbés d'après
+        cr_vec (au moins un), un saut d'évolution différentielle construit sur 2*delta autres chaînes distinctes,
+        puis le repliement modulo les bornes des priors.
+        Avec une archive Z (n_Z, nb_layer, nb_param) d'états passés (DREAM(ZS)), le saut est construit sur
+        2*delta états distincts de l'archive au lieu des autres chaînes.
+
+        Parameters
+        ----------
+        X : float32 array (nb_chain, nb_layer, nb_param)
+            états courants des chaînes.
+        pcr : float array (nb_layer, n_CR)
+            probabilités de choix de chaque crossover.
+        ranges : float array (nb_layer, nb_param, 2)
+            bornes des priors de chaque paramètre.
+        is_param_fixed : bool array (nb_layer, nb_param)
+
+        Returns
+        -------
+        X_proposal, dX : float32 arrays (nb_chain, nb_layer, nb_param)
+            propositions et sauts (nuls pour les paramètres non perturbés).
+        id_layer_chain : int32 array (nb_chain, nb_layer)
+            indices de crossover choisis pour chaque chaîne et chaque couche.
+        """
+        nb_chain, nb_layer, nb_param = X.shape
+        ncr = len(cr_vec)
+        layers = np.arange(nb_layer)
+
+        # indices de crossover, tirés selon pcr par inversion de la fonction de répartition
+        id_layer_chain = np.minimum(
+            np.sum(
+                rng.random((nb_chain, nb_layer, 1)) >= np.cumsum(pcr, axis=1),
+                axis=2,
+            ),
+            ncr - 1,
+        ).astype(np.int32)
+
+        # paramètres perturbés : z <= cr parmi les paramètres variables, sinon celui de plus petit z
+        z = rng.random((nb_chain, nb_layer, nb_param))
+        z[:, is_param_fixed] = np.inf
+        A = z <= cr_vec[id_layer_chain][:, :, None]
+        variable_layer = ~np.all(is_param_fixed, axis=1)
+        none_perturbed = ~np.any(A, axis=2) & variable_layer
+        chains, l_none = np.nonzero(none_perturbed)
+        A[chains, l_none, np.argmin(z[chains, l_none], axis=1)] = True
+        d_star = np.maximum(np.sum(A, axis=2), 1)
+
+        if Z is None:
+            # 2*delta chaînes distinctes de la chaîne j (et entre elles) pour chaque couche : les delta premières
+            # d'une permutation aléatoire des autres chaînes forment a, les delta suivantes b
+            keys = rng.random((nb_chain, nb_layer, nb_chain))
+            keys[np.arange(nb_chain), :, np.arange(nb_chain)] = np.inf
+            pairs = np.argsort(keys, axis=2)[:, :, : 2 * delta]
+            X_pairs = X[pairs, layers[None, :, None]]  # (nb_chain, nb_layer, 2*delta, nb_param)
+        else:
+            # 2*delta états distincts de l'archive, dans un ordre aléatoire
+            pairs = _distinct_indices(rng, len(Z), (nb_chain, nb_layer), 2 * delta)
+            X_pairs = Z[pairs, layers[None, :, None]]
+        diff = np.sum(X_pairs[:, :, :delta] - X_pairs[:, :, delta:], axis=2)
+
+        # gamma ou 1 avec la même probabilité, comme np.random.choice([gamma, 1], 1, [0.8, 0.2]) dans perturbation_DREAM
+        gamma = 2.38 / np.sqrt(2 * d_star * delta)
+        gamma = np.where(rng.random((nb_chain, nb_layer)) < 0.5, gamma, 1.0)
+        lambd = rng.uniform(-c, c, (nb_chain, nb_layer, nb_param))
+        zeta = rng.normal(0, c_star, (nb_chain, nb_layer, nb_param))
+
+        dX = np.where(
+            A, zeta + (1 + lambd) * gamma[:, :, None] * diff, 0.0
+        ).astype(np.float32)
+
+        return _wrap_in_ranges(X + dX, ranges), dX, id_layer_chain
+
+    @staticmethod
+    def snooker_DREAM_chains(rng, X, Z, ranges, is_param_fixed):
+        """
+        Mises à jour "snooker" de DREAM(ZS) (ter Braak et Vrugt, 2008) pour les états X (nb_chain, nb_layer, nb_param).
+
+        Pour chaque chaîne, un état z de l'archive Z fixe la direction x - z ; deux autres états z1, z2 de l'archive,
+        projetés sur cette droite, donnent le saut gamma * (z1 - z2) projeté, avec gamma uniforme sur [1.2, 2.2].
+        Seuls les paramètres variables (non fixés) sont concernés.
+
+        Returns
+        -------
+        X_proposal : float32 array (nb_chain, nb_layer, nb_param)
+            propositions, repliées modulo les bornes des priors.
+        log_ratio : float array (nb_chain,)
+            terme (d - 1) log(|x' - z| / |x - z|) à ajouter au log-rapport d'acceptation (d paramètres variables).
+        """
+        nb_chain = len(X)
+        variable = ~is_param_fixed
+        d = np.sum(variable)
+        x = X[:, variable].astype(np.float64)
+        z, z1, z2 = np.moveaxis(Z[:, variable][_distinct_indices(rng, len(Z), (nb_chain,), 3)], 1, 0)
+
+        direction = x - z
+        norm2 = np.sum(direction**2, axis=1)
+        degenerate = norm2 == 0  # x est dans l'archive et a été tiré comme z : pas de saut
+        norm2[degenerate] = 1.0
+        projection = np.sum((z1 - z2) * direction, axis=1) / norm2
+        gamma = rng.uniform(1.2, 2.2, nb_chain)
+        jump = (gamma * projection)[:, None] * direction
+        jump[degenerate] = 0.0
+
+        X_proposal = X.copy()
+        X_proposal[:, variable] = x + jump
+        X_proposal = _wrap_in_ranges(X_proposal, ranges)
+        norm_proposal = np.linalg.norm(X_proposal[:, variable] - z, axis=1)
+        log_ratio = np.zeros(nb_chain)
+        log_ratio[~degenerate] = (d - 1) * (
+            np.log(norm_proposal[~degenerate]) - 0.5 * np.log(norm2[~degenerate])
+        )
+        return X_proposal, log_ratio
+
+    @classmethod
+    def _snooker_proposals(cls, rng, snooker, X, X_proposal, Z, ranges, is_param_fixed):
+        """
+        Remplace dans X_proposal, avec la probabilité snooker pour chaque chaîne, la proposition DREAM par une mise
+        à jour snooker sur l'archive Z. Renvoie le masque des chaînes concernées et le terme à ajouter à leur
+        log-rapport d'acceptation (nul pour les autres). Aucun tirage n'est fait si snooker est nul.
+        """
+        nb_chain = len(X)
+        is_snooker = np.zeros(nb_chain, bool)
+        log_ratio = np.zeros(nb_chain)
+        if snooker > 0:
+            is_snooker = rng.random(nb_chain) < snooker
+            if is_snooker.any():
+                X_proposal[is_snooker], log_ratio[is_snooker] = cls.snooker_DREAM_chains(
+                    rng, X[is_snooker], Z, ranges, is_param_fixed
+                )
+        return is_snooker, log_ratio
+
     @checker
     def compute_mcmc(
         self,
@@ -925,6 +960,21 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
         n_sous_ech_time=1,
         n_sous_ech_space=1,
         threshold=GELMANRCRITERIA,
+        n_workers=1,
+        quantile_mode="exact",
+        delayed_acceptance=False,
+        coarse_nb_cells=None,
+        coarse_n_sous_ech_time=1,
+        coarse_burn_in=False,
+        rng=None,
+        dream_zs=False,
+        zs_thinning=10,
+        zs_init_size=None,
+        snooker=0.0,
+        checkpoint=None,
+        checkpoint_every=100,
+        resume_from=None,
+        warm_start=None,
     ):
         if verbose:
             print(
@@ -937,6 +987,7 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
                 f"Number of cells : {self._nb_cells}",
                 f"Number of iterations : {nb_iter}",
                 f"Number of chains : {nb_chain}",
+                f"Number of workers : {n_workers}",
                 "--------------------",
                 sep="\n",
             )
@@ -966,13 +1017,101 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
         # vérification des types des arguments
         if isinstance(quantile, Number):
             quantile = [quantile]
+        if quantile_mode not in ("exact", "online", "disk"):
+            raise ValueError(
+                f"quantile_mode must be 'exact', 'online' or 'disk', not {quantile_mode!r}"
+            )
+
+        # Départ à chaud (mise à jour incrémentale à l'arrivée de nouvelles mesures) : les chaînes partent d'états
+        # de travail (MCMC) d'un run précédent au lieu d'être tirées dans les priors. warm_start est l'historique de
+        # ses chaînes (nb_états, nb_chain, nb_layer, nb_param), comme previous.get_chains_mcmc_params(), ou un
+        # ensemble d'états (..., nb_layer, nb_param). Les couches doivent avoir les mêmes priors que celles du run précédent.
+        warm_chains = None
+        if warm_start is not None:
+            warm_start = np.asarray(warm_start, np.float32)
+            if warm_start.ndim < 3 or warm_start.shape[-2:] != (
+                len(self.all_layers),
+                N_PARAM_MCMC,
+            ):
+                raise ValueError(
+                    f"warm_start must have shape (..., {len(self.all_layers)}, {N_PARAM_MCMC}), not {warm_start.shape}"
+                )
+            if warm_start.ndim == 4 and warm_start.shape[1] == nb_chain:
+                warm_chains = warm_start
+            warm_start = warm_start.reshape(-1, len(self.all_layers), N_PARAM_MCMC)
+
+        # DREAM(ZS) : les sauts sont construits sur une archive d'états passés des chaînes et non sur les autres
+        # chaînes, ce qui permet de n'en faire tourner que quelques-unes (voir perturbation_DREAM_chains)
+        if dream_zs:
+            if nb_chain < 2:
+                raise ValueError("dream_zs needs nb_chain >= 2")
+            if zs_init_size is not None and zs_init_size < max(2 * delta, 3):
+                raise ValueError(
+                    f"zs_init_size must be at least {max(2 * delta, 3)} (2 * delta and 3 for snooker updates)"
+                )
+        elif nb_chain > 1 and nb_chain < 2 * delta + 1:
+            raise ValueError(
+                f"DREAM needs nb_chain >= 2 * delta + 1 = {2 * delta + 1}, use dream_zs=True for fewer chains"
+            )
+        if snooker > 0 and not dream_zs:
+            raise ValueError("snooker updates need the archive of dream_zs=True")
+
+        # Points de reprise (voir pyheatmy.checkpoint) : l'état de l'échantillonneur est écrit dans le fichier
+        # checkpoint toutes les checkpoint_every itérations du burn-in et de l'échantillonnage, et resume_from
+        # reprend un run interrompu là où son dernier point de reprise l'a laissé, avec les mêmes résultats.
+        # Les réglages dont dépendent les résultats doivent être ceux du run interrompu.
+        if checkpoint is not None and checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be at least 1")
+        run_settings = {
+            "typealgo": typealgo,
+            "sigma2": sigma2,
+            "nb_iter": nb_iter,
+            "nb_chain": nb_chain,
+            "nitmaxburning": nitmaxburning,
+            "delta": delta,
+            "n_CR": n_CR,
+            "c": c,
+            "c_star": c_star,
+            "n_sous_ech_time": n_sous_ech_time,
+            "n_sous_ech_space": n_sous_ech_space,
+            "threshold": threshold,
+            "quantiles": list(quantile),
+            "quantile_mode": quantile_mode,
+            "delayed_acceptance": delayed_acceptance,
+            "coarse_nb_cells": coarse_nb_cells,
+            "coarse_n_sous_ech_time": coarse_n_sous_ech_time,
+            "coarse_burn_in": coarse_burn_in,
+            "dream_zs": dream_zs,
+            "zs_thinning": zs_thinning,
+            "zs_init_size": zs_init_size,
+            "snooker": snooker,
+            "nb_cells": self._nb_cells,
+            "times": (str(self._times[0]), str(self._times[-1]), len(self._times)),
+        }
+        resumed = None
+        if resume_from is not None:
+            resumed = load_checkpoint(resume_from, run_settings)
+
+        # Modèle grossier de la colonne (coarse_nb_cells cellules, un temps sur coarse_n_sous_ech_time) :
+        # - acceptation retardée : les propositions y sont d'abord évaluées, seules les plus prometteuses le sont
+        #   sur le modèle complet (voir _evaluate_delayed_acceptance)
+        # - burn-in grossier : le burn-in (ou l'initialisation de la chaîne unique) y est mené entièrement, les
+        #   chaînes sont ensuite transférées sur le modèle complet pour l'échantillonnage
+        coarse_context = None
+        if delayed_acceptance or coarse_burn_in:
+            if coarse_nb_cells is None and coarse_n_sous_ech_time == 1:
+                raise ValueError(
+                    "delayed_acceptance and coarse_burn_in need a coarse model : set coarse_nb_cells and/or coarse_n_sous_ech_time"
+                )
+            coarse_context = SolverContext(
+                self, nb_cells=coarse_nb_cells, n_sous_ech_time=coarse_n_sous_ech_time
+            )
 
         # définition des paramètres de la simulation
         dz = self._real_z[-1] / self._nb_cells
         _z_solve = dz / 2 + np.array([k * dz for k in range(self._nb_cells)])
         ind_ref = [np.argmin(np.abs(z - _z_solve)) for z in self._real_z[1:-1]]
         temp_ref = self._T_measures[:, :].T
-        self._states = list()
 
         # quantités des différents paramètres
         nb_layer = len(self.all_layers)  # nombre de couches
@@ -993,27 +1132,63 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
         nb_cells_sous_ech = int(np.ceil(self._nb_cells / n_sous_ech_space))
         nb_times_sous_ech = int(np.ceil(len(self._times) / n_sous_ech_time))
 
+        # En mode "disk", les échantillons et la trace des chaînes sont stockés dans des fichiers projetés en mémoire
+        # sous self._dir_print, relisibles par load_mcmc_samples même si le calcul est interrompu
+        sample_store = None
+        if quantile_mode == "disk":
+            sample_store = DiskSampleStore(
+                self._dir_print,
+                info={
+                    "nb_iter": nb_iter,
+                    "nb_chain": nb_chain,
+                    "nb_layer": nb_layer,
+                    "layers": [layer.name for layer in self.all_layers],
+                    "quantiles": list(quantile),
+                    "n_sous_ech_iter": n_sous_ech_iter,
+                    "n_sous_ech_space": n_sous_ech_space,
+                    "n_sous_ech_time": n_sous_ech_time,
+                    "start": str(self._times[0]),
+                    "end": str(self._times[-1]),
+                },
+                resume=resumed is not None,
+            )
+
+        # trace des états des chaînes : l'état initial puis un état par itération après le burn-in
+        self._trace = McmcTrace(
+            nb_iter + 1,
+            nb_chain,
+            nb_layer,
+            nb_param,
+            allocate=sample_store.create if sample_store is not None else None,
+        )
+
         # Obligation de faire une disjonction de cas selon le nombre de chaînes, en effet l'algorithme DREAM fonctionne selon une perturbation différentielles entre les
         # différentes chaînes, ce qui ne peut pas être vu comme un cas particulier du Random Walk Metropolis qui est basé lui sur le principe d'une perturbation gaussienne symétrique
 
         if nb_chain > 1:
-            # Voir si ces variables ne peuvent pas devenir des attributs de State
-            _temp_iter_chain = np.zeros(
-                (nb_chain, self._nb_cells, len(self._times)), np.float32
-            )  # dernière température acceptée pour chaque chaine
-            _flow_iter_chain = np.zeros(
-                (nb_chain, self._nb_cells, len(self._times)), np.float32
-            )  # dernier débit accepté pour chaque chaine
-
-            # nombre d'itérations sous-échantillonnées avec initialisation
-            _temp = np.zeros(
-                (sizesubsampling, nb_chain, nb_cells_sous_ech, nb_times_sous_ech),
-                np.float32,
-            )  # stockage des températures sous échantillonées pendant la mcmc
-            _flows = np.zeros(
-                (sizesubsampling, nb_chain, nb_cells_sous_ech, nb_times_sous_ech),
-                np.float32,
-            )  # stockage des débits sous échantillonées pendant la mcmc
+            if quantile_mode == "online":
+                # estimation en ligne des quantiles : la mémoire ne dépend pas du nombre d'itérations
+                _temp = P2Quantiles(quantile, (nb_cells_sous_ech, nb_times_sous_ech))
+                _flows = P2Quantiles(quantile, (nb_cells_sous_ech, nb_times_sous_ech))
+            elif quantile_mode == "disk":
+                _temp = sample_store.create(
+                    "temperatures",
+                    (sizesubsampling, nb_chain, nb_cells_sous_ech, nb_times_sous_ech),
+                )
+                _flows = sample_store.create(
+                    "flows",
+                    (sizesubsampling, nb_chain, nb_cells_sous_ech, nb_times_sous_ech),
+                )
+            else:
+                # nombre d'itérations sous-échantillonnées avec initialisation
+                _temp = np.zeros(
+                    (sizesubsampling, nb_chain, nb_cells_sous_ech, nb_times_sous_ech),
+                    np.float32,
+                )  # stockage des températures sous échantillonées pendant la mcmc
+                _flows = np.zeros(
+                    (sizesubsampling, nb_chain, nb_cells_sous_ech, nb_times_sous_ech),
+                    np.float32,
+                )  # stockage des débits sous échantillonées pendant la mcmc
 
             # création de la matrice des bornes des paramètres (sert à s'assurer que la proposition de paramètres est dans les bornes)
             ranges = np.empty((nb_layer, nb_param, 2))
@@ -1036,275 +1211,484 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
             pcr = (
                 np.ones((nb_layer, n_CR)) / n_CR
             )  # Probabilité de choisir un crossover, initialisé de manière uniforme
-            id_layer = np.zeros(
-                nb_layer, np.int32
-            )  # Vecteur qui recense les indices de crossover choisis pour chaque couche
-
-            # Création d'autant d'instance de colonnes que de chaines
-
-            multi_chain = [copy.deepcopy(self) for _ in range(nb_chain)]
-
-            # On redéfinit l'appel du modèle direct sur les deep copies sinon le modèle direct s'exécute sur les paramètre de la colonne self
-            # Raisons inconnues peut-être liées au décorateur @checker
-
-            for column in multi_chain:
-                column.compute_solve_transi = types.MethodType(
-                    Column.compute_solve_transi, column
-                )
+            # générateur des propositions DREAM et des tirages d'acceptation (numpy.random.Generator ou graine) : à défaut, il est initialisé
+            # depuis l'état global de numpy, que np.random.seed suffit donc à rendre reproductible
+            rng = np.random.default_rng(
+                rng if rng is not None else np.random.randint(2**31)
+            )
 
             ### initialisation des énergie
 
-            # lancement du modèle direct et mise à jours de tous les paramètres dans la matrice X, les énergies dans la matrice Energy
-            # et on les stocke dans l'attribut _state de la colonne qui ne sert qu'à plot les distribution et à récupérer les paramètres qui minimisent l'énergie
+            # tirage des paramètres initiaux de chaque chaîne dans les priors. Les paramètres sont stockés dans la matrice X, les énergies dans la matrice Energy
+            # et on les stocke dans l'état 0 de la trace de la colonne, qui sert à plot les distribution et à récupérer les paramètres qui minimisent l'énergie
 
-            self._states = list()
             X = np.zeros((nb_chain, nb_layer, nb_param), np.float32)
             Energy = np.zeros((nb_chain), np.float32)
-
-            for j, column in enumerate(multi_chain):
-                column.sample_params_from_priors()
-                X[j] = column._get_list_mcmc_params()
+            sigma2_temp_proposal = np.zeros(nb_chain)
+
+            # l'énergie initiale est calculée sur un profil de température nul : la première proposition de chaque chaîne est acceptée
+            temp_init = np.zeros((len(ind_ref), len(self._times)), np.float32)
+            initial_params = self._get_list_mcmc_params()
+            if warm_chains is not None:
+                # départ à chaud : chaque chaîne continue la chaîne correspondante du run précédent
+                X_warm = warm_chains[-1]
+            elif warm_start is not None:
+                # départ à chaud : états distincts du run précédent s'il y en a assez
+                X_warm = warm_start[
+                    rng.choice(len(warm_start), nb_chain, replace=len(warm_start) < nb_chain)
+                ]
+            for j in range(nb_chain):
+                if warm_start is None:
+                    self.sample_params_from_priors()
+                else:
+                    for l, layer in enumerate(self.all_layers):
+                        layer.mcmc_params = Param(*X_warm[j, l])
+                X[j] = self._get_list_mcmc_params()
                 Energy[j] = compute_energy(
-                    _temp_iter_chain[j][ind_ref], temp_ref, sigma2, sigma2_distrib
-                )
-
-                column.compute_solve_transi(verbose=False)
-                _temp_iter_chain[j] = column.get_temperatures_solve()
-                _flow_iter_chain[j] = column.get_flows_solve()
-                self._states.append(
-                    State(
-                        layers=X[j],
-                        energy=Energy[j],
-                        ratio_accept=1,
-                        sigma2_temp=sigma2_temp_prior.sample(),
-                    )
+                    temp_init, temp_ref, sigma2, sigma2_distrib
                 )
-
-            ### stockage des résultats
-            # XBurnIn va servir à stocker les paramètres pour toutes les itérations de chaque couche de chaque chaîne pendant le Burn In
-            # Sert uniquement pour le calcul du critère de Gelman-Rubin
-
-            XBurnIn = np.zeros(
-                (nitmaxburning + 1, nb_chain, nb_layer, nb_param), np.float32
-            )
-
-            # en particulier la première instance de XBurnIn est égale à X :
-
-            XBurnIn[0] = X
-
-            print(
-                f"Initialisation - Utilisation de la mémoire (en Mo) : {process.memory_info().rss / 1e6}"
-            )
-
-            if verbose:
-                print("--- Begin Burn in phase ---")
-
-            for i in trange(nitmaxburning, desc="Burn in phase"):
-                # Initialisation pour les nouveaux paramètres
-                std_X = np.std(X, axis=0)  # calcul des écarts types des paramètres
-                # afin d'éviter la division par zéro dans le calcul du saut dans le cas d'un paramètre fixe
-                std_X[std_X == 0] = 1.0
-
-                for j, column in enumerate(multi_chain):
-                    # On lance la perturbation DREAM pour cette colonne, on en tire un nouveau jeu de paramètre X_proposal,
-                    # l'ensemble des indices de crossover choisis et la perturbation dX_colonne
-                    X_proposal, dX, id_layer = self.perturbation_DREAM(
-                        nb_chain,
+                self._trace.record(0, j, X[j], Energy[j], sigma2_temp_prior.sample())
+            if dream_zs:
+                # archive initiale de DREAM(ZS) : zs_init_size états tirés dans les priors (10 par paramètre variable
+                # par défaut), complétée par l'état des chaînes toutes les zs_thinning itérations
+                if zs_init_size is None:
+                    zs_init_size = max(10 * int(np.sum(~is_param_fixed)), 2 * delta, 3)
+                Z = np.zeros(
+                    (
+                        zs_init_size
+                        + nb_chain * ((nitmaxburning + nb_iter) // zs_thinning),
                         nb_layer,
                         nb_param,
+                    ),
+                    np.float32,
+                )
+                if warm_start is None:
+                    for k in range(zs_init_size):
+                        self.sample_params_from_priors()
+                        Z[k] = self._get_list_mcmc_params()
+                else:  # départ à chaud : l'archive initiale est tirée dans le posterior précédent
+                    Z[:zs_init_size] = warm_start[
+                        rng.choice(
+                            len(warm_start),
+                            zs_init_size,
+                            replace=len(warm_start) < zs_init_size,
+                        )
+                    ]
+                n_Z = zs_init_size
+                nb_zs_iter = 0  # nombre d'itérations depuis le début du burn-in
+            for l, layer in enumerate(self.all_layers):
+                layer.mcmc_params = initial_params[l]
+
+            # sigma2 associé à l'état courant de chaque chaîne, pour recalculer son énergie après un burn-in grossier
+            sigma2_chain = np.full(nb_chain, sigma2)
+            if coarse_context is not None:
+                # énergies des états initiaux sur le modèle grossier, pour le premier étage de l'acceptation retardée
+                # ou comme énergies de départ du burn-in grossier
+                coarse_energy, _, _ = _evaluate_chains(
+                    coarse_context,
+                    X,
+                    sigma2_chain,
+                    np.full(nb_chain, sigma2_distrib(sigma2)),
+                    coarse_context.id_sensors,
+                    coarse_context.temp_ref,
+                    energy_scale=coarse_context.time_ratio,
+                )
+                if coarse_burn_in:
+                    Energy[:] = coarse_energy
+
+            # Le maillage, les pas de temps et les conditions aux limites sont préparés une fois pour toutes les chaînes,
+            # qui ne diffèrent que par leurs paramètres
+            solver_context = SolverContext(self)
+
+            # Avec n_workers > 1, les modèles directs des chaînes sont répartis sur un pool de processus persistants qui
+            # détiennent chacun leur copie du contexte : seuls les paramètres, les énergies et les champs sous-échantillonnés transitent
+            chain_pool = None
+            if n_workers > 1:
+                chain_pool = multiprocessing.Pool(
+                    n_workers,
+                    initializer=_init_chain_worker,
+                    initargs=(solver_context, ind_ref, temp_ref, coarse_context),
+                )
+
+            try:
+                if warm_start is not None and not coarse_burn_in:
+                    # les états initiaux viennent du posterior précédent : leur énergie est calculée (au lieu de celle d'un
+                    # profil nul), pour que la première proposition de chaque chaîne puisse être rejetée
+                    Energy[:], _, _ = self._evaluate_proposals(
+                        solver_context,
+                        chain_pool,
+                        n_workers,
                         X,
-                        id_layer,
-                        j,
-                        delta,
-                        n_CR,
-                        c,
-                        c_star,
-                        cr_vec,
-                        pcr,
-                        ranges,
-                        is_param_fixed,
+                        sigma2_chain,
+                        sigma2_distrib,
+                        ind_ref,
+                        temp_ref,
                     )
-                    sigma2_temp_proposal = sigma2_temp_prior.perturb(
-                        self._states[j].sigma2_temp
-                    )  # On tire un nouveau sigma2
-
-                    # On met à jour les paramètres de la colonne j selon X_proposal pour appeler le modèle direct et calculer l'énergie:
-                    for l, layer in enumerate(column.all_layers):
-                        layer.mcmc_params = Param(*X_proposal[l])
-
-                    # Calcul du profil de température associé aux nouveaux paramètres
-                    column.compute_solve_transi(verbose=False)
+                    self._trace.energy[0] = Energy
+
+                ### suivi de la convergence
+                # Les moments des paramètres de chaque couche de chaque chaîne sont accumulés au fil du Burn In
+                # pour le calcul du critère de Gelman-Rubin, à commencer par l'état initial X :
+
+                gelman_rubin_criteria = GelmanRubinAccumulator(nb_chain, nb_layer, nb_param)
+                if warm_chains is not None:
+                    # les chaînes continuent celles du run précédent, dont l'historique compte dans le critère : le burn-in
+                    # s'arrête dès la première itération si elles avaient convergé et que les nouvelles mesures ne les
+                    # en éloignent pas
+                    for states in warm_chains[:-1]:
+                        gelman_rubin_criteria.update(states)
+                gelman_rubin_criteria.update(X)
+
+                ### points de reprise
+                # état de l'échantillonneur au début de l'itération i de la phase "burn_in" ou "sampling"
+                def save_dream_checkpoint(phase, i):
+                    sampling = phase == "sampling"
+                    if sample_store is not None:
+                        sample_store.flush()
+                    state = {
+                        "phase": phase,
+                        "iteration": i,
+                        "nb_burn_in_iter": nb_burn_in_iter,
+                        "X": X,
+                        "Energy": Energy,
+                        "sigma2_chain": sigma2_chain,
+                        "coarse_energy": coarse_energy if coarse_context is not None else None,
+                        "pcr": pcr,
+                        "J": J,
+                        "n_id": n_id,
+                        "gelman_rubin_criteria": gelman_rubin_criteria,
+                        "archive": (Z[:n_Z], n_Z, nb_zs_iter) if dream_zs else None,
+                        "acceptance": self._acceptance if sampling else None,
+                        "rng": rng.bit_generator.state,
+                        **samples_state(
+                            self._trace,
+                            _temp,
+                            _flows,
+                            i + 1 if sampling else 1,
+                            (i + n_sous_ech_iter - 1) // n_sous_ech_iter if sampling else 0,
+                            quantile_mode,
+                        ),
+                    }
+                    save_checkpoint(checkpoint, run_settings, state)
+
+                # reprise : l'initialisation ci-dessus a été refaite pour allouer l'état, qui est remplacé par celui
+                # du point de reprise, générateurs aléatoires compris
+                burn_in_start, sampling_start, burn_in_done = 0, 0, False
+                if resumed is not None:
+                    state = resumed["state"]
+                    X[:] = state["X"]
+                    Energy[:] = state["Energy"]
+                    sigma2_chain[:] = state["sigma2_chain"]
+                    if coarse_context is not None:
+                        coarse_energy = state["coarse_energy"]
+                    pcr[:] = state["pcr"]
+                    J[:] = state["J"]
+                    n_id[:] = state["n_id"]
+                    gelman_rubin_criteria = state["gelman_rubin_criteria"]
+                    nb_burn_in_iter = state["nb_burn_in_iter"]
+                    if dream_zs:
+                        archive, n_Z, nb_zs_iter = state["archive"]
+                        Z[:n_Z] = archive
+                    _temp, _flows = restore_samples(
+                        state, self._trace, _temp, _flows, quantile_mode
+                    )
+                    if state["phase"] == "burn_in":
+                        burn_in_start = state["iteration"]
+                    else:
+                        burn_in_start, sampling_start = nitmaxburning, state["iteration"]
+                        burn_in_done = True
+                        self._acceptance = state["acceptance"]
+                    rng.bit_generator.state = state["rng"]
+                    restore_random_states(resumed)
 
-                    # On récupère les températures et les débits associés aux nouveaux paramètres
-                    temp_proposal = column._temperatures
+                print(
+                    f"Initialisation - Utilisation de la mémoire (en Mo) : {process.memory_info().rss / 1e6}"
+                )
 
-                    Energy_Proposal = compute_energy(
-                        temp_proposal[ind_ref],
-                        temp_ref,
-                        sigma2_temp_proposal,
-                        sigma2_distrib,
-                    )  # calcul de l'énergie
+                if verbose:
+                    print("--- Begin Burn in phase ---")
 
-                    # calcul de la probabilité d'accpetation
-                    log_ratio_accept = Energy[j] - Energy_Proposal
+                for i in trange(burn_in_start, nitmaxburning, desc="Burn in phase"):
+                    if checkpoint is not None and i % checkpoint_every == 0:
+                        save_dream_checkpoint("burn_in", i)
 
-                    # Acceptation ou non des nouveaux paramètres
+                    # Initialisation pour les nouveaux paramètres
+                    std_X = np.std(X, axis=0)  # calcul des écarts types des paramètres
+                    # afin d'éviter la division par zéro dans le calcul du saut dans le cas d'un paramètre fixe
+                    std_X[std_X == 0] = 1.0
 
-                    if (
-                        np.log(np.random.uniform(0, 1)) < log_ratio_accept
-                    ):  # La perturbation est acceptée
-                        # on met à jour l'état de la colonne
-                        X[j] = (
-                            X_proposal  # actualisation des paramètres pour la chaine j
+                    # On tire une proposition par chaîne à partir de la population courante X : nouveaux jeux de paramètres
+                    # X_proposal, indices de crossover choisis pour chaque couche et perturbations dX
+                    X_proposal, dX, id_layer_chain = self.perturbation_DREAM_chains(
+                        rng, X, delta, c, c_star, cr_vec, pcr, ranges, is_param_fixed,
+                        Z[:n_Z] if dream_zs else None,
+                    )
+                    is_snooker, log_snooker = self._snooker_proposals(
+                        rng, snooker, X, X_proposal, Z[:n_Z] if dream_zs else None, ranges, is_param_fixed
+                    )
+                    dX[is_snooker] = 0.0
+                    for j in range(nb_chain):
+                        sigma2_temp_proposal[j] = sigma2_temp_prior.perturb(
+                            self._trace.sigma2_temp[0, j]
+                        )  # On tire un nouveau sigma2 autour de celui de l'état initial de la chaîne
+
+                    # u est tiré avant le modèle direct : la proposition de la chaîne j ne peut être acceptée que si son énergie
+                    # est inférieure à Energy[j] - log u[j], le modèle direct s'arrête dès que ce budget est dépassé.
+                    # Le terme d'une mise à jour snooker, qui s'ajoute au log-rapport d'acceptation, est retranché de log u
+                    log_u = np.log(rng.uniform(0, 1, nb_chain)) - log_snooker
+
+                    # Calcul des énergies associées aux propositions de toutes les chaînes
+                    if coarse_burn_in:
+                        Energy_Proposal, _, _ = self._evaluate_proposals(
+                            coarse_context,
+                            chain_pool,
+                            n_workers,
+                            X_proposal,
+                            sigma2_temp_proposal,
+                            sigma2_distrib,
+                            coarse_context.id_sensors,
+                            coarse_context.temp_ref,
+                            energy_budget=Energy - log_u,
+                            coarse=True,
                         )
-                        Energy[j] = Energy_Proposal
-                        _temp_iter_chain[j] = (
-                            temp_proposal  # actualisation du profil de température
+                        log_ratio_coarse = np.zeros(nb_chain)
+                    elif not delayed_acceptance:
+                        Energy_Proposal, _, _ = self._evaluate_proposals(
+                            solver_context,
+                            chain_pool,
+                            n_workers,
+                            X_proposal,
+                            sigma2_temp_proposal,
+                            sigma2_distrib,
+                            ind_ref,
+                            temp_ref,
+                            energy_budget=Energy - log_u,
                         )
-
+                        log_ratio_coarse = np.zeros(nb_chain)
                     else:
-                        dX = np.zeros((nb_layer, nb_param))
-                        # On remet les anciens paramètres pour la colonne :
-                        for l, layer in enumerate(column.all_layers):
-                            layer.mcmc_params = Param(*X[j][l])
-
-                    # Mise à jour du vecteur saut pour chaque couche
-                    for l in range(nb_layer):
-                        J[l, id_layer[l]] += np.sum((dX[l] / std_X[l]) ** 2)
-                        n_id[l, id_layer[l]] += 1
-
-                # Mise à jour du pcr pour chaque couche pour DREAM
-                for l in range(nb_layer):
-                    # On met à jour pcr avec la qualité des sauts J
-                    pcr[l][n_id[l] != 0] = J[l][n_id[l] != 0] / n_id[l][n_id[l] != 0]
-
-                    # On vérifie si la somme des probabilités est nulle
-                    if np.sum(pcr[l]) == 0:
-                        # Si oui (ce qui arrive si seul le paramètre fixe a été perturbé),
-                        # on réinitialise les probabilités à une distribution uniforme.
-                        pcr[l][:] = 1.0 / n_CR
-                    else:
-                        # Sinon, on normalise comme d'habitude.
-                        pcr[l] = pcr[l] / np.sum(pcr[l])
-
-                # Fin d'une itération, on vérifie si on peut sortir du burn-in
-                XBurnIn[i + 1] = X
+                        (
+                            Energy_Proposal,
+                            _,
+                            _,
+                            log_ratio_coarse,
+                            coarse_proposal,
+                        ) = self._evaluate_delayed_acceptance(
+                            rng,
+                            coarse_context,
+                            coarse_energy,
+                            solver_context,
+                            chain_pool,
+                            n_workers,
+                            X_proposal,
+                            sigma2_temp_proposal,
+                            sigma2_distrib,
+                            ind_ref,
+                            temp_ref,
+                            Energy,
+                            log_u,
+                        )
 
-                if gelman_rubin(
-                    i + 2, nb_param, nb_layer, XBurnIn[: i + 2], threshold=threshold
-                ):
-                    if verbose:
-                        print(f"Burn-in finished after : {nb_burn_in_iter} iterations")
-                    break  # on sort du burn-in
+                    for j in range(nb_chain):
+                        # calcul de la probabilité d'accpetation
+                        log_ratio_accept = Energy[j] - Energy_Proposal[j] - log_ratio_coarse[j]
 
-                nb_burn_in_iter += 1  # incrémentation du numbre d'itération de burn-in
+                        # Acceptation ou non des nouveaux paramètres
 
-            self.nb_burn_in_iter = nb_burn_in_iter
+                        if log_u[j] < log_ratio_accept:  # La perturbation est acceptée
+                            # on met à jour l'état de la chaîne
+                            X[j] = X_proposal[
+                                j
+                            ]  # actualisation des paramètres pour la chaine j
+                            Energy[j] = Energy_Proposal[j]
+                            sigma2_chain[j] = sigma2_temp_proposal[j]
+                            if delayed_acceptance and not coarse_burn_in:
+                                coarse_energy[j] = coarse_proposal[j]
 
-            # On suit les taux d'acceptation pour chaque chaîne grâce à un vecteur de taille nb_chain qu'on incrémente à chaque itération
-            self._acceptance = np.zeros(nb_chain, np.float32)
+                        else:
+                            dX[j] = 0.0
+
+                    # Mise à jour des sauts J et du nombre d'utilisations n_id de chaque crossover, pour toutes les chaînes
+                    # et toutes les couches (un saut rejeté est nul), hors mises à jour snooker qui n'utilisent pas de crossover
+                    layer_index = np.broadcast_to(np.arange(nb_layer), id_layer_chain.shape)
+                    np.add.at(
+                        J,
+                        (layer_index[~is_snooker], id_layer_chain[~is_snooker]),
+                        np.sum((dX[~is_snooker] / std_X) ** 2, axis=2),
+                    )
+                    np.add.at(
+                        n_id, (layer_index[~is_snooker], id_layer_chain[~is_snooker]), 1
+                    )
 
-            # Transition après le burn in
+                    if dream_zs:
+                        nb_zs_iter += 1
+                        if nb_zs_iter % zs_thinning == 0:  # les états courants des chaînes rejoignent l'archive
+                            Z[n_Z : n_Z + nb_chain] = X
+                            n_Z += nb_chain
+
+                    # Mise à jour du pcr pour chaque couche pour DREAM, avec la qualité des sauts J
+                    used = n_id != 0
+                    pcr[used] = J[used] / n_id[used]
+                    # une somme des probabilités nulle (ce qui arrive si seul le paramètre fixe a été perturbé)
+                    # réinitialise les probabilités de la couche à une distribution uniforme, sinon on normalise
+                    pcr_sum = np.sum(pcr, axis=1, keepdims=True)
+                    pcr[:] = np.where(
+                        pcr_sum == 0, 1.0 / n_CR, pcr / np.where(pcr_sum == 0, 1.0, pcr_sum)
+                    )
 
-            # La variable XBurnIn n'est plus utile
+                    # Fin d'une itération, on vérifie si on peut sortir du burn-in
+                    gelman_rubin_criteria.update(X)
 
-            del XBurnIn
+                    if gelman_rubin_criteria.has_converged(threshold=threshold):
+                        if verbose:
+                            print(f"Burn-in finished after : {nb_burn_in_iter} iterations")
+                        break  # on sort du burn-in
 
-            print(
-                f"Initialisation post burn-in - Utilisation de la mémoire (en Mo) : {process.memory_info().rss / 1e6}"
-            )
+                    nb_burn_in_iter += 1  # incrémentation du numbre d'itération de burn-in
 
-            for i in trange(nb_iter, desc="DREAM MCMC Computation", file=sys.stdout):
-                # Initialisation pour les nouveaux paramètres
-                std_X = np.std(X, axis=0)  # calcul des écarts types des paramètres
-                std_X[std_X == 0] = (
-                    1.0  # afin d'éviter la division par zéro dans le calcul du saut dans le cas d'un paramètre fixe
-                )
+                self.nb_burn_in_iter = nb_burn_in_iter
 
-                for j, column in enumerate(multi_chain):
-                    X_proposal, dX, id_layer = self.perturbation_DREAM(
-                        nb_chain,
-                        nb_layer,
-                        nb_param,
+                if coarse_burn_in and not burn_in_done:
+                    # transfert des chaînes sur le modèle complet : les énergies de leurs états y sont recalculées
+                    if delayed_acceptance:
+                        coarse_energy = Energy.astype(np.float64)
+                    Energy[:], _, _ = self._evaluate_proposals(
+                        solver_context,
+                        chain_pool,
+                        n_workers,
                         X,
-                        id_layer,
-                        j,
-                        delta,
-                        n_CR,
-                        c,
-                        c_star,
-                        cr_vec,
-                        pcr,
-                        ranges,
-                        is_param_fixed,
-                    )
-                    sigma2_temp_proposal = sigma2_temp_prior.perturb(
-                        self._states[j].sigma2_temp
-                    )  # On tire un nouveau sigma2
-
-                    # Mise à jour des paramètres de la colonne j :
-                    for l, layer in enumerate(column.all_layers):
-                        layer.mcmc_params = Param(*X_proposal[l])
-
-                    # Calcul du profil de température associé aux nouveaux paramètres
-                    column.compute_solve_transi(verbose=False)
-                    temp_proposal = (
-                        column.get_temperatures_solve()
-                    )  # récupération du profil de température
-                    _temp_iter_chain[j] = temp_proposal
-                    _flow_iter_chain[j] = column.get_flows_solve()
-
-                    Energy_Proposal = compute_energy(
-                        temp_proposal[ind_ref],
-                        temp_ref,
-                        sigma2_temp_proposal,
+                        sigma2_chain,
                         sigma2_distrib,
-                    )  # calcul de l'énergie
-                    # calcul de la probabilité d'accpetation
-                    log_ratio_accept = compute_log_acceptance(
-                        Energy_Proposal, Energy[j]
+                        ind_ref,
+                        temp_ref,
                     )
 
-                    # Acceptation ou non des nouveaux paramètres
-                    if np.log(np.random.uniform(0, 1)) < log_ratio_accept:
-                        # on met à jour l'état de la colonne
-                        X[j] = X_proposal
-                        Energy[j] = Energy_Proposal
-                        self._acceptance[j] += 1
-
-                        self._states.append(
-                            State(
-                                layers=X[j],
-                                energy=Energy[j],
-                                ratio_accept=1,
-                                sigma2_temp=sigma2_temp_proposal,
-                            )
-                        )
+                # On suit les taux d'acceptation pour chaque chaîne grâce à un vecteur de taille nb_chain qu'on incrémente à chaque itération
+                if not burn_in_done:
+                    self._acceptance = np.zeros(nb_chain, np.float32)
 
+                # Transition après le burn in
+
+                print(
+                    f"Initialisation post burn-in - Utilisation de la mémoire (en Mo) : {process.memory_info().rss / 1e6}"
+                )
+
+                for i in trange(
+                    sampling_start, nb_iter, desc="DREAM MCMC Computation", file=sys.stdout
+                ):
+                    if checkpoint is not None and i % checkpoint_every == 0:
+                        save_dream_checkpoint("sampling", i)
+
+                    # Nouveaux paramètres proposés (les sauts ne servent plus à adapter pcr après le burn-in)
+                    X_proposal, _, _ = self.perturbation_DREAM_chains(
+                        rng, X, delta, c, c_star, cr_vec, pcr, ranges, is_param_fixed,
+                        Z[:n_Z] if dream_zs else None,
+                    )
+                    _, log_snooker = self._snooker_proposals(
+                        rng, snooker, X, X_proposal, Z[:n_Z] if dream_zs else None, ranges, is_param_fixed
+                    )
+                    for j in range(nb_chain):
+                        sigma2_temp_proposal[j] = sigma2_temp_prior.perturb(
+                            self._trace.sigma2_temp[0, j]
+                        )  # On tire un nouveau sigma2 autour de celui de l'état initial de la chaîne
+
+                    # Calcul des énergies associées aux propositions de toutes les chaînes, et des températures
+                    # et débits sous-échantillonnés lorsque l'itération est stockée
+                    sous_ech = (
+                        (n_sous_ech_space, n_sous_ech_time)
+                        if i % n_sous_ech_iter == 0
+                        else None
+                    )
+                    # les propositions des itérations stockées sont calculées en entier, qu'elles soient acceptées ou non
+                    log_u = np.log(rng.uniform(0, 1, nb_chain)) - log_snooker
+                    if not delayed_acceptance:
+                        Energy_Proposal, temp_proposal, flow_proposal = self._evaluate_proposals(
+                            solver_context,
+                            chain_pool,
+                            n_workers,
+                            X_proposal,
+                            sigma2_temp_proposal,
+                            sigma2_distrib,
+                            ind_ref,
+                            temp_ref,
+                            sous_ech,
+                            energy_budget=Energy - log_u if sous_ech is None else None,
+                        )
+                        log_ratio_coarse = np.zeros(nb_chain)
                     else:
-                        dX = np.zeros((nb_layer, nb_param), np.float32)
-                        # On ne met pas à jour l'état :
-                        self._states.append(self._states[-nb_chain])
-                        # On remet les anciens paramètres pour la colonne :
-                        for l, layer in enumerate(column.all_layers):
-                            layer.mcmc_params = Param(*X[j][l])
-
-                if i % n_sous_ech_iter == 0:  # sous échantillonnage
-                    # Si le numéro de l'itération i est un multiple de n_sous_ech_iter, on stocke
-                    k = i // n_sous_ech_iter
+                        (
+                            Energy_Proposal,
+                            temp_proposal,
+                            flow_proposal,
+                            log_ratio_coarse,
+                            coarse_proposal,
+                        ) = self._evaluate_delayed_acceptance(
+                            rng,
+                            coarse_context,
+                            coarse_energy,
+                            solver_context,
+                            chain_pool,
+                            n_workers,
+                            X_proposal,
+                            sigma2_temp_proposal,
+                            sigma2_distrib,
+                            ind_ref,
+                            temp_ref,
+                            Energy,
+                            log_u,
+                            sous_ech,
+                        )
+
                     for j in range(nb_chain):
-                        if np.isnan(
-                            _temp_iter_chain[j, ::n_sous_ech_space, ::n_sous_ech_time]
-                        ).any():
-                            _temp[k, j] = _temp[(k - 1), j]
-                            _flows[k, j] = _flows[(k - 1), j]
+                        # calcul de la probabilité d'accpetation
+                        log_ratio_accept = (
+                            compute_log_acceptance(Energy_Proposal[j], Energy[j])
+                            - log_ratio_coarse[j]
+                        )
+
+                        # Acceptation ou non des nouveaux paramètres
+                        if log_u[j] < log_ratio_accept:
+                            # on met à jour l'état de la chaîne
+                            X[j] = X_proposal[j]
+                            Energy[j] = Energy_Proposal[j]
+                            if delayed_acceptance:
+                                coarse_energy[j] = coarse_proposal[j]
+                            self._acceptance[j] += 1
+
+                            self._trace.record(
+                                i + 1, j, X[j], Energy[j], sigma2_temp_proposal[j]
+                            )
+
                         else:
-                            _temp[k, j] = _temp_iter_chain[
-                                j, ::n_sous_ech_space, ::n_sous_ech_time
-                            ]
-                            _flows[k, j] = _flow_iter_chain[
-                                j, ::n_sous_ech_space, ::n_sous_ech_time
-                            ]
+                            # On ne met pas à jour l'état :
+                            self._trace.repeat(i + 1, j)
+
+                    if dream_zs:
+                        nb_zs_iter += 1
+                        if nb_zs_iter % zs_thinning == 0:
+                            Z[n_Z : n_Z + nb_chain] = X
+                            n_Z += nb_chain
+
+                    if i % n_sous_ech_iter == 0:  # sous échantillonnage
+                        # Si le numéro de l'itération i est un multiple de n_sous_ech_iter, on stocke
+                        k = i // n_sous_ech_iter
+                        for j in range(nb_chain):
+                            if quantile_mode == "online":
+                                # un profil contenant des NaN n'est pas pris en compte dans les quantiles
+                                if not np.isnan(temp_proposal[j]).any():
+                                    _temp.update(temp_proposal[j])
+                                    _flows.update(flow_proposal[j])
+                            elif np.isnan(temp_proposal[j]).any():
+                                _temp[k, j] = _temp[(k - 1), j]
+                                _flows[k, j] = _flows[(k - 1), j]
+                            else:
+                                _temp[k, j] = temp_proposal[j]
+                                _flows[k, j] = flow_proposal[j]
+            finally:
+                # aussi en cas d'erreur (NaN, écriture d'un checkpoint, interruption) : les processus du pool ne
+                # doivent pas survivre à la MCMC
+                if chain_pool is not None:
+                    chain_pool.terminate()
+                    chain_pool.join()
 
             for j in range(nb_chain):
                 self._acceptance[j] /= nb_iter
@@ -1314,105 +1698,243 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
                 print(f"Acceptance rate : {self._acceptance}")
 
             # Calcul des quantiles pour la température
-            _temp = _temp.reshape(
-                sizesubsampling * nb_chain, nb_cells_sous_ech, nb_times_sous_ech
-            )
-            _flows = _flows.reshape(
-                sizesubsampling * nb_chain, nb_cells_sous_ech, nb_times_sous_ech
-            )
+            if quantile_mode != "online":
+                _temp = _temp.reshape(
+                    sizesubsampling * nb_chain, nb_cells_sous_ech, nb_times_sous_ech
+                )
+                _flows = _flows.reshape(
+                    sizesubsampling * nb_chain, nb_cells_sous_ech, nb_times_sous_ech
+                )
 
         else:  # cas single chain
-            _temp_iter = np.zeros(
-                (self._nb_cells, len(self._times)), np.float32
-            )  # dernière température acceptée pour la colonne
-            _flow_iter = np.zeros(
-                (self._nb_cells, len(self._times)), np.float32
-            )  # dernier débit accepté pour la colonne
-            _temp = np.zeros(
-                (sizesubsampling, self._nb_cells, len(self._times)), np.float32
-            )  # stockage des températures sous échantillonées pendant la mcmc
-            _flows = np.zeros(
-                (sizesubsampling, self._nb_cells, len(self._times)), np.float32
-            )  # stockage des débits sous échantillonées pendant la mcmc
+            if quantile_mode == "online":
+                _temp = P2Quantiles(quantile, (nb_cells_sous_ech, nb_times_sous_ech))
+                _flows = P2Quantiles(quantile, (nb_cells_sous_ech, nb_times_sous_ech))
+            elif quantile_mode == "disk":
+                _temp = sample_store.create(
+                    "temperatures",
+                    (sizesubsampling, nb_cells_sous_ech, nb_times_sous_ech),
+                )
+                _flows = sample_store.create(
+                    "flows", (sizesubsampling, nb_cells_sous_ech, nb_times_sous_ech)
+                )
+            else:
+                _temp = np.zeros(
+                    (sizesubsampling, self._nb_cells, len(self._times)), np.float32
+                )  # stockage des températures sous échantillonées pendant la mcmc
+                _flows = np.zeros(
+                    (sizesubsampling, self._nb_cells, len(self._times)), np.float32
+                )  # stockage des débits sous échantillonées pendant la mcmc
             self._acceptance = 0  # taux d'acceptation
 
             if isinstance(quantile, Number):
                 quantile = [quantile]
 
-            for i in trange(nitmaxburning, desc="Init Mcmc ", file=sys.stdout):
-                # on tire un jeu de paramètres aléatoires selon les priors
-                self.sample_params_from_priors()
-                init_sigma2_temp = sigma2_temp_prior.sample()
-
-                # on lance le modèle direct et on stocke les résultats dans la classe state
-                self.compute_solve_transi(verbose=False)
-                self._states.append(
-                    State(
-                        layers=self.get_list_current_params(),
-                        energy=compute_energy(
-                            self.temperatures_solve[ind_ref, :],
-                            temp_ref,
-                            sigma2=init_sigma2_temp,
-                            sigma2_distrib=sigma2_distrib,
-                        ),
-                        ratio_accept=1,
-                        sigma2_temp=init_sigma2_temp,
+            # reprise : l'initialisation est remplacée par l'état du point de reprise, générateurs aléatoires compris
+            sampling_start = 0
+            if resumed is None:
+                # départ à chaud : les jeux initiaux sont au plus nitmaxburning états tirés sans remise dans le run précédent
+                nb_init = nitmaxburning
+                if warm_start is not None:
+                    nb_init = min(nitmaxburning, len(warm_start))
+                    id_warm = np.random.choice(len(warm_start), nb_init, replace=False)
+                init_params = np.zeros((nb_init, nb_layer, nb_param), np.float32)
+                init_energy = np.zeros(nb_init)
+                init_sigma2_temp = np.zeros(nb_init)
+                for i in trange(nb_init, desc="Init Mcmc ", file=sys.stdout):
+                    # on tire un jeu de paramètres aléatoires selon les priors
+                    if warm_start is None:
+                        self.sample_params_from_priors()
+                    else:
+                        for l, layer in enumerate(self.all_layers):
+                            layer.mcmc_params = Param(*warm_start[id_warm[i], l])
+                    init_sigma2_temp[i] = sigma2_temp_prior.sample()
+
+                    init_params[i] = self._get_list_mcmc_params()
+                    if coarse_burn_in:
+                        continue  # les jeux tirés sont évalués ensemble sur le modèle grossier
+
+                    # on lance le modèle direct et on stocke les résultats
+                    self.compute_solve_transi(verbose=False, reuse_buffers=True)
+                    init_energy[i] = compute_energy(
+                        self.temperatures_solve[ind_ref, :],
+                        temp_ref,
+                        sigma2=init_sigma2_temp[i],
+                        sigma2_distrib=sigma2_distrib,
                     )
-                )
 
-            # on garde uniquement le meilleur état
-            self._states = [min(self._states, key=attrgetter("energy"))]
-
-            # on initialise la colonnne pour les paramètres qui minimisent l'énergie
-            for l, layer in enumerate(self.all_layers):
-                layer.mcmc_params = Param(*self._states[0].layers[l])
+                # les propositions sont évaluées avec un contexte du modèle direct préparé une fois,
+                # qui permet d'interrompre leur calcul (voir le cas DREAM)
+                solver_context = SolverContext(self)
+                init_sigma2_density = np.array([sigma2_distrib(s) for s in init_sigma2_temp])
+                if coarse_burn_in:
+                    init_energy, _, _ = _evaluate_chains(
+                        coarse_context,
+                        init_params,
+                        init_sigma2_temp,
+                        init_sigma2_density,
+                        coarse_context.id_sensors,
+                        coarse_context.temp_ref,
+                        energy_scale=coarse_context.time_ratio,
+                    )
 
-            self._acceptance = np.zeros(nb_iter)
+                # on garde uniquement le meilleur état, qui devient l'état initial de la trace
+                i_best = np.argmin(init_energy)
+                current_energy = init_energy[i_best]
+                current_sigma2_temp = init_sigma2_temp[i_best]
+                if coarse_burn_in:
+                    # transfert sur le modèle complet : l'énergie du meilleur état y est recalculée
+                    if delayed_acceptance:
+                        coarse_energy = init_energy[i_best : i_best + 1]
+                    current_energy = _evaluate_chains(
+                        solver_context,
+                        init_params[i_best : i_best + 1],
+                        init_sigma2_temp[i_best : i_best + 1],
+                        init_sigma2_density[i_best : i_best + 1],
+                        ind_ref,
+                        temp_ref,
+                    )[0][0]
+                self._trace.record(
+                    0, 0, init_params[i_best], current_energy, current_sigma2_temp
+                )
 
-            _temp_iter = self.get_temperatures_solve()
-            _flow_iter = self.get_flows_solve()
+                # on initialise la colonnne pour les paramètres qui minimisent l'énergie
+                for l, layer in enumerate(self.all_layers):
+                    layer.mcmc_params = Param(*init_params[i_best, l])
+
+                self._acceptance = np.zeros(nb_iter)
+
+                if delayed_acceptance and not coarse_burn_in:
+                    coarse_energy, _, _ = _evaluate_chains(
+                        coarse_context,
+                        init_params[i_best : i_best + 1],
+                        init_sigma2_temp[i_best : i_best + 1],
+                        init_sigma2_density[i_best : i_best + 1],
+                        coarse_context.id_sensors,
+                        coarse_context.temp_ref,
+                        energy_scale=coarse_context.time_ratio,
+                    )
 
-            nb_accepted = 0
+                nb_accepted = 0
+            else:
+                state = resumed["state"]
+                solver_context = SolverContext(self)
+                for l, layer in enumerate(self.all_layers):
+                    layer.mcmc_params = Param(*state["params"][l])
+                current_energy = state["current_energy"]
+                current_sigma2_temp = state["current_sigma2_temp"]
+                if delayed_acceptance:
+                    coarse_energy = state["coarse_energy"]
+                nb_accepted = state["nb_accepted"]
+                self._acceptance = np.zeros(nb_iter)
+                _temp, _flows = restore_samples(
+                    state, self._trace, _temp, _flows, quantile_mode
+                )
+                sampling_start = state["iteration"]
+                restore_random_states(resumed)
+
+            for i in trange(
+                sampling_start, nb_iter, desc="Mcmc Computation", file=sys.stdout
+            ):
+                if checkpoint is not None and i % checkpoint_every == 0:
+                    if sample_store is not None:
+                        sample_store.flush()
+                    state = {
+                        "phase": "sampling",
+                        "iteration": i,
+                        "params": self._get_list_mcmc_params(),
+                        "current_energy": current_energy,
+                        "current_sigma2_temp": current_sigma2_temp,
+                        "coarse_energy": coarse_energy if delayed_acceptance else None,
+                        "nb_accepted": nb_accepted,
+                        **samples_state(
+                            self._trace,
+                            _temp,
+                            _flows,
+                            i + 1,
+                            (i + n_sous_ech_iter - 1) // n_sous_ech_iter,
+                            quantile_mode,
+                        ),
+                    }
+                    save_checkpoint(checkpoint, run_settings, state)
 
-            for i in trange(nb_iter, desc="Mcmc Computation", file=sys.stdout):
                 # on stocke les paramètres avant la proposition de pas
                 X = self._get_list_mcmc_params()
 
                 # on fait une proposition de pas
                 self.perturb_params()
-                sigma2_temp_proposal = sigma2_temp_prior.perturb(
-                    self._states[-1].sigma2_temp
+                sigma2_temp_proposal = sigma2_temp_prior.perturb(current_sigma2_temp)
+
+                # u est tiré avant le modèle direct, qui s'arrête dès que la proposition ne peut plus être acceptée,
+                # sauf aux itérations stockées où la proposition est calculée en entier
+                log_u = np.log(random())
+                sous_ech = (
+                    (n_sous_ech_space, n_sous_ech_time)
+                    if i % n_sous_ech_iter == 0
+                    else None
                 )
 
                 # on calcule l'énergie pour les nouveaux paramètres
-                self.compute_solve_transi(verbose=False)
-                _temp_iter = self.get_temperatures_solve()
-                _flow_iter = self.get_flows_solve()
-
-                Energy_Proposal = compute_energy(
-                    self.temperatures_solve[ind_ref, :],
-                    temp_ref,
-                    sigma2_temp_proposal,
-                    sigma2_distrib=sigma2_temp_prior.density,
-                )
+                X_proposal = np.array([self._get_list_mcmc_params()])
+                if not delayed_acceptance:
+                    Energy_Proposal, temp_proposal, flow_proposal = _evaluate_chains(
+                        solver_context,
+                        X_proposal,
+                        np.array([sigma2_temp_proposal]),
+                        np.array([sigma2_distrib(sigma2_temp_proposal)]),
+                        ind_ref,
+                        temp_ref,
+                        sous_ech,
+                        np.array([current_energy - log_u]) if sous_ech is None else None,
+                    )
+                    log_ratio_coarse = 0.0
+                else:
+                    (
+                        Energy_Proposal,
+                        temp_proposal,
+                        flow_proposal,
+                        log_ratio_coarse,
+                        coarse_proposal,
+                    ) = self._evaluate_delayed_acceptance(
+                        np.random,  # chaîne unique : tirages dans l'état global de numpy, comme le reste de la marche
+                        coarse_context,
+                        coarse_energy,
+                        solver_context,
+                        None,
+                        1,
+                        X_proposal,
+                        np.array([sigma2_temp_proposal]),
+                        sigma2_distrib,
+                        ind_ref,
+                        temp_ref,
+                        np.array([current_energy]),
+                        np.array([log_u]),
+                        sous_ech,
+                    )
+                    log_ratio_coarse = log_ratio_coarse[0]
+                Energy_Proposal = Energy_Proposal[0]
 
-                log_ratio_accept = compute_log_acceptance(
-                    Energy_Proposal, self._states[-1].energy
+                log_ratio_accept = (
+                    compute_log_acceptance(Energy_Proposal, current_energy)
+                    - log_ratio_coarse
                 )
 
-                if np.log(random()) < log_ratio_accept:
+                if log_u < log_ratio_accept:
                     nb_accepted += 1
-                    self._states.append(
-                        State(
-                            layers=self.get_list_current_params(),
-                            energy=Energy_Proposal,
-                            ratio_accept=nb_accepted / (i + 1),
-                            sigma2_temp=sigma2_temp_proposal,
-                        )
+                    current_energy = Energy_Proposal
+                    current_sigma2_temp = sigma2_temp_proposal
+                    if delayed_acceptance:
+                        coarse_energy[0] = coarse_proposal[0]
+                    self._trace.record(
+                        i + 1,
+                        0,
+                        self._get_list_mcmc_params(),
+                        current_energy,
+                        current_sigma2_temp,
                     )
 
                 else:  # le saut est rejeté
-                    self._states.append(self._states[-1])
+                    self._trace.repeat(i + 1, 0)
 
                     # On remet les paramètres précédent pour la colonne
                     for l, layer in enumerate(self.all_layers):
@@ -1421,8 +1943,12 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
                 if i % n_sous_ech_iter == 0:
                     # Si i+1 est un multiple de n_sous_ech_iter, on stocke
                     k = i // n_sous_ech_iter
-                    _temp[k] = _temp_iter[::n_sous_ech_space, ::n_sous_ech_time]
-                    _flows[k] = _flow_iter[::n_sous_ech_space, ::n_sous_ech_time]
+                    if quantile_mode == "online":
+                        _temp.update(temp_proposal[0])
+                        _flows.update(flow_proposal[0])
+                    else:
+                        _temp[k] = temp_proposal[0]
+                        _flows[k] = flow_proposal[0]
 
             self._acceptance = nb_accepted / (nb_iter + 1)
 
@@ -1432,15 +1958,26 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
                     f"Fin itérations MCMC, avant le calcul des quantiles - Utilisation de la mémoire (en Mo) : {process.memory_info().rss / 1e6}"
                 )
 
-        self._quantiles_temperatures = {
-            quant: res
-            for quant, res in zip(quantile, np.quantile(_temp, quantile, axis=0))
-        }
+        if quantile_mode == "online":
+            self._quantiles_temperatures = _temp.get_quantiles()
+            self._quantiles_flows = _flows.get_quantiles()
+        elif quantile_mode == "disk":
+            # quantiles exacts calculés par blocs de pas de temps sur les échantillons stockés sur disque
+            sample_store.flush()
+            self._quantiles_temperatures = quantiles_by_time_chunks(_temp, quantile, 1)
+            self._quantiles_flows = quantiles_by_time_chunks(_flows, quantile, 1)
+            if verbose:
+                print(f"MCMC samples stored in {sample_store.dir}")
+        else:
+            self._quantiles_temperatures = {
+                quant: res
+                for quant, res in zip(quantile, np.quantile(_temp, quantile, axis=0))
+            }
 
-        self._quantiles_flows = {
-            quant: res
-            for quant, res in zip(quantile, np.quantile(_flows, quantile, axis=0))
-        }
+            self._quantiles_flows = {
+                quant: res
+                for quant, res in zip(quantile, np.quantile(_flows, quantile, axis=0))
+            }
 
         self._acceptance = self._acceptance / nb_iter
 
@@ -1465,83 +2002,78 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
     @compute_mcmc.needed
     def sample_param(self):
         # retourne aléatoirement un des couples de paramètres parlesquels est passé la MCMC
-        return choice(
-            [[layer.mcmc_params for layer in state.layers] for state in self._states]
-        )
+        all_mcmc_params = self.get_all_mcmc_params()
+        return [Param(*params) for params in choice(all_mcmc_params)]
 
     # erreur si pas déjà éxécuté compute_mcmc, sinon l'attribut pas encore affecté à une valeur
     @compute_mcmc.needed
     def get_best_param(self):
         """return the params that minimize the energy"""
         return [
-            layer.mcmc_params
-            for layer in min(self._states, key=attrgetter("energy")).layers
+            Param(*params) for params in self._trace.params[self._trace.best()]
         ]  # retourne le couple de paramètres minimisant l'énergie par lequels est passé la MCMC
 
     @compute_mcmc.needed
     def get_best_sigma2(self):
         """return the best sigma that minimizes the energy"""
-        return min(self._states, key=attrgetter("energy")).sigma2_temp
+        return self._trace.sigma2_temp[self._trace.best()]
 
     @compute_mcmc.needed
     def get_best_layers(self):
         """set the params of the columns to those which minimize the energy"""
         """works independently of the type of MCMC"""
-        best_layers = min(self._states, key=attrgetter("energy")).layers
+        best_layers = self._trace.params[self._trace.best()]
         for l, layer in enumerate(self.all_layers):
             layer.mcmc_params = Param(*best_layers[l])
 
+    @compute_mcmc.needed
+    def get_chains_mcmc_params(self):
+        """
+        Retourne l'historique des paramètres de TRAVAIL (MCMC) de chaque chaîne après le burn-in, tableau
+        (nb_iter, nb_chain, nb_couches, nb_paramètres) : vue sur la trace sans l'état initial. C'est le warm_start
+        de compute_mcmc pour la mise à jour incrémentale de la colonne qui prolonge celle-ci.
+        """
+        return self._trace.params[1:]
+
+    @compute_mcmc.needed
+    def get_all_mcmc_params(self):
+        """
+        Retourne l'historique des paramètres de TRAVAIL (MCMC) de chaque couche, tableau
+        (nb_états, nb_couches, nb_paramètres) : vue sur la trace, états ordonnés par itération puis par chaîne.
+        """
+        return self._trace.params.reshape(-1, *self._trace.params.shape[2:])
+
     def get_all_params(self):
         """
-        Retourne l'historique complet des paramètres PHYSIQUES pour chaque couche.
-        Cette version corrigée sait comment traduire l'historique des valeurs MCMC.
+        Retourne l'historique complet des paramètres PHYSIQUES pour chaque couche, tableau
+        (nb_états, nb_couches, nb_paramètres) traduit depuis les valeurs MCMC de la trace.
         """
-        all_physical_params_history = []
+        all_mcmc_params = self.get_all_mcmc_params()
+        all_physical_params = np.empty(all_mcmc_params.shape)
         # self.all_layers contient les vrais objets Layer avec leurs Priors (les "traducteurs")
-        layers_with_priors = self.all_layers
-
-        # self._states contient l'historique des valeurs de la MCMC (des tableaux NumPy)
-        for state in self._states:
-            # state.layers est un tableau NumPy de la forme (nb_couches, nb_parametres)
-            mcmc_params_for_state = state.layers
-            physical_state_params = []
-
-            # On parcourt chaque couche du modèle
-            for l, layer_obj in enumerate(layers_with_priors):
-                # On récupère les paramètres MCMC pour cette couche à cet état de la chaîne
-                mcmc_params_for_layer = mcmc_params_for_state[l]
-
-                # On utilise les Priors de la couche pour traduire les valeurs MCMC en valeurs physiques
-                physical_vals = [
-                    prior.mcmc_to_physical(val)
-                    for prior, val in zip(layer_obj.Prior_list, mcmc_params_for_layer)
-                ]
-                physical_state_params.append(Param(*physical_vals))
-
-            all_physical_params_history.append(physical_state_params)
-        return all_physical_params_history
+        for l, layer_obj in enumerate(self.all_layers):
+            for p, prior in enumerate(layer_obj.Prior_list):
+                all_physical_params[:, l, p] = prior.mcmc_to_physical(
+                    all_mcmc_params[:, l, p]
+                )
+        return all_physical_params
 
     # Les autres getters deviennent beaucoup plus simples car ils utilisent la fonction ci-dessus
     def get_all_IntrinK(self):
         """Retourne l'historique des valeurs PHYSIQUES de IntrinK."""
-        all_params = self.get_all_params()
-        return [[p.IntrinK for p in state_params] for state_params in all_params]
+        return self.get_all_params()[:, :, PARAM_LIST.index("IntrinK")]
 
     def get_all_n(self):
-        all_params = self.get_all_params()
-        return [[p.n for p in state_params] for state_params in all_params]
+        return self.get_all_params()[:, :, PARAM_LIST.index("n")]
 
     def get_all_lambda_s(self):
-        all_params = self.get_all_params()
-        return [[p.lambda_s for p in state_params] for state_params in all_params]
+        return self.get_all_params()[:, :, PARAM_LIST.index("lambda_s")]
 
     def get_all_rhos_cs(self):
-        all_params = self.get_all_params()
-        return [[p.rhos_cs for p in state_params] for state_params in all_params]
+        return self.get_all_params()[:, :, PARAM_LIST.index("rhos_cs")]
 
     def get_all_q_s(self):
-        all_params = self.get_all_params()
-        return [[p.q_s for p in state_params] for state_params in all_params]
+        return self.get_all_params()[:, :, PARAM_LIST.index("q_s")]
 
     # Les propriétés pointent vers les nouvelles méthodes
     all_IntrinK = property(get_all_IntrinK)
@@ -1553,16 +2085,23 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
     # erreur si pas déjà éxécuté compute_mcmc, sinon l'attribut pas encore affecté à une valeur
     @compute_mcmc.needed
     def get_all_sigma2(self):
-        return [state.sigma2_temp for state in self._states]
+        return self._trace.sigma2_temp.reshape(-1)
 
     all_sigma = property(get_all_sigma2)
 
     @compute_mcmc.needed
     def get_all_energy(self):
-        return self._initial_energies + [state.energy for state in self._states]
+        return self._trace.energy.reshape(-1)
 
     all_energy = property(get_all_energy)
 
+    @compute_mcmc.needed
+    def get_all_accepted(self):
+        # True pour les états issus d'une proposition acceptée
+        return self._trace.accepted.reshape(-1)
+
+    all_accepted = property(get_all_accepted)
+
     @compute_mcmc.needed
     # retourne toutes les valeurs d'acceptance empirique par lesquels est passée la MCMC
     def get_all_acceptance_ratio(self):
@@ -2047,15 +2586,13 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
         nb_layers = len(self.all_layers)
         nb_params = len(PARAM_LIST)
 
-        all_params_history_list = self.get_all_params()
+        # tableau 3D (nb_états, nb_couches, nb_paramètres)
+        all_params_array = self.get_all_params()
 
-        if not all_params_history_list:
+        if len(all_params_array) == 0:
             print("Aucune donnée MCMC à afficher.")
             return
 
-        # On convertit la liste en un tableau NumPy 3D pour une manipulation facile.
-        all_params_array = np.array(all_params_history_list)
-
         # CORRECTION : On simplifie la création des axes.
         # L'argument squeeze=False garantit que 'axes' est TOUJOURS un tableau 2D,
         # même s'il n'y a qu'une seule couche (forme (1, 5)).
@@ -2266,6 +2803,124 @@ class Column:  # colonne de sédiments verticale entre le lit de la rivière et
             )
 
 
+def _evaluate_chains(
+    solver_context,
+    X,
+    sigma2_temp,
+    sigma2_density,
+    ind_ref,
+    temp_ref,
+    sous_ech=None,
+    energy_budget=None,
+    energy_scale=1.0,
+):
+    """
+    Énergies des jeux de paramètres X (un par chaîne) et, si sous_ech = (n_sous_ech_space, n_sous_ech_time)
+    est donné, températures et débits sous-échantillonnés. sigma2_density contient les valeurs de la densité
+    a priori de sigma2 déjà évaluées en sigma2_temp.
+
+    energy_budget (n_chains,) est l'énergie au-delà de laquelle la proposition de chaque chaîne sera rejetée
+    (énergie courante - log u). Il est traduit en budget sur la somme des carrés des écarts aux mesures :
+    dès que la marche en température le dépasse, elle s'arrête et l'énergie renvoyée est inf.
+
+    energy_scale multiplie les termes de vraisemblance de l'énergie : pour un modèle grossier qui ne garde qu'un
+    temps sur n, energy_scale = n ramène son énergie à l'échelle de celle du modèle complet.
+    """
+    misfit_budget = None
+    if energy_budget is not None:
+        # E = energy_scale (size(temp_ref) log(sigma2) + misfit / (2 sigma2)) - log(densité(sigma2)) < energy_budget
+        misfit_budget = (
+            2
+            * sigma2_temp
+            * (
+                (energy_budget + np.log(sigma2_density)) / energy_scale
+                - size(temp_ref) * np.log(sigma2_temp)
+            )
+        )
+        # marge pour les arrondis : une proposition n'est interrompue que si elle aurait été rejetée
+        misfit_budget += MISFIT_BUDGET_MARGIN * np.abs(misfit_budget)
+    # seules les températures aux capteurs sont calculées, et les champs sous-échantillonnés si l'itération est stockée
+    temp_sensors, misfit, temperatures, flows = solver_context.solve_batch_sensors(
+        X, ind_ref, temp_ref, misfit_budget, sous_ech
+    )
+    if energy_scale == 1:
+        energies = np.array(
+            [
+                np.inf
+                if misfit[j] == np.inf
+                else compute_energy(
+                    temp_sensors[j],
+                    temp_ref,
+                    sigma2_temp[j],
+                    lambda _, density=sigma2_density[j]: density,
+                )
+                for j in range(len(X))
+            ]
+        )
+    else:
+        energies = np.array(
+            [
+                np.inf
+                if misfit[j] == np.inf
+                else energy_scale
+                * compute_energy(temp_sensors[j], temp_ref, sigma2_temp[j], lambda _: 1)
+                - np.log(sigma2_density[j])
+                for j in range(len(X))
+            ]
+        )
+    return energies, temperatures, flows
+
+
+# contexte du modèle direct et mesures propres à chaque processus du pool de chaînes de compute_mcmc (n_workers > 1)
+_chain_worker = None
+
+
+def _wrap_in_ranges(X, ranges):
+    """
+    Repliement modulo les bornes des priors ranges (nb_layer, nb_param, 2) des paramètres X (..., nb_layer, nb_param),
+    pour les seuls paramètres d'intervalle non vide : un saut qui sort de l'intervalle y rentre par l'autre extrémité.
+    """
+    width = ranges[:, :, 1] - ranges[:, :, 0]
+    variable_mask = width > 0
+    wrapped = ranges[:, :, 0] + np.mod(
+        X - ranges[:, :, 0], np.where(variable_mask, width, 1.0)
+    )
+    return np.where(variable_mask, wrapped, X).astype(np.float32)
+
+
+def _distinct_indices(rng, n, shape, k):
+    """Tableau shape + (k,) de k indices distincts parmi range(n) pour chaque élément de shape, dans un ordre aléatoire."""
+    keys = rng.random(shape + (n,))
+    selected = np.argpartition(keys, k - 1, axis=-1)[..., :k]
+    order = np.argsort(np.take_along_axis(keys, selected, axis=-1), axis=-1)
+    return np.take_along_axis(selected, order, axis=-1)
+
+
+def _init_chain_worker(solver_context, ind_ref, temp_ref, coarse_context=None):
+    global _chain_worker
+    _chain_worker = (solver_context, ind_ref, temp_ref, coarse_context)
+
+
+def _evaluate_chains_in_worker(
+    X, sigma2_temp, sigma2_density, sous_ech, energy_budget, coarse=False
+):
+    solver_context, ind_ref, temp_ref, coarse_context = _chain_worker
+    if coarse:
+        solver_context = coarse_context
+        ind_ref, temp_ref = coarse_context.id_sensors, coarse_context.temp_ref
+    return _evaluate_chains(
+        solver_context,
+        X,
+        sigma2_temp,
+        sigma2_density,
+        ind_ref,
+        temp_ref,
+        sous_ech,
+        energy_budget,
+        solver_context.time_ratio,
+    )
+
+
 def compute_energy(temp_simul, temp_ref, sigma2, sigma2_distrib):
     norm2 = np.linalg.norm(temp_ref - temp_simul) ** 2
     return (
@@ -1,15 +1,1128 @@
 from numpy import float32, zeros
 
-from numpy.linalg import solve
-
 # import numpy as np
 from numba import njit
 import numpy as np
 
-from pyheatmy.solver import solver, tri_product
+from pyheatmy.solver import (
+    solver,
+    tri_product,
+    tri_factorize,
+    tri_solve_factorized,
+    tri_product_into,
+    tri_solve_factorized_batch,
+)
 from pyheatmy.config import *
 
 
+# Noyaux compilés (numba) pour la marche en temps complète des systèmes H et T.
+# Les classes ci-dessous assemblent les diagonales (une seule fois quand dt est constant)
+# puis délèguent toute la boucle temporelle à ces fonctions, ce qui évite un aller-retour
+# Python par pas de temps. Les résultats sont écrits en place dans les tableaux fournis.
+
+
+@njit
+def assemble_H_c(j, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c):
+    """Vecteur c (conditions aux limites et terme source q_s) du pas j -> j+1 de la charge."""
+    n_cell = c.shape[0]
+    c[:] = 0.0
+    c[0] = coef_riv * (alpha * H_riv[j + 1] + (1 - alpha) * H_riv[j])
+    c[n_cell - 1] = coef_aq * (alpha * H_aq[j + 1] + (1 - alpha) * H_aq[j])
+    for i in range(n_cell):
+        c[i] = c[i] + q_s_list[i]
+
+
+@njit
+def factorize_H(lower_diagonal_A, diagonal_A, upper_diagonal_A, lower_diagonal_B, diagonal_B, upper_diagonal_B):
+    """
+    Opérateurs de la charge à dt constant, calculés une seule fois pour toute la marche : factorisation de A
+    (multiplicateurs et pivots de tri_factorize, diagonale supérieure) et diagonales de B, en float32.
+    """
+    n_cell = diagonal_A.shape[0]
+    m_A = np.zeros(n_cell - 1, float32)
+    u_A = np.zeros(n_cell, float32)
+    tri_factorize(lower_diagonal_A, diagonal_A, upper_diagonal_A, m_A, u_A)
+    return (
+        m_A,
+        u_A,
+        upper_diagonal_A.astype(float32),
+        lower_diagonal_B.astype(float32),
+        diagonal_B.astype(float32),
+        upper_diagonal_B.astype(float32),
+    )
+
+
+@njit
+def assemble_H_rhs(j, lower_B, diag_B, upper_B, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c, H_prev, B_fois_H_plus_c):
+    """Second membre B * H_prev + c du pas j -> j+1 de la charge, écrit dans B_fois_H_plus_c."""
+    assemble_H_c(j, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c)
+    tri_product_into(lower_B, diag_B, upper_B, H_prev, B_fois_H_plus_c)
+    for i in range(H_prev.shape[0]):
+        B_fois_H_plus_c[i] += c[i]
+
+
+@njit
+def advance_H(j, operators_H, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c, B_fois_H_plus_c, H_prev, H_next):
+    """Pas j -> j+1 de la charge : H_next est calculée à partir de H_prev avec les opérateurs de factorize_H."""
+    m_A, u_A, upper_A, lower_B, diag_B, upper_B = operators_H
+    assemble_H_rhs(
+        j, lower_B, diag_B, upper_B, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c, H_prev,
+        B_fois_H_plus_c,
+    )
+    tri_solve_factorized(m_A, u_A, upper_A, B_fois_H_plus_c, H_next)
+
+
+@njit
+def march_H_constant_dt(
+    lower_diagonal_A,
+    diagonal_A,
+    upper_diagonal_A,
+    lower_diagonal_B,
+    diagonal_B,
+    upper_diagonal_B,
+    coef_riv,
+    coef_aq,
+    q_s_list,
+    H_riv,
+    H_aq,
+    alpha,
+    H_res,
+):
+    """
+    Marche en temps de l'équation de diffusivité quand dt est constant (A et B fixes).
+    coef_riv et coef_aq sont les coefficients 8K/(3dz²) des conditions aux limites.
+    H_res[:, 0] doit contenir H_init, les colonnes suivantes sont remplies en place.
+
+    A est factorisée une seule fois et B stockée une seule fois en float32 (factorize_H) :
+    chaque pas se réduit au produit par B et à une descente-remontée, sans allocation.
+    """
+    n_cell, n_times = H_res.shape
+    operators_H = factorize_H(
+        lower_diagonal_A, diagonal_A, upper_diagonal_A, lower_diagonal_B, diagonal_B, upper_diagonal_B
+    )
+    c = np.zeros(n_cell, float32)
+    B_fois_H_plus_c = np.zeros(n_cell, float32)
+    for j in range(n_times - 1):
+        advance_H(
+            j, operators_H, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c,
+            B_fois_H_plus_c, H_res[:, j], H_res[:, j + 1],
+        )
+
+
+@njit
+def nablaH_column(H, H_riv_j, H_aq_j, dz, nablaH_j):
+    """Gradient de charge selon la profondeur au temps j, à partir des charges H au temps j."""
+    n_cell = H.shape[0]
+    nablaH_j[0] = 2 * (H[1] - H_riv_j) / (3 * dz)
+    for i in range(1, n_cell - 1):
+        nablaH_j[i] = (H[i + 1] - H[i - 1]) / (2 * dz)
+    nablaH_j[n_cell - 1] = 2 * (H_aq_j - H[n_cell - 2]) / (3 * dz)
+
+
+@njit
+def correct_interfaces_column(H, nablaH_j, K_list, inter_cara, dz):
+    """Réparation du gradient de charge aux interfaces entre couches, au temps j (voir correct_nablaH_interfaces)."""
+    for elem_idx in range(inter_cara.shape[0]):
+        i0 = int(inter_cara[elem_idx, 0])
+        i1 = int(inter_cara[elem_idx, 1])
+        if i1 == 0:
+            if K_list[i0] == K_list[i0 + 1]:
+                nablaH_j[i0] = nablaH_j[i0 + 1]
+            if K_list[i0] == K_list[i0 - 1]:
+                nablaH_j[i0] = nablaH_j[i0 - 1]
+        else:
+            nablaH_j[i0] = (H[i0 + 1] - H[i0]) / dz
+            nablaH_j[i1] = (H[i1] - H[i1 - 1]) / dz
+
+
+@njit
+def compute_nablaH(H_res, H_riv, H_aq, dz, nablaH):
+    """Gradient de charge selon la profondeur, à tout temps (schéma de H_stratified.nablaH)."""
+    for j in range(H_res.shape[1]):
+        nablaH_column(H_res[:, j], H_riv[j], H_aq[j], dz, nablaH[:, j])
+
+
+@njit
+def correct_nablaH_interfaces(H_res, nablaH, K_list, inter_cara, dz):
+    """
+    Réparation de la dérivation de la charge aux interfaces entre couches (cas multicouche).
+    inter_cara est le tableau (n_interfaces, 2) construit dans Column.compute_solve_transi.
+    """
+    for j in range(H_res.shape[1]):
+        correct_interfaces_column(H_res[:, j], nablaH[:, j], K_list, inter_cara, dz)
+
+
+# Lignes du tableau renvoyé par compute_T_operator : parties des coefficients de l'équation de la chaleur
+# qui ne dépendent ni du pas de temps j ni de dt. Les diagonales de B (températures au temps précédent)
+# et de A (temps suivant) s'en déduisent par une correction advective en nablaH au temps j (assemble_T_advection)
+# et par le terme en 1/dt (assemble_T_dt).
+T_LOWER_B, T_LOWER_B_ADV = 0, 1
+T_UPPER_B, T_UPPER_B_ADV = 2, 3
+T_LOWER_A, T_LOWER_A_ADV = 4, 5
+T_UPPER_A, T_UPPER_A_ADV = 6, 7
+T_DIAG_B, T_DIAG_B_SOURCE = 8, 9
+T_DIAG_A, T_DIAG_A_SOURCE = 10, 11
+N_T_OPERATOR = 12
+
+
+@njit
+def compute_T_operator(ke_list, ae_list, heat_source, dz, alpha):
+    """
+    Parties constantes (conduction, coefficients advectifs, terme source) des diagonales de l'équation
+    de la chaleur, tableau (N_T_OPERATOR, n_cell) indexé par les constantes T_*. Les diagonales
+    inférieures et supérieures n'utilisent que les n_cell - 1 premières colonnes.
+    """
+    n = ke_list.shape[0] - 1
+    operator = np.zeros((N_T_OPERATOR, n + 1), np.float64)
+    for i in range(n):
+        operator[T_LOWER_B, i] = ke_list[i + 1] * (1 - alpha) / dz**2
+        operator[T_LOWER_B_ADV, i] = (1 - alpha) * ae_list[i + 1] / (2 * dz)
+        operator[T_UPPER_B, i] = ke_list[i] * (1 - alpha) / dz**2
+        operator[T_UPPER_B_ADV, i] = (1 - alpha) * ae_list[i] / (2 * dz)
+        operator[T_LOWER_A, i] = -(ke_list[i + 1] * alpha / dz**2)
+        operator[T_LOWER_A_ADV, i] = alpha * ae_list[i + 1] / (2 * dz)
+        operator[T_UPPER_A, i] = -(ke_list[i] * alpha / dz**2)
+        operator[T_UPPER_A_ADV, i] = alpha * ae_list[i] / (2 * dz)
+    operator[T_LOWER_B, n - 1] = 4 * ke_list[n] * (1 - alpha) / (3 * dz**2)
+    operator[T_LOWER_B_ADV, n - 1] = 2 * (1 - alpha) * ae_list[n] / (3 * dz)
+    operator[T_UPPER_B, 0] = 4 * ke_list[0] * (1 - alpha) / (3 * dz**2)
+    operator[T_UPPER_B_ADV, 0] = 2 * (1 - alpha) * ae_list[0] / (3 * dz)
+    operator[T_LOWER_A, n - 1] = -4 * ke_list[n] * alpha / (3 * dz**2)
+    operator[T_LOWER_A_ADV, n - 1] = 2 * alpha * ae_list[n] / (3 * dz)
+    operator[T_UPPER_A, 0] = -4 * ke_list[0] * alpha / (3 * dz**2)
+    operator[T_UPPER_A_ADV, 0] = 2 * alpha * ae_list[0] / (3 * dz)
+
+    for i in range(n + 1):
+        operator[T_DIAG_B, i] = 2 * ke_list[i] * (1 - alpha) / dz**2
+        operator[T_DIAG_B_SOURCE, i] = (1 - alpha) * heat_source[i]
+        operator[T_DIAG_A, i] = 2 * ke_list[i] * alpha / dz**2
+        operator[T_DIAG_A_SOURCE, i] = alpha * heat_source[i]
+    operator[T_DIAG_B, 0] = 4 * ke_list[0] * (1 - alpha) / dz**2
+    operator[T_DIAG_B, n] = 4 * ke_list[n] * (1 - alpha) / dz**2
+    operator[T_DIAG_A, 0] = 4 * ke_list[0] * alpha / dz**2
+    operator[T_DIAG_A, n] = 4 * ke_list[n] * alpha / dz**2
+    return operator
+
+
+@njit
+def assemble_T_advection(nablaH_j, operator, lower_B, upper_B, lower_A, upper_A):
+    """Diagonales inférieures et supérieures de B et de A pour le pas j -> j+1, remplies en place."""
+    for i in range(lower_B.shape[0]):
+        lower_B[i] = operator[T_LOWER_B, i] - operator[T_LOWER_B_ADV, i] * nablaH_j[i + 1]
+        upper_B[i] = operator[T_UPPER_B, i] + operator[T_UPPER_B_ADV, i] * nablaH_j[i]
+        lower_A[i] = operator[T_LOWER_A, i] + operator[T_LOWER_A_ADV, i] * nablaH_j[i + 1]
+        upper_A[i] = operator[T_UPPER_A, i] - operator[T_UPPER_A_ADV, i] * nablaH_j[i]
+
+
+@njit
+def assemble_T_dt(dt, operator, diag_B, diag_A):
+    """Diagonales principales de B et de A pour un pas de temps dt, remplies en place."""
+    for i in range(diag_B.shape[0]):
+        diag_B[i] = 1 / dt - operator[T_DIAG_B, i] + operator[T_DIAG_B_SOURCE, i]
+        diag_A[i] = 1 / dt + operator[T_DIAG_A, i] - operator[T_DIAG_A_SOURCE, i]
+
+
+@njit
+def assemble_T_c(j, nablaH_j, ke_list, ae_list, dz, alpha, T_riv, T_aq, c):
+    """Vecteur c des conditions aux limites pour le pas j -> j+1 de l'équation de la chaleur."""
+    n = ke_list.shape[0] - 1
+    c[:] = 0.0
+    c[0] = (
+        8 * ke_list[0] * alpha / (3 * dz**2)
+        - 2 * alpha * ae_list[0] * nablaH_j[0] / (3 * dz)
+    ) * T_riv[j + 1] + (
+        8 * ke_list[0] * (1 - alpha) / (3 * dz**2)
+        - 2 * (1 - alpha) * ae_list[0] * nablaH_j[0] / (3 * dz)
+    ) * T_riv[j]
+    c[n] = (
+        8 * ke_list[n] * alpha / (3 * dz**2)
+        + 2 * alpha * ae_list[n] * nablaH_j[n] / (3 * dz)
+    ) * T_aq[j + 1] + (
+        8 * ke_list[n] * (1 - alpha) / (3 * dz**2)
+        + 2 * (1 - alpha) * ae_list[n] * nablaH_j[n] / (3 * dz)
+    ) * T_aq[j]
+
+
+@njit
+def same_values(a, b):
+    """True si les vecteurs a et b sont identiques (par exemple nablaH en écoulement permanent entre deux pas)."""
+    for i in range(a.shape[0]):
+        if a[i] != b[i]:
+            return False
+    return True
+
+
+@njit
+def compute_source_heat_flux(q_s_list, T_prev, T_next, alpha, out):
+    """Flux de chaleur associé à la source d'eau q_s, calculé de manière semi-implicite."""
+    for i in range(out.shape[0]):
+        T_semi_implicite = (1 - alpha) * T_prev[i] + alpha * T_next[i]
+        out[i] = q_s_list[i] * RHO_W * C_W * (T_semi_implicite - ZERO_CELSIUS)
+
+
+@njit
+def sensor_misfit(T, ind_ref, temp_ref, j):
+    """Somme des carrés des écarts aux mesures des températures T au pas de temps j, en float64."""
+    misfit = 0.0
+    for s in range(ind_ref.shape[0]):
+        misfit += (temp_ref[s, j] - np.float64(T[ind_ref[s]])) ** 2
+    return misfit
+
+
+def sensor_args(ind_ref=None, temp_ref=None):
+    """
+    Arguments ind_ref, temp_ref de march_T : indices des cellules des capteurs et mesures (n_sensors, n_times),
+    ou tableaux vides si ind_ref est None (aucun écart aux mesures n'est calculé).
+    """
+    if ind_ref is None:
+        return np.zeros(0, np.int64), np.zeros((0, 0), np.float64)
+    return np.asarray(ind_ref, np.int64), np.ascontiguousarray(temp_ref, np.float64)
+
+
+@njit
+def allocate_T_work(n_cell):
+    """
+    Tableaux de travail de advance_T : diagonales de B et de A (float64, lignes lower_B, diag_B, upper_B,
+    lower_A, diag_A, upper_A) et factorisation de A, c et second membre (float32, lignes m_A, u_A, c, rhs).
+    Les diagonales inférieures et supérieures n'utilisent que les n_cell - 1 premières colonnes.
+    """
+    return np.zeros((6, n_cell), np.float64), np.zeros((4, n_cell), float32)
+
+
+@njit
+def assemble_T_rhs(
+    j,
+    dt,
+    nablaH_j,
+    new_flow,
+    new_dt,
+    operator,
+    ke_list,
+    ae_list,
+    dz,
+    alpha,
+    T_riv,
+    T_aq,
+    diagonals,
+    work,
+    T_prev,
+):
+    """
+    Prépare le pas j -> j+1 de l'équation de la chaleur : factorisation de A dans work[0] et work[1],
+    second membre B * T_prev + c dans work[3].
+    diagonals et work (allocate_T_work) sont conservés d'un pas à l'autre : la correction advective n'est
+    réassemblée que si new_flow, les diagonales en 1/dt que si new_dt, et A n'est refactorisée que dans ces cas.
+    """
+    n = T_prev.shape[0] - 1
+    lower_B, diag_B, upper_B = diagonals[0, :n], diagonals[1], diagonals[2, :n]
+    lower_A, diag_A, upper_A = diagonals[3, :n], diagonals[4], diagonals[5, :n]
+    m_A, u_A, c, B_fois_T_plus_c = work[0, :n], work[1], work[2], work[3]
+    if new_flow:
+        assemble_T_advection(nablaH_j, operator, lower_B, upper_B, lower_A, upper_A)
+    if new_dt:
+        assemble_T_dt(dt, operator, diag_B, diag_A)
+    if new_flow or new_dt:
+        tri_factorize(lower_A, diag_A, upper_A, m_A, u_A)
+    assemble_T_c(j, nablaH_j, ke_list, ae_list, dz, alpha, T_riv, T_aq, c)
+
+    tri_product_into(lower_B, diag_B, upper_B, T_prev, B_fois_T_plus_c)
+    for i in range(n + 1):
+        B_fois_T_plus_c[i] += c[i]
+
+
+@njit
+def advance_T(
+    j,
+    dt,
+    nablaH_j,
+    new_flow,
+    new_dt,
+    operator,
+    ke_list,
+    ae_list,
+    dz,
+    alpha,
+    T_riv,
+    T_aq,
+    diagonals,
+    work,
+    T_prev,
+    T_next,
+):
+    """
+    Pas j -> j+1 de l'équation de la chaleur : T_next est calculée à partir de T_prev
+    (voir assemble_T_rhs pour diagonals et work).
+    """
+    assemble_T_rhs(
+        j, dt, nablaH_j, new_flow, new_dt, operator, ke_list, ae_list, dz, alpha, T_riv, T_aq,
+        diagonals, work, T_prev,
+    )
+    n = T_prev.shape[0] - 1
+    tri_solve_factorized(work[0, :n], work[1], diagonals[5, :n], work[3], T_next)
+
+
+@njit
+def march_T(
+    nablaH,
+    ke_list,
+    ae_list,
+    heat_source,
+    q_s_list,
+    all_dt,
+    dz,
+    alpha,
+    T_riv,
+    T_aq,
+    T_res,
+    source_heat_flux,
+    ind_ref,
+    temp_ref,
+    misfit_budget,
+):
+    """
+    Marche en temps de l'équation de la chaleur (schéma de T_stratified).
+    heat_source est le terme q_s * RHO_W * C_W / rho_mc_m de chaque cellule.
+    T_res[:, 0] doit contenir T_init, T_res et source_heat_flux sont remplis en place.
+
+    La somme des carrés des écarts entre T_res[ind_ref] et les mesures temp_ref (n_sensors, n_times)
+    est accumulée au fil des pas et renvoyée. Dès qu'elle dépasse misfit_budget, la marche s'arrête
+    et renvoie inf : les colonnes suivantes de T_res et source_heat_flux ne sont pas calculées.
+    Avec ind_ref vide (voir sensor_args) et misfit_budget = inf, la marche est complète.
+
+    Les parties constantes des coefficients sont calculées une fois (compute_T_operator). À chaque pas,
+    seules la correction advective (si nablaH a changé) et les diagonales en 1/dt (si dt a changé) sont
+    mises à jour, et A n'est refactorisée que dans ces cas : en écoulement permanent à dt constant,
+    la factorisation LU de A est réutilisée pour toute la marche.
+    """
+    operator = compute_T_operator(ke_list, ae_list, heat_source, dz, alpha)
+    diagonals, work = allocate_T_work(T_res.shape[0])
+
+    # flux au temps initial : T_semi_implicite = T_init
+    compute_source_heat_flux(q_s_list, T_res[:, 0], T_res[:, 0], alpha, source_heat_flux[:, 0])
+    misfit = sensor_misfit(T_res[:, 0], ind_ref, temp_ref, 0)
+    if misfit > misfit_budget:
+        return np.inf
+
+    # La viscosité est constante (DEFAULT_MU) : la mise à jour de Mu tous les N_update_Mu pas est sans effet.
+    for j in range(all_dt.shape[0]):
+        advance_T(
+            j,
+            all_dt[j],
+            nablaH[:, j],
+            j == 0 or not same_values(nablaH[:, j], nablaH[:, j - 1]),
+            j == 0 or all_dt[j] != all_dt[j - 1],
+            operator,
+            ke_list,
+            ae_list,
+            dz,
+            alpha,
+            T_riv,
+            T_aq,
+            diagonals,
+            work,
+            T_res[:, j],
+            T_res[:, j + 1],
+        )
+        compute_source_heat_flux(
+            q_s_list, T_res[:, j], T_res[:, j + 1], alpha, source_heat_flux[:, j + 1]
+        )
+        misfit += sensor_misfit(T_res[:, j + 1], ind_ref, temp_ref, j + 1)
+        if misfit > misfit_budget:
+            return np.inf
+    return misfit
+
+
+@njit
+def march_HT_constant_dt(
+    lower_diagonal_A,
+    diagonal_A,
+    upper_diagonal_A,
+    lower_diagonal_B,
+    diagonal_B,
+    upper_diagonal_B,
+    coef_riv,
+    coef_aq,
+    q_s_list,
+    H_riv,
+    H_aq,
+    K_list,
+    inter_cara,
+    correct_interfaces,
+    ke_list,
+    ae_list,
+    heat_source,
+    all_dt,
+    dz,
+    alpha,
+    T_riv,
+    T_aq,
+    H_res,
+    nablaH,
+    T_res,
+    source_heat_flux,
+    ind_ref,
+    temp_ref,
+    misfit_budget,
+):
+    """
+    Trajectoire complète du modèle direct (H puis nablaH puis T) en un seul appel compilé.
+    H_res[:, 0] et T_res[:, 0] doivent contenir les conditions initiales.
+    Renvoie l'écart aux mesures de march_T (inf si la marche a été interrompue).
+    """
+    march_H_constant_dt(
+        lower_diagonal_A,
+        diagonal_A,
+        upper_diagonal_A,
+        lower_diagonal_B,
+        diagonal_B,
+        upper_diagonal_B,
+        coef_riv,
+        coef_aq,
+        q_s_list,
+        H_riv,
+        H_aq,
+        alpha,
+        H_res,
+    )
+    compute_nablaH(H_res, H_riv, H_aq, dz, nablaH)
+    if correct_interfaces:
+        correct_nablaH_interfaces(H_res, nablaH, K_list, inter_cara, dz)
+    return march_T(
+        nablaH,
+        ke_list,
+        ae_list,
+        heat_source,
+        q_s_list,
+        all_dt,
+        dz,
+        alpha,
+        T_riv,
+        T_aq,
+        T_res,
+        source_heat_flux,
+        ind_ref,
+        temp_ref,
+        misfit_budget,
+    )
+
+
+@njit
+def march_HT_batch(
+    lower_diagonal_A,
+    diagonal_A,
+    upper_diagonal_A,
+    lower_diagonal_B,
+    diagonal_B,
+    upper_diagonal_B,
+    coef_riv,
+    coef_aq,
+    q_s_list,
+    H_riv,
+    H_aq,
+    K_list,
+    inter_cara,
+    correct_interfaces,
+    ke_list,
+    ae_list,
+    heat_source,
+    all_dt,
+    dz,
+    alpha,
+    T_riv,
+    T_aq,
+    H_res,
+    nablaH,
+    T_res,
+    source_heat_flux,
+    ind_ref,
+    temp_ref,
+    misfit_budget,
+    misfit,
+):
+    """
+    Version de march_HT_constant_dt pour n_batch jeux de paramètres sur la même colonne.
+    Tous les tableaux par cellule ont une première dimension n_batch (ex. K_list : (n_batch, n_cell),
+    H_res : (n_batch, n_cell, n_times)), les forçages (H_riv, T_riv, all_dt...), inter_cara et les
+    mesures sont communs. misfit_budget et misfit (rempli en place) ont la forme (n_batch,).
+
+    Les trajectoires avancent ensemble : à chaque pas de temps, le second membre de chaque jeu est
+    assemblé (et A refactorisée si besoin, comme dans march_T), puis tous les systèmes sont résolus
+    par une seule descente-remontée (tri_solve_factorized_batch). Un jeu dont l'écart aux mesures
+    dépasse son budget est retiré du lot (misfit = inf) et n'est plus calculé. Les calculs de chaque
+    jeu sont ceux de march_HT_constant_dt, dans le même ordre : les résultats sont identiques.
+    """
+    n_batch, n_cell, n_times = H_res.shape
+    n = n_cell - 1
+
+    # charge : A factorisée une fois par jeu, tous les jeux avancent à chaque pas
+    all_batch = np.ones(n_batch, np.bool_)
+    m_H = np.zeros((n_batch, n), float32)
+    u_H = np.zeros((n_batch, n_cell), float32)
+    for k in range(n_batch):
+        tri_factorize(lower_diagonal_A[k], diagonal_A[k], upper_diagonal_A[k], m_H[k], u_H[k])
+    upper_A_H = upper_diagonal_A.astype(float32)
+    lower_B_H = lower_diagonal_B.astype(float32)
+    diag_B_H = diagonal_B.astype(float32)
+    upper_B_H = upper_diagonal_B.astype(float32)
+    c = np.zeros((n_batch, n_cell), float32)
+    rhs = np.zeros((n_batch, n_cell), float32)
+    for j in range(n_times - 1):
+        for k in range(n_batch):
+            assemble_H_rhs(
+                j, lower_B_H[k], diag_B_H[k], upper_B_H[k], coef_riv[k], coef_aq[k], q_s_list[k],
+                H_riv, H_aq, alpha, c[k], H_res[k, :, j], rhs[k],
+            )
+        tri_solve_factorized_batch(m_H, u_H, upper_A_H, rhs, H_res[:, :, j + 1], all_batch)
+
+    for k in range(n_batch):
+        compute_nablaH(H_res[k], H_riv, H_aq, dz, nablaH[k])
+        if correct_interfaces:
+            correct_nablaH_interfaces(H_res[k], nablaH[k], K_list[k], inter_cara, dz)
+
+    # température : seuls les jeux encore actifs (budget non dépassé) avancent
+    operators = np.zeros((n_batch, N_T_OPERATOR, n_cell), np.float64)
+    diagonals = np.zeros((n_batch, 6, n_cell), np.float64)  # comme allocate_T_work, pour chaque jeu
+    work = np.zeros((n_batch, 4, n_cell), float32)
+    active = np.ones(n_batch, np.bool_)
+    for k in range(n_batch):
+        operators[k] = compute_T_operator(ke_list[k], ae_list[k], heat_source[k], dz, alpha)
+        compute_source_heat_flux(
+            q_s_list[k], T_res[k, :, 0], T_res[k, :, 0], alpha, source_heat_flux[k, :, 0]
+        )
+        misfit[k] = sensor_misfit(T_res[k, :, 0], ind_ref, temp_ref, 0)
+        if misfit[k] > misfit_budget[k]:
+            misfit[k] = np.inf
+            active[k] = False
+
+    for j in range(all_dt.shape[0]):
+        if not active.any():
+            break
+        for k in range(n_batch):
+            if active[k]:
+                assemble_T_rhs(
+                    j,
+                    all_dt[j],
+                    nablaH[k, :, j],
+                    j == 0 or not same_values(nablaH[k, :, j], nablaH[k, :, j - 1]),
+                    j == 0 or all_dt[j] != all_dt[j - 1],
+                    operators[k],
+                    ke_list[k],
+                    ae_list[k],
+                    dz,
+                    alpha,
+                    T_riv,
+                    T_aq,
+                    diagonals[k],
+                    work[k],
+                    T_res[k, :, j],
+                )
+        tri_solve_factorized_batch(
+            work[:, 0, :n], work[:, 1], diagonals[:, 5, :n], work[:, 3], T_res[:, :, j + 1], active
+        )
+        for k in range(n_batch):
+            if active[k]:
+                compute_source_heat_flux(
+                    q_s_list[k], T_res[k, :, j], T_res[k, :, j + 1], alpha, source_heat_flux[k, :, j + 1]
+                )
+                misfit[k] += sensor_misfit(T_res[k, :, j + 1], ind_ref, temp_ref, j + 1)
+                if misfit[k] > misfit_budget[k]:
+                    misfit[k] = np.inf
+                    active[k] = False
+
+
+@njit
+def record_sous_ech(j, T, nablaH_j, K_flows, n_sous_ech_space, n_sous_ech_time, T_sous_ech, flows_sous_ech):
+    """Températures et débits spécifiques (-K * nablaH) du temps j, sous-échantillonnés, s'il fait partie des temps stockés."""
+    if j % n_sous_ech_time != 0:
+        return
+    jj = j // n_sous_ech_time
+    for ii in range(T_sous_ech.shape[0]):
+        i = ii * n_sous_ech_space
+        T_sous_ech[ii, jj] = T[i]
+        flows_sous_ech[ii, jj] = -K_flows[i] * nablaH_j[i]
+
+
+@njit
+def march_HT_sensors(
+    lower_diagonal_A,
+    diagonal_A,
+    upper_diagonal_A,
+    lower_diagonal_B,
+    diagonal_B,
+    upper_diagonal_B,
+    coef_riv,
+    coef_aq,
+    q_s_list,
+    H_riv,
+    H_aq,
+    K_list,
+    inter_cara,
+    correct_interfaces,
+    ke_list,
+    ae_list,
+    heat_source,
+    all_dt,
+    dz,
+    alpha,
+    T_riv,
+    T_aq,
+    H_init,
+    T_init,
+    ind_ref,
+    temp_ref,
+    misfit_budget,
+    T_sensors,
+    K_flows,
+    n_sous_ech_space,
+    n_sous_ech_time,
+    T_sous_ech,
+    flows_sous_ech,
+):
+    """
+    Mode vraisemblance de march_HT_constant_dt : charge, gradient de charge et température avancent ensemble
+    pas de temps par pas de temps, et seul l'état courant de chacun est conservé (vecteurs de n_cell valeurs).
+    Les calculs sont ceux de march_HT_constant_dt, dans le même ordre : les résultats sont identiques.
+
+    T_sensors (n_sensors, n_times) reçoit les températures des cellules ind_ref ; l'écart aux mesures temp_ref
+    est accumulé et renvoyé comme par march_T (inf si misfit_budget est dépassé, la marche s'arrête alors).
+    Si T_sous_ech n'est pas vide, il reçoit avec flows_sous_ech les températures et les débits spécifiques
+    -K_flows * nablaH d'une cellule sur n_sous_ech_space et d'un temps sur n_sous_ech_time.
+    Le flux de chaleur de la source q_s n'est pas calculé.
+    """
+    n_cell = H_init.shape[0]
+    store_fields = T_sous_ech.shape[0] > 0
+
+    operators_H = factorize_H(
+        lower_diagonal_A, diagonal_A, upper_diagonal_A, lower_diagonal_B, diagonal_B, upper_diagonal_B
+    )
+    c = np.zeros(n_cell, float32)
+    B_fois_H_plus_c = np.zeros(n_cell, float32)
+    operator = compute_T_operator(ke_list, ae_list, heat_source, dz, alpha)
+    diagonals, work = allocate_T_work(n_cell)
+
+    H = H_init.astype(float32)
+    H_next = np.zeros(n_cell, float32)
+    T = T_init.astype(float32)
+    T_next = np.zeros(n_cell, float32)
+    nablaH_j = np.zeros(n_cell, float32)
+    nablaH_prev = np.zeros(n_cell, float32)
+
+    nablaH_column(H, H_riv[0], H_aq[0], dz, nablaH_j)
+    if correct_interfaces:
+        correct_interfaces_column(H, nablaH_j, K_list, inter_cara, dz)
+    for s in range(ind_ref.shape[0]):
+        T_sensors[s, 0] = T[ind_ref[s]]
+    misfit = sensor_misfit(T, ind_ref, temp_ref, 0)
+    if misfit > misfit_budget:
+        return np.inf
+    if store_fields:
+        record_sous_ech(
+            0, T, nablaH_j, K_flows, n_sous_ech_space, n_sous_ech_time, T_sous_ech,
+            flows_sous_ech,
+        )
+
+    for j in range(all_dt.shape[0]):
+        # la température au pas j -> j+1 utilise le gradient de charge du temps j
+        advance_T(
+            j,
+            all_dt[j],
+            nablaH_j,
+            j == 0 or not same_values(nablaH_j, nablaH_prev),
+            j == 0 or all_dt[j] != all_dt[j - 1],
+            operator,
+            ke_list,
+            ae_list,
+            dz,
+            alpha,
+            T_riv,
+            T_aq,
+            diagonals,
+            work,
+            T,
+            T_next,
+        )
+        advance_H(
+            j, operators_H, coef_riv, coef_aq, q_s_list, H_riv, H_aq, alpha, c,
+            B_fois_H_plus_c, H, H_next,
+        )
+        T, T_next = T_next, T
+        H, H_next = H_next, H
+        nablaH_j, nablaH_prev = nablaH_prev, nablaH_j
+        nablaH_column(H, H_riv[j + 1], H_aq[j + 1], dz, nablaH_j)
+        if correct_interfaces:
+            correct_interfaces_column(H, nablaH_j, K_list, inter_cara, dz)
+
+        for s in range(ind_ref.shape[0]):
+            T_sensors[s, j + 1] = T[ind_ref[s]]
+        misfit += sensor_misfit(T, ind_ref, temp_ref, j + 1)
+        if misfit > misfit_budget:
+            return np.inf
+        if store_fields:
+            record_sous_ech(
+                j + 1, T, nablaH_j, K_flows, n_sous_ech_space, n_sous_ech_time,
+                T_sous_ech, flows_sous_ech,
+            )
+    return misfit
+
+
+def allocate_HT_buffers(n_cell, n_times, n_batch=None):
+    """
+    Tableaux de sortie (H_res, nablaH, T_res, source_heat_flux) à passer en paramètre out de
+    solve_HT_stratified (n_batch = None) ou de solve_HT_stratified_batch, réutilisables d'un appel
+    à l'autre : chaque résolution les écrase entièrement.
+    """
+    shape = (n_cell, n_times) if n_batch is None else (n_batch, n_cell, n_times)
+    return tuple(np.empty(shape, float32) for _ in range(4))
+
+
+def solve_HT_stratified(
+    H_strat,
+    T_riv,
+    T_aq,
+    correct_interfaces=False,
+    out=None,
+    ind_ref=None,
+    temp_ref=None,
+    misfit_budget=None,
+):
+    """
+    Résout le modèle direct complet à partir d'une instance de H_stratified.
+
+    Quand dt est constant, toute la trajectoire est calculée par march_HT_constant_dt
+    en un seul appel compilé. Sinon la charge est calculée par H_stratified (pas variable)
+    puis la température par le noyau march_T.
+
+    out : tuple de tableaux float32 (n_cell, n_times) (voir allocate_HT_buffers), optionnel.
+    Les résultats y sont écrits en place au lieu d'être alloués à chaque appel. Pour ne pas allouer
+    non plus les charges, H_strat peut être construit avec H_res=out[0].
+
+    ind_ref, temp_ref, misfit_budget : indices des cellules des capteurs, mesures (n_sensors, n_times)
+    et budget, optionnels. Si misfit_budget est donné, la somme des carrés des écarts aux mesures est
+    aussi renvoyée, et la marche en température s'arrête dès qu'elle dépasse le budget (misfit = inf,
+    T_res et source_heat_flux ne sont alors remplis que jusqu'au pas de l'arrêt).
+
+    Returns
+    -------
+    H_res, nablaH, T_res, source_heat_flux : float32 arrays (n_cell, n_times)
+    misfit : float, seulement si misfit_budget est donné
+    """
+    n_cell, n_times = H_strat.n_cell, H_strat.n_times
+    alpha = H_strat.alpha
+    dz = float(H_strat.dz)
+    H_riv = np.asarray(H_strat.H_riv, np.float64)
+    H_aq = np.asarray(H_strat.H_aq, np.float64)
+    T_riv = np.asarray(T_riv, np.float64)
+    T_aq = np.asarray(T_aq, np.float64)
+    all_dt = np.asarray(H_strat.all_dt, np.float64)
+    q_s_list = np.asarray(H_strat.q_s_list, np.float64)
+    K_list = np.asarray(H_strat.K_list, np.float64)
+    inter_cara = np.asarray(H_strat.inter_cara, np.float64).reshape(-1, 2)
+    ke_list = np.asarray(H_strat.ke_list, np.float64)
+    ae_list = np.asarray(H_strat.ae_list, np.float64)
+    heat_source = q_s_list * RHO_W * C_W / H_strat.rho_mc_m_list
+
+    if out is None:
+        H_res = H_strat.H_res
+        nablaH = np.zeros((n_cell, n_times), np.float32)
+        T_res = np.zeros((n_cell, n_times), np.float32)
+        source_heat_flux = np.zeros((n_cell, n_times), np.float32)
+    else:
+        H_res, nablaH, T_res, source_heat_flux = out
+        if H_res is not H_strat.H_res:
+            H_res[:, 0] = H_strat.H_res[:, 0]
+            H_strat.H_res = H_res
+    T_res[:, 0] = H_strat.T_init
+    misfit_arguments = (
+        *sensor_args(ind_ref, temp_ref),
+        np.inf if misfit_budget is None else float(misfit_budget),
+    )
+
+    if np.all(H_strat.isdtconstant):
+        misfit = march_HT_constant_dt(
+            *H_strat.compute_constant_dt_diagonals(),
+            *H_strat.compute_boundary_coefs(),
+            q_s_list,
+            H_riv,
+            H_aq,
+            K_list,
+            inter_cara,
+            correct_interfaces,
+            ke_list,
+            ae_list,
+            heat_source,
+            all_dt,
+            dz,
+            alpha,
+            T_riv,
+            T_aq,
+            H_res,
+            nablaH,
+            T_res,
+            source_heat_flux,
+            *misfit_arguments,
+        )
+    else:
+        H_strat.compute_H_variable_dt()
+        compute_nablaH(H_res, H_riv, H_aq, dz, nablaH)
+        if correct_interfaces:
+            correct_nablaH_interfaces(H_res, nablaH, K_list, inter_cara, dz)
+        misfit = march_T(
+            nablaH,
+            ke_list,
+            ae_list,
+            heat_source,
+            q_s_list,
+            all_dt,
+            dz,
+            alpha,
+            T_riv,
+            T_aq,
+            T_res,
+            source_heat_flux,
+            *misfit_arguments,
+        )
+    if misfit_budget is not None:
+        return H_res, nablaH, T_res, source_heat_flux, misfit
+    return H_res, nablaH, T_res, source_heat_flux
+
+
+def solve_HT_stratified_batch(
+    H_strats,
+    T_riv,
+    T_aq,
+    correct_interfaces=False,
+    out=None,
+    ind_ref=None,
+    temp_ref=None,
+    misfit_budget=None,
+):
+    """
+    Résout le modèle direct pour plusieurs instances de H_stratified partageant la même
+    colonne (maillage, pas de temps et conditions aux limites) mais pas les mêmes paramètres,
+    typiquement une proposition par chaîne DREAM.
+
+    Quand dt est constant, toutes les trajectoires sont calculées par un seul appel à march_HT_batch.
+    Sinon chaque instance est résolue séparément par solve_HT_stratified.
+
+    out : tuple de tableaux float32 (n_batch, n_cell, n_times) (voir allocate_HT_buffers), optionnel,
+    écrits en place. Les instances peuvent être construites avec H_res=out[0][k].
+
+    ind_ref, temp_ref, misfit_budget : comme pour solve_HT_stratified, avec un budget par instance
+    (tableau (n_batch,)). Chaque trajectoire s'arrête dès que son écart aux mesures dépasse son budget.
+
+    Returns
+    -------
+    H_res, nablaH, T_res, source_heat_flux : float32 arrays (n_batch, n_cell, n_times)
+    misfit : float64 array (n_batch,), seulement si misfit_budget est donné
+    """
+    n_batch = len(H_strats)
+    with_misfit = misfit_budget is not None
+    ind_ref, temp_ref = sensor_args(ind_ref, temp_ref)
+    misfit_budget = np.broadcast_to(
+        np.inf if misfit_budget is None else misfit_budget, n_batch
+    ).astype(np.float64)
+    misfit = np.zeros(n_batch, np.float64)
+
+    if not np.all(H_strats[0].isdtconstant):
+        results = []
+        for k, H_strat in enumerate(H_strats):
+            *res, misfit[k] = solve_HT_stratified(
+                H_strat,
+                T_riv,
+                T_aq,
+                correct_interfaces,
+                out=None if out is None else [o[k] for o in out],
+                ind_ref=ind_ref,
+                temp_ref=temp_ref,
+                misfit_budget=misfit_budget[k],
+            )
+            results.append(res)
+        res = out if out is not None else tuple(np.stack(r) for r in zip(*results))
+        return (*res, misfit) if with_misfit else tuple(res)
+
+    ref = H_strats[0]
+    n_cell, n_times = ref.n_cell, ref.n_times
+
+    def stack(attr):
+        return np.stack([np.asarray(getattr(H, attr), np.float64) for H in H_strats])
+
+    diagonals = [
+        np.stack(diag)
+        for diag in zip(*(H.compute_constant_dt_diagonals() for H in H_strats))
+    ]
+    coef_riv, coef_aq = np.array(
+        [H.compute_boundary_coefs() for H in H_strats], np.float64
+    ).T
+    q_s_list = stack("q_s_list")
+    heat_source = q_s_list * RHO_W * C_W / stack("rho_mc_m_list")
+
+    if out is None:
+        H_res = np.stack([H.H_res for H in H_strats])
+        nablaH = np.zeros((n_batch, n_cell, n_times), np.float32)
+        T_res = np.zeros((n_batch, n_cell, n_times), np.float32)
+        source_heat_flux = np.zeros((n_batch, n_cell, n_times), np.float32)
+    else:
+        H_res, nablaH, T_res, source_heat_flux = out
+        for k, H in enumerate(H_strats):
+            H_res[k, :, 0] = H.H_res[:, 0]
+    T_res[:, :, 0] = stack("T_init")
+
+    march_HT_batch(
+        *diagonals,
+        np.ascontiguousarray(coef_riv),
+        np.ascontiguousarray(coef_aq),
+        q_s_list,
+        np.asarray(ref.H_riv, np.float64),
+        np.asarray(ref.H_aq, np.float64),
+        stack("K_list"),
+        np.asarray(ref.inter_cara, np.float64).reshape(-1, 2),
+        correct_interfaces,
+        stack("ke_list"),
+        stack("ae_list"),
+        heat_source,
+        np.asarray(ref.all_dt, np.float64),
+        float(ref.dz),
+        ref.alpha,
+        np.asarray(T_riv, np.float64),
+        np.asarray(T_aq, np.float64),
+        H_res,
+        nablaH,
+        T_res,
+        source_heat_flux,
+        ind_ref,
+        temp_ref,
+        misfit_budget,
+        misfit,
+    )
+    if with_misfit:
+        return H_res, nablaH, T_res, source_heat_flux, misfit
+    return H_res, nablaH, T_res, source_heat_flux
+
+
+def allocate_sensor_buffers(n_sensors, n_cell, n_times, n_batch, sous_ech=None):
+    """
+    Tableaux de sortie (T_sensors, T_sous_ech, flows_sous_ech) à passer en paramètre out de solve_HT_sensors_batch,
+    réutilisables d'un appel à l'autre. Sans sous_ech = (n_sous_ech_space, n_sous_ech_time), les champs
+    sous-échantillonnés sont vides.
+    """
+    if sous_ech is None:
+        shape_sous_ech = (n_batch, 0, 0)
+    else:
+        n_sous_ech_space, n_sous_ech_time = sous_ech
+        shape_sous_ech = (
+            n_batch,
+            -(-n_cell // n_sous_ech_space),
+            -(-n_times // n_sous_ech_time),
+        )
+    return (
+        np.empty((n_batch, n_sensors, n_times), float32),
+        np.empty(shape_sous_ech, float32),
+        np.empty(shape_sous_ech, float32),
+    )
+
+
+def solve_HT_sensors_batch(
+    H_strats,
+    T_riv,
+    T_aq,
+    ind_ref,
+    temp_ref,
+    correct_interfaces=False,
+    misfit_budget=None,
+    K_flows=None,
+    sous_ech=None,
+    out=None,
+):
+    """
+    Mode vraisemblance de solve_HT_stratified_batch : seules les températures aux cellules des capteurs ind_ref,
+    l'écart aux mesures temp_ref (n_sensors, n_times) et, si sous_ech = (n_sous_ech_space, n_sous_ech_time)
+    est donné, les champs de température et de débit sous-échantillonnés sont calculés.
+    Quand dt est constant, chaque instance est résolue par march_HT_sensors, qui ne conserve que l'état
+    courant : ni les champs complets ni le flux de chaleur de la source ne sont alloués.
+    Sinon, les instances sont résolues en entier par solve_HT_stratified. Quand dt est constant, H_res n'est
+    pas utilisé : les instances peuvent être construites avec un tableau H_res d'une seule colonne.
+
+    misfit_budget (n_batch,) est optionnel : voir solve_HT_stratified_batch. K_flows (n_batch, n_cell) est la
+    perméabilité de chaque cellule pour le débit -K_flows * nablaH, nécessaire seulement avec sous_ech.
+    out : tableaux de allocate_sensor_buffers, optionnel, écrits en place.
+
+    Returns
+    -------
+    T_sensors : float32 array (n_batch, n_sensors, n_times)
+    misfit : float64 array (n_batch,), inf pour les marches interrompues
+    temperatures, flows : float32 arrays (n_batch, ceil(n_cell / n_sous_ech_space), ceil(n_times / n_sous_ech_time)),
+        None sans sous_ech
+    """
+    ref = H_strats[0]
+    n_batch, n_cell, n_times = len(H_strats), ref.n_cell, ref.n_times
+    ind_ref, temp_ref = sensor_args(ind_ref, temp_ref)
+    misfit_budget = np.broadcast_to(
+        np.inf if misfit_budget is None else misfit_budget, n_batch
+    ).astype(np.float64)
+    misfit = np.zeros(n_batch, np.float64)
+    if out is None:
+        out = allocate_sensor_buffers(len(ind_ref), n_cell, n_times, n_batch, sous_ech)
+    T_sensors, T_sous_ech, flows_sous_ech = out
+    n_sous_ech_space, n_sous_ech_time = (1, 1) if sous_ech is None else sous_ech
+    if K_flows is None:
+        K_flows = np.zeros((n_batch, 0))
+
+    for k, H_strat in enumerate(H_strats):
+        if not np.all(H_strat.isdtconstant):
+            _, nablaH, T_res, _, misfit[k] = solve_HT_stratified(
+                H_strat,
+                T_riv,
+                T_aq,
+                correct_interfaces,
+                ind_ref=ind_ref,
+                temp_ref=temp_ref,
+                misfit_budget=misfit_budget[k],
+            )
+            T_sensors[k] = T_res[ind_ref]
+            if sous_ech is not None:
+                T_sous_ech[k] = T_res[::n_sous_ech_space, ::n_sous_ech_time]
+                np.multiply(
+                    -np.asarray(K_flows[k], np.float64)[:, np.newaxis],
+                    nablaH[::n_sous_ech_space, ::n_sous_ech_time],
+                    out=flows_sous_ech[k],
+                    casting="unsafe",
+                )
+            continue
+        q_s_list = np.asarray(H_strat.q_s_list, np.float64)
+        misfit[k] = march_HT_sensors(
+            *H_strat.compute_constant_dt_diagonals(),
+            *H_strat.compute_boundary_coefs(),
+            q_s_list,
+            np.asarray(H_strat.H_riv, np.float64),
+            np.asarray(H_strat.H_aq, np.float64),
+            np.asarray(H_strat.K_list, np.float64),
+            np.asarray(H_strat.inter_cara, np.float64).reshape(-1, 2),
+            correct_interfaces,
+            np.asarray(H_strat.ke_list, np.float64),
+            np.asarray(H_strat.ae_list, np.float64),
+            q_s_list * RHO_W * C_W / H_strat.rho_mc_m_list,
+            np.asarray(H_strat.all_dt, np.float64),
+            float(H_strat.dz),
+            H_strat.alpha,
+            np.asarray(T_riv, np.float64),
+            np.asarray(T_aq, np.float64),
+            np.asarray(H_strat.H_init, np.float64),
+            np.asarray(H_strat.T_init, np.float64),
+            ind_ref,
+            temp_ref,
+            misfit_budget[k],
+            T_sensors[k],
+            np.asarray(K_flows[k], np.float64),
+            n_sous_ech_space,
+            n_sous_ech_time,
+            T_sous_ech[k],
+            flows_sous_ech[k],
+        )
+    if sous_ech is None:
+        return T_sensors, misfit, None, None
+    return T_sensors, misfit, T_sous_ech, flows_sous_ech
+
+
 # Première classe qui définit et initie les paramètres physiques communs des systèmes linéaires de la classe H_stratified et T_stratified
 class Linear_system:
     def __init__(
@@ -23,8 +1136,10 @@ class Linear_system:
         dz,
         H_init,
         T_init,
+        H_res=None,
     ):
         self.IntrinK_list = IntrinK_list
+        self.H_res = H_res  # tableau (n_cell, n_times) fourni pour les charges, réutilisé au lieu d'être alloué
         self.T_init = T_init
         self.n_list = n_list
         self.rhos_cs_list = rhos_cs_list
@@ -76,7 +1191,9 @@ class Linear_system:
         return list
 
     def compute_H_res(self):
-        H_res = zeros((self.n_cell, self.n_times), float32)
+        H_res = self.H_res
+        if H_res is None:
+            H_res = zeros((self.n_cell, self.n_times), float32)
         H_res[:, 0] = self.H_init[:]
         return H_res
 
@@ -120,6 +1237,7 @@ class H_stratified(Linear_system):
         inter_cara,
         isdtconstant,
         alpha=ALPHA,
+        H_res=None,
     ):
         super().__init__(
             Ss_list,
@@ -131,6 +1249,7 @@ class H_stratified(Linear_system):
             dz,
             H_init,
             T_init,
+            H_res,
         )
         self.array_K = array_K
         self.array_Ss = array_Ss
@@ -156,7 +1275,8 @@ class H_stratified(Linear_system):
             self.compute_H_variable_dt()
         return self.H_res
 
-    def compute_H_constant_dt(self):
+    def compute_constant_dt_diagonals(self):
+        # Diagonales de A puis de B (corrigées aux interfaces), fixes quand dt est constant
         dt = self.all_dt[0]
 
         lower_diagonal_B, diagonal_B, upper_diagonal_B = self.compute_B_diagonals(dt)
@@ -172,29 +1292,40 @@ class H_stratified(Linear_system):
                 diagonal_A,
                 upper_diagonal_A,
             )
+        return (
+            lower_diagonal_A,
+            diagonal_A,
+            upper_diagonal_A,
+            lower_diagonal_B,
+            diagonal_B,
+            upper_diagonal_B,
+        )
 
-        for j in range(self.n_times - 1):
-            c = self.compute_c(j)
-            B_fois_H_plus_c = (
-                tri_product(
-                    lower_diagonal_B, diagonal_B, upper_diagonal_B, self.H_res[:, j]
-                )
-                + c
-            )
-            self.H_res[:, j + 1] = solver(
-                lower_diagonal_A, diagonal_A, upper_diagonal_A, B_fois_H_plus_c
-            )
+    def compute_boundary_coefs(self):
+        # Coefficients des conditions aux limites rivière et aquifère dans le vecteur c
+        coef_riv = 8 * self.K_list[0] / (3 * self.dz**2)
+        coef_aq = 8 * self.K_list[self.n_cell - 1] / (3 * self.dz**2)
+        return float(coef_riv), float(coef_aq)
+
+    def compute_H_constant_dt(self):
+        march_H_constant_dt(
+            *self.compute_constant_dt_diagonals(),
+            *self.compute_boundary_coefs(),
+            np.asarray(self.q_s_list, np.float64),
+            np.asarray(self.H_riv, np.float64),
+            np.asarray(self.H_aq, np.float64),
+            self.alpha,
+            self.H_res,
+        )
 
     def nablaH(self):
         nablaH = np.zeros((self.n_cell, self.n_times), np.float32)
-
-        nablaH[0, :] = 2 * (self.H_res[1, :] - self.H_riv) / (3 * self.dz)
-
-        for i in range(1, self.n_cell - 1):
-            nablaH[i, :] = (self.H_res[i + 1, :] - self.H_res[i - 1, :]) / (2 * self.dz)
-
-        nablaH[self.n_cell - 1, :] = (
-            2 * (self.H_aq - self.H_res[self.n_cell - 2, :]) / (3 * self.dz)
+        compute_nablaH(
+            self.H_res,
+            np.asarray(self.H_riv, np.float64),
+            np.asarray(self.H_aq, np.float64),
+            float(self.dz),
+            nablaH,
         )
         return nablaH
 
@@ -399,47 +1530,25 @@ class T_stratified(Linear_system):
         self.source_heat_flux = np.zeros((self.n_cell, self.n_times), np.float32)
 
         self.T_res[:, 0] = self.T_init
-        #calcul du flux au temps initial
-        self.source_heat_flux[:, 0] = self.q_s_list * RHO_W * C_W * (self.T_res[:, 0] - ZERO_CELSIUS)
-
-        for j, dt in enumerate(self.all_dt):
-            # Update of Mu(T) after N_update_Mu iterations:
-            if j % self.N_update_Mu == 1:
-                self.mu_list = self.compute_Mu(self.T_res[:, j - 1])
-
-            # Compute T at time times[j+1]
 
-            # Defining the 3 diagonals of B
-            lower_diagonal = self._compute_lower_diagonal(j)
-            diagonal = self._compute_diagonal(j, dt)
-            upper_diagonal = self._compute_upper_diagonal(j)
-
-            # Defining c
-            c = self._compute_c(j)
-
-            B_fois_T_plus_c = (
-                tri_product(lower_diagonal, diagonal, upper_diagonal, self.T_res[:, j])
-                + c
-            )
-
-            # Defining the 3 diagonals of A
-            lower_diagonal_A, diagonal_A, upper_diagonal_A = self._compute_A_diagonals(
-                j, dt
-            )
-
-            try:
-                self.T_res[:, j + 1] = solver(
-                    lower_diagonal_A, diagonal_A, upper_diagonal_A, B_fois_T_plus_c
-                )
-            except Exception:
-                A = self._construct_A_matrix(
-                    lower_diagonal_A, diagonal_A, upper_diagonal_A
-                )
-                self.T_res[:, j + 1] = solve(A, B_fois_T_plus_c)
-            
-            #Calcul du flux de chaleur source de manière semi-implicite
-            T_semi_implicite = (1 - self.alpha) * self.T_res[:, j] + self.alpha * self.T_res[:, j + 1]
-            self.source_heat_flux[:, j + 1] = self.q_s_list * RHO_W * C_W * (T_semi_implicite - ZERO_CELSIUS)
+        # toute la boucle temporelle est déléguée au noyau compilé march_T
+        heat_source = (self.q_s_list * RHO_W * C_W) / self.rho_mc_m_list
+        march_T(
+            self.nablaH,
+            np.asarray(self.ke_list, np.float64),
+            np.asarray(self.ae_list, np.float64),
+            np.asarray(heat_source, np.float64),
+            np.asarray(self.q_s_list, np.float64),
+            np.asarray(self.all_dt, np.float64),
+            float(self.dz),
+            self.alpha,
+            np.asarray(self.T_riv, np.float64),
+            np.asarray(self.T_aq, np.float64),
+            self.T_res,
+            self.source_heat_flux,
+            *sensor_args(),
+            np.inf,
+        )
 
         return self.T_res
 
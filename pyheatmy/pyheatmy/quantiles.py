@@ -0,0 +1,108 @@
+"""
+Estimation en ligne des quantiles des champs de température et de débit échantillonnés pendant la MCMC.
+
+L'algorithme P² (Jain & Chlamtac, 1985) suit chaque quantile avec 5 marqueurs par élément du champ
+(cellule x temps) : la mémoire ne dépend pas du nombre d'itérations stockées, contrairement au cube
+d'échantillons sur lequel compute_mcmc appelle np.quantile en mode "exact".
+"""
+
+import numpy as np
+from numba import njit
+
+
+@njit
+def p2_update(heights, positions, desired, x):
+    """
+    Ajoute l'observation x[e] à l'estimateur P² de chaque élément e.
+    heights et positions sont les hauteurs et positions (n_elem, 5) des marqueurs, remplies en place.
+    desired contient les positions désirées des marqueurs, communes à tous les éléments,
+    déjà mises à jour pour cette observation.
+    """
+    for e in range(x.shape[0]):
+        q = heights[e]
+        n = positions[e]
+        xe = x[e]
+
+        # cellule k telle que q[k] <= xe < q[k + 1], en étendant les extrêmes si besoin
+        if xe < q[0]:
+            q[0] = xe
+            k = 0
+        elif xe >= q[4]:
+            q[4] = xe
+            k = 3
+        else:
+            k = 0
+            while xe >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+
+        # ajustement des marqueurs intermédiaires
+        for i in range(1, 4):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                # interpolation parabolique
+                q_new = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not (q[i - 1] < q_new < q[i + 1]):
+                    # interpolation linéaire si la parabole sort de l'intervalle
+                    q_new = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = q_new
+                n[i] += s
+
+
+class P2Quantiles:
+    """
+    Quantiles estimés en ligne, par l'algorithme P², pour chaque élément d'un champ de forme shape.
+
+    Les 5 premières observations sont conservées telles quelles (quantiles exacts), les suivantes
+    ne mettent à jour que les marqueurs.
+    """
+
+    def __init__(self, quantiles, shape):
+        self.quantiles = list(quantiles)
+        self.shape = tuple(shape)
+        self.nb_samples = 0
+        n_elem = int(np.prod(self.shape))
+        self._heights = np.zeros((len(self.quantiles), n_elem, 5), np.float64)
+        self._positions = np.tile(
+            np.arange(1.0, 6.0), (len(self.quantiles), n_elem, 1)
+        )
+        self._desired = np.array(
+            [[1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5] for p in self.quantiles],
+            np.float64,
+        )
+        self._increments = np.array(
+            [[0, p / 2, p, (1 + p) / 2, 1] for p in self.quantiles], np.float64
+        )
+
+    def update(self, sample):
+        """Ajoute un échantillon du champ (tableau de forme shape)."""
+        x = np.asarray(sample, np.float64).reshape(-1)
+        if self.nb_samples < 5:
+            self._heights[:, :, self.nb_samples] = x
+            self.nb_samples += 1
+            if self.nb_samples == 5:
+                self._heights.sort(axis=2)
+            return
+        self.nb_samples += 1
+        for iq in range(len(self.quantiles)):
+            self._desired[iq] += self._increments[iq]
+            p2_update(
+                self._heights[iq], self._positions[iq], self._desired[iq], x
+            )
+
+    def get_quantile(self, quantile):
+        iq = self.quantiles.index(quantile)
+        if self.nb_samples < 5:
+            res = np.quantile(self._heights[iq, :, : self.nb_samples], quantile, axis=1)
+        else:
+            res = self._heights[iq, :, 2]
+        return res.reshape(self.shape)
+
+    def get_quantiles(self):
+        """Dictionnaire {quantile: champ estimé}, au format de Column._quantiles_temperatures."""
+        return {quant: self.get_quantile(quant) for quant in self.quantiles}
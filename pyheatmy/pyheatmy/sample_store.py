@@ -0,0 +1,102 @@
+"""
+Stockage sur disque des échantillons de la MCMC (quantile_mode="disk" de Column.compute_mcmc).
+
+Les températures et débits sous-échantillonnés ainsi que la trace des états des chaînes (McmcTrace) sont écrits
+dans des fichiers .npy projetés en mémoire (np.memmap) du dossier MCMC_SAMPLES_DIR de Column._dir_print.
+Seules les pages utilisées sont chargées en mémoire vive, et les fichiers restent lisibles par
+load_mcmc_samples après la fin, éventuellement brutale, du processus.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from pyheatmy.config import MCMC_SAMPLES_DIR, QUANTILE_CHUNK_BYTES
+
+
+class DiskSampleStore:
+    """
+    Dossier d'échantillons de la MCMC. info est un dictionnaire (sérialisable en JSON) décrivant le run,
+    écrit dans info.json à la création. Avec resume=True (reprise d'un run depuis un point de reprise),
+    les tableaux déjà présents dans le dossier sont rouverts au lieu d'être écrasés.
+    """
+
+    def __init__(self, dir_print, info, resume=False):
+        self.dir = os.path.join(os.path.expanduser(dir_print), MCMC_SAMPLES_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        self.resume = resume
+        self.arrays = {}
+        with open(os.path.join(self.dir, "info.json"), "w") as f:
+            json.dump(info, f, indent=2)
+
+    def create(self, name, shape, dtype=np.float32, fill_value=None):
+        """Crée (ou écrase, ou rouvre en reprise) le tableau name.npy du dossier et le renvoie projeté en mémoire."""
+        path = os.path.join(self.dir, f"{name}.npy")
+        if self.resume:
+            if not os.path.exists(path):
+                raise ValueError(f"Cannot resume : {path} does not exist")
+            array = np.lib.format.open_memmap(path, mode="r+")
+            if array.shape != tuple(shape) or array.dtype != np.dtype(dtype):
+                raise ValueError(
+                    f"Cannot resume : {path} has shape {array.shape} and dtype {array.dtype}, expected {tuple(shape)} and {np.dtype(dtype)}"
+                )
+            self.arrays[name] = array
+            return array
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        if fill_value is not None:
+            array[...] = fill_value
+        self.arrays[name] = array
+        return array
+
+    def flush(self):
+        for array in self.arrays.values():
+            array.flush()
+
+
+def load_mcmc_samples(dir_print):
+    """
+    Relit les échantillons d'un run de compute_mcmc(quantile_mode="disk"), terminé ou non.
+
+    Returns
+    -------
+    info : dict
+        description du run (info.json).
+    arrays : dict
+        tableaux en lecture seule (np.memmap) : "temperatures", "flows" et ceux de la trace
+        ("params", "energy", "sigma2_temp" et "accepted", dont la ligne 0 est l'état initial des chaînes).
+    """
+    dir_samples = os.path.join(os.path.expanduser(dir_print), MCMC_SAMPLES_DIR)
+    with open(os.path.join(dir_samples, "info.json")) as f:
+        info = json.load(f)
+    arrays = {
+        fname[: -len(".npy")]: np.load(os.path.join(dir_samples, fname), mmap_mode="r")
+        for fname in sorted(os.listdir(dir_samples))
+        if fname.endswith(".npy")
+    }
+    return info, arrays
+
+
+def quantiles_by_time_chunks(
+    samples, quantiles, nb_sample_axes, max_chunk_bytes=QUANTILE_CHUNK_BYTES
+):
+    """
+    Quantiles de samples selon ses nb_sample_axes premiers axes (les échantillons), calculés par blocs
+    de pas de temps (dernier axe) pour ne charger en mémoire qu'un bloc d'au plus max_chunk_bytes à la fois.
+    Les valeurs sont celles de np.quantile sur le tableau entier.
+
+    Returns
+    -------
+    dict {quantile: tableau de forme samples.shape[nb_sample_axes:]}
+    """
+    n_times = samples.shape[-1]
+    bytes_per_time = samples.dtype.itemsize * int(np.prod(samples.shape[:-1]))
+    chunk = max(1, max_chunk_bytes // bytes_per_time)
+    sample_axes = tuple(range(nb_sample_axes))
+
+    res = np.empty((len(quantiles), *samples.shape[nb_sample_axes:]))
+    for t0 in range(0, n_times, chunk):
+        res[..., t0 : t0 + chunk] = np.quantile(
+            np.asarray(samples[..., t0 : t0 + chunk]), quantiles, axis=sample_axes
+        )
+    return {quant: res[iq] for iq, quant in enumerate(quantiles)}
@@ -0,0 +1,31 @@
+"""
+Enregistrement des états du modèle direct (Column.get_state) : charge et température de chaque cellule à un
+temps de mesure, pour reprendre plus tard la simulation à ce temps (Column.set_initial_state, Column.time_subrange)
+sans refaire l'historique qui précède.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+
+def save_state(path, state):
+    """Écrit l'état state (dictionnaire de Column.get_state) dans le fichier .npz path."""
+    np.savez(
+        path,
+        time=np.str_(state["time"].isoformat()),
+        z=state["z"],
+        H=state["H"],
+        T=state["T"],
+    )
+
+
+def load_state(path):
+    """Relit un état écrit par save_state, dictionnaire "time", "z", "H" et "T" de Column.get_state."""
+    with np.load(path) as f:
+        return {
+            "time": datetime.fromisoformat(str(f["time"])),
+            "z": f["z"],
+            "H": f["H"],
+            "T": f["T"],
+        }
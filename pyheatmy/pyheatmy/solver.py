@@ -56,6 +56,82 @@ def tri_product(a, b, c, d):
     return res
 
 
+@njit
+def tri_factorize(a, b, c, m, u):
+    """
+    LU factorisation of the tridiagonal matrix A (diagonals a, b and c, from bottom to top),
+    with the same float32 arithmetic as solver. The multipliers are written in m (n - 1)
+    and the pivots in u (n), both float32 : A can then be solved for many right-hand
+    sides with tri_solve_factorized, for the cost of the back-substitution only.
+    """
+    nf = len(b)
+    u[0] = float32(b[0])
+    for it in range(1, nf):
+        m[it - 1] = float32(a[it - 1]) / u[it - 1]
+        u[it] = float32(b[it]) - m[it - 1] * float32(c[it - 1])
+
+
+@njit
+def tri_solve_factorized(m, u, c, d, x):
+    """
+    Solves AX = d with the factorisation (m, u) of A computed by tri_factorize, c being the
+    upper diagonal of A. The solution is written in x (float32, may not share memory with d).
+    Gives the same result as solver(a, b, c, d).
+    """
+    nf = len(d)
+    x[0] = float32(d[0])
+    for it in range(1, nf):
+        x[it] = float32(d[it]) - m[it - 1] * x[it - 1]
+
+    x[nf - 1] = x[nf - 1] / u[nf - 1]
+    for il in range(nf - 2, -1, -1):
+        x[il] = (x[il] - float32(c[il]) * x[il + 1]) / u[il]
+
+
+@njit
+def tri_product_into(a, b, c, d, res):
+    """
+    Same as tri_product, the product being written in res (float32) instead of a new array.
+    """
+    n = len(d)
+    res[0] = float32(d[0]) * float32(b[0]) + float32(d[1]) * float32(c[0])
+    res[n - 1] = float32(d[n - 1]) * float32(b[n - 1]) + float32(d[n - 2]) * float32(
+        a[n - 2]
+    )
+    for ix in range(1, n - 1):
+        res[ix] = (
+            float32(a[ix - 1]) * float32(d[ix - 1])
+            + float32(b[ix]) * float32(d[ix])
+            + float32(c[ix]) * float32(d[ix + 1])
+        )
+
+
+@njit
+def tri_solve_factorized_batch(m, u, c, d, x, active):
+    """
+    Solves n_batch independent systems A_k X_k = d_k in one forward and backward sweep, row k of
+    m, u, c, d and x holding the factorisation of A_k (tri_factorize), its upper diagonal, the
+    right-hand side and the solution of system k. The inner loop runs over the systems, only the
+    rows where active is True are solved. Same arithmetic as tri_solve_factorized.
+    """
+    n_batch, nf = d.shape
+    for k in range(n_batch):
+        if active[k]:
+            x[k, 0] = float32(d[k, 0])
+    for it in range(1, nf):
+        for k in range(n_batch):
+            if active[k]:
+                x[k, it] = float32(d[k, it]) - m[k, it - 1] * x[k, it - 1]
+
+    for k in range(n_batch):
+        if active[k]:
+            x[k, nf - 1] = x[k, nf - 1] / u[k, nf - 1]
+    for il in range(nf - 2, -1, -1):
+        for k in range(n_batch):
+            if active[k]:
+                x[k, il] = (x[k, il] - float32(c[k, il]) * x[k, il + 1]) / u[k, il]
+
+
 # Pour forcer la compilation à l'init
 solver(0.1 * ones(1), ones(2), -ones(1), ones(2))
 tri_product(ones(1), ones(2), ones(1), ones(2))
@@ -0,0 +1,463 @@
+import numpy as np
+
+from pyheatmy.config import *
+from pyheatmy.params import Param, calc_K
+from pyheatmy.linear_system import (
+    H_stratified,
+    allocate_HT_buffers,
+    allocate_sensor_buffers,
+    solve_HT_sensors_batch,
+    solve_HT_stratified_batch,
+)
+
+
+class SolverContext:
+    """
+    Partie du modèle direct d'une colonne qui ne dépend pas des paramètres des couches :
+    maillage, pas de temps, conditions initiales et aux limites, position des interfaces.
+    (En multicouche, la charge initiale dépend des perméabilités et est calculée pour chaque jeu
+    de paramètres, sauf si la colonne a un état initial imposé.)
+
+    Le contexte est construit une fois (par exemple au début de compute_mcmc) et partagé
+    en lecture seule par toutes les chaînes : les tableaux de forçage (dH, T_riv, T_aq)
+    ne sont pas copiés, et une chaîne n'apporte que ses paramètres. Les couches ne servent
+    qu'à leurs priors (traduction MCMC -> physique) et à leur profondeur : leurs mcmc_params
+    ne sont ni lus ni modifiés.
+
+    Le contexte détient aussi les tableaux de résultats de solve_batch et solve_batch_sensors, alloués
+    au premier appel pour chaque taille de lot puis écrasés en place aux appels suivants.
+
+    nb_cells et n_sous_ech_time permettent de construire un modèle grossier de la même colonne
+    (par exemple pour l'acceptation retardée de compute_mcmc) : nb_cells cellules au lieu de
+    column._nb_cells, et un temps sur n_sous_ech_time pour les forçages et les mesures.
+    """
+
+    def __init__(self, column, verbose=False, nb_cells=None, n_sous_ech_time=1):
+        self.layers = column.all_layers
+        self.nb_layers = len(self.layers)
+        if nb_cells is None:
+            nb_cells = column._nb_cells
+        self.nb_cells = nb_cells
+        self.real_z = column._real_z
+        times = column._times[::n_sous_ech_time]
+
+        self.dz = dz = column._real_z[-1] / nb_cells  # profondeur d'une cellule
+        # le tableau contenant la profondeur du milieu des cellules
+        self.z_solve = dz / 2 + np.array([k * dz for k in range(nb_cells)])
+        self.id_sensors = [
+            np.argmin(np.abs(z - self.z_solve)) for z in column._real_z[1:-1]
+        ]
+
+        # le tableau des pas de temps (dépend des données d'entrée)
+        self.all_dt = np.array(
+            [
+                (times[j + 1] - times[j]).total_seconds()
+                for j in range(len(times) - 1)
+            ]
+        )
+        self.isdtconstant = np.all(self.all_dt == self.all_dt[0])
+
+        # fixe toutes les charges de l'aquifère à 0 (à tout temps)
+        self.H_aq = np.zeros(len(times))
+        self.H_riv = column._dH[::n_sous_ech_time]  # contient déjà les charges de la rivière à tout temps
+        self.T_riv = column._T_riv[::n_sous_ech_time]
+        self.T_aq = column._T_aq[::n_sous_ech_time]
+
+        # mesures des capteurs (n_sensors, n_times) aux temps du contexte, comparées aux températures des cellules id_sensors,
+        # et rapport entre le nombre de temps de la colonne et celui du contexte
+        self.temp_ref = column._T_measures[::n_sous_ech_time].T
+        self.time_ratio = len(column._times) / len(times)
+
+        # crée les températures initiales (t=0) sur toutes les profondeurs (milieu des cellules)
+        if column.inter_mode == "lagrange":
+            self.T_init = np.array([column.lagr(z) for z in self.z_solve])
+        elif column.inter_mode == "linear":
+            self.T_init = column.linear(self.z_solve)
+
+        # état initial imposé par Column.set_initial_state, interpolé sur les cellules du contexte : il remplace
+        # les profils de température et de charge déduits des mesures au premier temps
+        self.has_initial_state = column._initial_state is not None
+        if self.has_initial_state:
+            state = column._initial_state
+            self.T_init = np.interp(self.z_solve, state["z"], state["T"])
+
+        self.heigth = abs(column._real_z[-1] - column._real_z[0])
+
+        # indice de la couche de chaque cellule, comme dans getListParameters
+        # (nb_layers pour une cellule hors de toute couche, dont les paramètres sont nuls)
+        dz_layers = self.layers[-1].zLow / nb_cells
+        cell_centers = np.linspace(
+            dz_layers / 2, self.layers[-1].zLow - dz_layers / 2, nb_cells
+        )
+        self.cell_layer = np.full(nb_cells, self.nb_layers)
+        zLow_prev = 0
+        for l, layer in enumerate(self.layers):
+            self.cell_layer[
+                (cell_centers > zLow_prev) & (cell_centers <= layer.zLow)
+            ] = l
+            zLow_prev = layer.zLow
+
+        # tableaux de résultats de solve_batch par taille de lot : (H_res, nablaH, T_res, source_heat_flux, flows),
+        # et de solve_batch_sensors par taille de lot, nombre de capteurs et sous-échantillonnage
+        self._buffers = {}
+
+        if self.nb_layers == 1:
+            ## pour le cas uni-couche, on le simule dans H_stratified avec deux couches de mêmes paramètres
+            self.H_init = column._dH[0] - column._dH[0] * self.z_solve / column._real_z[-1]
+            self.list_zLow = np.array([0.2])
+            self.inter_cara = np.array([[nb_cells // 2, 0]])
+        else:
+            self._init_multilayer_geometry(verbose)
+        if self.has_initial_state:
+            self.H_init = np.interp(self.z_solve, state["z"], state["H"])
+
+    def _init_multilayer_geometry(self, verbose):
+        layersList = self.layers
+        z_solve = self.z_solve
+
+        self.array_eps = np.zeros(len(layersList))  # eps de chaque couche
+        self.array_eps[0] = layersList[0].zLow
+        for idx in range(1, len(layersList)):
+            self.array_eps[idx] = layersList[idx].zLow - layersList[idx - 1].zLow
+
+        # list_array_L: couper le profondeur selon l'épaisseur de chaque couche
+        self.list_array_L = []
+        cnt = 0
+        for idx in range(len(layersList) - 1):
+            cnt_start = cnt
+            while cnt < len(z_solve):
+                if (
+                    z_solve[cnt] <= layersList[idx].zLow
+                    and z_solve[cnt + 1] > layersList[idx].zLow
+                ):
+                    self.list_array_L.append(z_solve[cnt_start : cnt + 1])
+                    cnt += 1
+                    break
+                else:
+                    cnt += 1
+        self.list_array_L.append(z_solve[cnt:])
+
+        list_zLow = [layer.zLow for layer in layersList]
+        list_zLow.pop()
+        self.list_zLow = np.array(list_zLow)
+
+        ## Classification according to Klist on symmetry of interfaces
+        self.inter_cara = np.zeros((len(self.list_zLow), 2))
+        for zlow_idx in range(len(self.list_zLow)):
+            for z_idx in range(len(z_solve) - 1):
+                if (
+                    z_solve[z_idx] <= self.list_zLow[zlow_idx]
+                    and z_solve[z_idx + 1] > self.list_zLow[zlow_idx]
+                ):
+                    if verbose:
+                        print(
+                            "échantillons du profondeur: ... ",
+                            z_solve[z_idx],
+                            z_solve[z_idx + 1],
+                            " ...",
+                        )
+                        print("le profondeur d'interface: ", self.list_zLow[zlow_idx])
+                    if abs(z_solve[z_idx] - self.list_zLow[zlow_idx]) < EPSILON:
+                        self.inter_cara[zlow_idx, 0] = z_idx
+                        if verbose:
+                            print("type cara symetric")
+                    elif abs(z_solve[z_idx + 1] - self.list_zLow[zlow_idx]) < EPSILON:
+                        self.inter_cara[zlow_idx, 0] = z_idx + 1
+                        if verbose:
+                            print("type cara symetric")
+                    else:
+                        self.inter_cara[zlow_idx, 0] = z_idx
+                        self.inter_cara[zlow_idx, 1] = z_idx + 1
+                        if verbose:
+                            print("type cara asymetric")
+
+    def __getstate__(self):
+        # les tableaux de résultats ne sont pas transmis (copie, processus du pool de chaînes de compute_mcmc)
+        state = self.__dict__.copy()
+        state["_buffers"] = {}
+        return state
+
+    def physical_params(self, mcmc_params):
+        """Paramètres physiques de chaque couche pour les paramètres de travail (MCMC) mcmc_params (n_layers, n_params)."""
+        return [
+            layer.get_physical_params(Param(*mcmc_params[l]))
+            for l, layer in enumerate(self.layers)
+        ]
+
+    def build_direct_model(self, layer_params, verbose=False, H_res=None):
+        """
+        Instance de H_stratified pour les paramètres physiques layer_params (un Param par couche).
+        H_res est un tableau (nb_cells, n_times) optionnel où seront écrites les charges.
+
+        Returns
+        -------
+        H_strat : H_stratified
+            système linéaire de la charge, qui porte aussi les paramètres thermiques.
+        K_flows : float array
+            perméabilité de chaque cellule utilisée pour le débit spécifique (-K * nablaH).
+        """
+        # profils des paramètres dans la colonne discrétisée (voir getListParameters)
+        table = np.zeros((self.nb_layers + 1, 5))
+        table[: self.nb_layers] = layer_params
+        IntrinK_list, n_list, lambda_s_list, rhos_cs_list, q_s_list = table[
+            self.cell_layer
+        ].T
+        Ss_list = n_list / self.heigth  # l'emmagasinement spécifique = porosité sur la hauteur
+
+        if self.nb_layers == 1:
+            IntrinK, n, lambda_s, rhos_cs, q_s = layer_params[0]
+            if verbose:
+                print(
+                    "--- Compute Solve Transi ---",
+                    f"One layer : IntrinK = {IntrinK}, n = {n}, lambda_s = {lambda_s}, rhos_cs = {rhos_cs}, q_s = {q_s}",
+                    sep="\n",
+                )
+            Ss = n / self.heigth
+            array_IntrinK = np.array([IntrinK, IntrinK])
+            array_K = (RHO_W * G * 10.0**-array_IntrinK) * 1.0 / MU
+            array_Ss = np.array([Ss, Ss])
+            H_init = self.H_init
+        else:
+            array_IntrinK = np.array([float(params.IntrinK) for params in layer_params])
+            array_k = 10 ** (-array_IntrinK)
+            array_K = calc_K(array_k)
+            array_Ss = (
+                np.array([float(params.n) for params in layer_params]) / self.heigth
+            )
+            if self.has_initial_state:
+                H_init, array_Hinter = self.H_init, None
+            else:
+                H_init, array_Hinter = self._multilayer_H_init(array_K)
+            if verbose:
+                print("--- Compute Solve Transi ---")
+                for params in layer_params:
+                    print(params)
+                print("Hinter", array_Hinter)
+                print("conditions aux limites")
+                print("H_riv", self.H_riv)
+                print("H_aq", self.H_aq)
+
+        H_strat = H_stratified(
+            Ss_list,
+            IntrinK_list,
+            n_list,
+            lambda_s_list,
+            rhos_cs_list,
+            self.all_dt,
+            q_s_list,
+            self.dz,
+            H_init,
+            self.H_riv,
+            self.H_aq,
+            self.T_init,
+            array_K,
+            array_Ss,
+            self.list_zLow,
+            self.z_solve.copy(),
+            self.inter_cara,
+            self.isdtconstant,
+            alpha=ALPHA,
+            H_res=H_res,
+        )
+
+        if self.nb_layers == 1:
+            K = calc_K(
+                IntrinK
+            )  # NF it will need to be changed with the dependency to temperature
+            if verbose:
+                print(
+                    f"Solving the flow with intrinsec permeability {IntrinK}, and permeability {K}"
+                )
+            return H_strat, np.full(self.nb_cells, K)
+
+        # conversion of intrinsec permeability to permeability missing
+        # K_list = RHO_W * G * k_list * 1.0 / MU
+        K_list = calc_K(IntrinK_list)
+
+        # perméabilité équivalente aux interfaces asymétriques pour le calcul des débits
+        K_flows = K_list.copy()
+        z_solve = self.z_solve
+        for elem_idx in range(len(self.inter_cara)):
+            if self.inter_cara[elem_idx][1] != 0:
+                i0 = int(self.inter_cara[elem_idx][0])
+                i1 = int(self.inter_cara[elem_idx][1])
+                x = (self.list_zLow[elem_idx] - z_solve[i0]) / (z_solve[i1] - z_solve[i0])
+                K_list[i0] = 1 / (x / K_list[i0] + (1 - x) / K_list[i0 + 1])
+                K_flows[i0] = K_list[i0]
+                K_flows[i1] = K_list[i0]
+        return H_strat, K_flows
+
+    def _multilayer_H_init(self, array_K):
+        """Charge initiale stratifiée : linéaire par couche, continuité du débit aux interfaces."""
+        layersList = self.layers
+        array_eps = self.array_eps
+
+        array_Hinter = np.zeros(len(layersList) + 1)  # charge hydraulique de chaque interface
+        array_Hinter[0] = self.H_riv[0]
+        array_Hinter[-1] = 0.0
+        N = len(array_Hinter) - 1
+        # calculate Hinter
+        H_gauche = np.zeros((N - 1, N - 1))
+        H_droite = np.zeros((N - 1, N - 1))
+        scalar_gauche = np.zeros(N - 1)
+        scalar_droite = np.zeros(N - 1)
+        scalar_gauche[0] = array_K[0] * array_Hinter[0] / array_eps[0]
+        scalar_droite[-1] = -array_K[-1] * array_Hinter[-1] / array_eps[-1]
+        H_gauche[0, 0] = -array_K[0] / array_eps[0]
+        for diag in range(1, N - 1):
+            H_gauche[diag, diag - 1] = array_K[diag] / array_eps[diag]
+            H_gauche[diag, diag] = -array_K[diag] / array_eps[diag]
+
+        H_droite[N - 2, N - 2] = array_K[-1] / array_eps[-1]
+        for diag in range(0, N - 2):
+            H_droite[diag, diag + 1] = -array_K[diag + 1] / array_eps[diag + 1]
+            H_droite[diag, diag] = array_K[diag + 1] / array_eps[diag + 1]
+
+        Matrix_b = scalar_gauche - scalar_droite
+        Matrix_A = H_droite - H_gauche
+        H_sol = np.linalg.solve(Matrix_A, Matrix_b)
+        for idx in range(len(H_sol)):
+            array_Hinter[idx + 1] = H_sol[idx]
+
+        # calculer H de chaque couche
+        list_array_H = []
+        for idx, array_L in enumerate(self.list_array_L):
+            z_top = layersList[idx - 1].zLow if idx > 0 else 0
+            list_array_H.append(
+                array_Hinter[idx]
+                - (array_Hinter[idx] - array_Hinter[idx + 1])
+                / array_eps[idx]
+                * (array_L - z_top)
+            )
+        return np.concatenate(list_array_H), array_Hinter
+
+    def solve_batch(
+        self, X, verbose=False, ind_ref=None, temp_ref=None, misfit_budget=None
+    ):
+        """
+        Modèle direct pour plusieurs jeux de paramètres de travail (MCMC) X (n_chains, n_layers, n_params),
+        résolus ensemble par solve_HT_stratified_batch.
+
+        Si misfit_budget (n_chains,) est donné, la somme des carrés des écarts entre les températures aux
+        cellules ind_ref et les mesures temp_ref est aussi renvoyée, et chaque marche en température
+        s'arrête dès qu'elle dépasse son budget (misfit = inf, champs incomplets pour ce jeu).
+
+        Returns
+        -------
+        temperatures, flows : float32 arrays (n_chains, nb_cells, n_times)
+            tableaux du contexte, écrasés au prochain appel avec le même nombre de jeux.
+        misfit : float64 array (n_chains,), seulement si misfit_budget est donné
+        """
+        n_batch = len(X)
+        if n_batch not in self._buffers:
+            n_times = len(self.all_dt) + 1
+            self._buffers[n_batch] = allocate_HT_buffers(
+                self.nb_cells, n_times, n_batch
+            ) + (np.empty((n_batch, self.nb_cells, n_times), np.float32),)
+        *out, flows = self._buffers[n_batch]
+
+        all_H_strat = []
+        all_K_flows = []
+        for k, X_chain in enumerate(X):
+            H_strat, K_flows = self.build_direct_model(
+                self.physical_params(X_chain), verbose, H_res=out[0][k]
+            )
+            all_H_strat.append(H_strat)
+            all_K_flows.append(K_flows)
+
+        multilayer = self.nb_layers > 1
+        _, nablaH, temperatures, _, misfit = solve_HT_stratified_batch(
+            all_H_strat,
+            self.T_riv,
+            self.T_aq,
+            correct_interfaces=multilayer,
+            out=out,
+            ind_ref=ind_ref,
+            temp_ref=temp_ref,
+            misfit_budget=np.inf if misfit_budget is None else misfit_budget,
+        )
+        # débit spécifique -K * nablaH, calculé en float64 puis écrit en float32
+        np.multiply(
+            -np.stack(all_K_flows)[:, :, np.newaxis], nablaH, out=flows, casting="unsafe"
+        )
+
+        # les marches interrompues laissent des températures incomplètes, qui ne sont pas vérifiées
+        complete = misfit != np.inf
+        if multilayer and (
+            np.isnan(temperatures[complete]).any() or np.isnan(flows[complete]).any()
+        ):
+            print(f"Issue for the following parameters : {X}")
+            print(f"Issue for the follwing number of layers : {self.nb_layers}")
+            raise ValueError("NaN values in compute_solve_transi_batch")
+
+        if misfit_budget is not None:
+            return temperatures, flows, misfit
+        return temperatures, flows
+
+    def solve_batch_sensors(
+        self, X, ind_ref, temp_ref, misfit_budget=None, sous_ech=None, verbose=False
+    ):
+        """
+        Mode vraisemblance de solve_batch (voir solve_HT_sensors_batch) : seules les températures aux cellules
+        ind_ref et leur écart aux mesures temp_ref sont calculés, ainsi que les champs de température et de débit
+        sous-échantillonnés si sous_ech = (n_sous_ech_space, n_sous_ech_time) est donné. Quand dt est constant,
+        aucun tableau (nb_cells, n_times) n'est alloué ni rempli.
+
+        Returns
+        -------
+        temp_sensors : float32 array (n_chains, n_sensors, n_times)
+        misfit : float64 array (n_chains,), inf pour les jeux dont la marche a dépassé misfit_budget
+        temperatures, flows : float32 arrays sous-échantillonnés (n_chains, ...), None sans sous_ech
+            tableaux du contexte, écrasés au prochain appel identique.
+        """
+        n_batch = len(X)
+        key = (n_batch, len(ind_ref), sous_ech)
+        if key not in self._buffers:
+            self._buffers[key] = allocate_sensor_buffers(
+                len(ind_ref), self.nb_cells, len(self.all_dt) + 1, n_batch, sous_ech
+            )
+
+        all_H_strat = []
+        all_K_flows = []
+        for X_chain in X:
+            # à dt constant, seule la charge initiale est écrite dans H_res
+            H_strat, K_flows = self.build_direct_model(
+                self.physical_params(X_chain),
+                verbose,
+                H_res=np.empty((self.nb_cells, 1), np.float32)
+                if self.isdtconstant
+                else None,
+            )
+            all_H_strat.append(H_strat)
+            all_K_flows.append(K_flows)
+
+        multilayer = self.nb_layers > 1
+        temp_sensors, misfit, temperatures, flows = solve_HT_sensors_batch(
+            all_H_strat,
+            self.T_riv,
+            self.T_aq,
+            ind_ref,
+            temp_ref,
+            correct_interfaces=multilayer,
+            misfit_budget=misfit_budget,
+            K_flows=np.stack(all_K_flows),
+            sous_ech=sous_ech,
+            out=self._buffers[key],
+        )
+
+        complete = misfit != np.inf
+        if multilayer and (
+            np.isnan(temp_sensors[complete]).any()
+            or (
+                sous_ech is not None
+                and (
+                    np.isnan(temperatures[complete]).any()
+                    or np.isnan(flows[complete]).any()
+                )
+            )
+        ):
+            print(f"Issue for the following parameters : {X}")
+            print(f"Issue for the follwing number of layers : {self.nb_layers}")
+            raise ValueError("NaN values in compute_solve_transi_batch")
+
+        return temp_sensors, misfit, temperatures, flows
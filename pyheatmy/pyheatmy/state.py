@@ -1,12 +1,49 @@
-from dataclasses import dataclass
-from typing import Sequence
-
-from pyheatmy.params import Param
-from pyheatmy.layers import Layer
-
-@dataclass
-class State:
-    layers: Sequence[Layer]
-    energy: float
-    ratio_accept: float
-    sigma2_temp: float
+import numpy as np
+
+
+def _allocate_in_memory(name, shape, dtype, fill_value):
+    return np.full(shape, fill_value, dtype)
+
+
+class McmcTrace:
+    """
+    Trace des états des chaînes de la MCMC, stockée en colonnes préallouées.
+
+    params : paramètres de travail (MCMC) de chaque couche, float32 (nb_states, nb_chain, nb_layer, nb_param)
+    energy, sigma2_temp : énergie et sigma2 de chaque état, float32 (nb_states, nb_chain)
+    accepted : True si l'état provient d'une proposition acceptée, bool (nb_states, nb_chain)
+
+    L'état 0 est l'état initial des chaînes, l'état i + 1 celui après l'itération i.
+    allocate(name, shape, dtype, fill_value) crée chaque tableau : en mémoire par défaut,
+    ou sur disque avec DiskSampleStore.create.
+    """
+
+    def __init__(self, nb_states, nb_chain, nb_layer, nb_param, allocate=None):
+        if allocate is None:
+            allocate = _allocate_in_memory
+        self.params = allocate(
+            "params", (nb_states, nb_chain, nb_layer, nb_param), np.float32, 0
+        )
+        self.energy = allocate("energy", (nb_states, nb_chain), np.float32, np.nan)
+        self.sigma2_temp = allocate(
+            "sigma2_temp", (nb_states, nb_chain), np.float32, np.nan
+        )
+        self.accepted = allocate("accepted", (nb_states, nb_chain), np.bool_, False)
+
+    def record(self, i, j, params, energy, sigma2_temp, accepted=True):
+        """Enregistre l'état i de la chaîne j."""
+        self.params[i, j] = params
+        self.energy[i, j] = energy
+        self.sigma2_temp[i, j] = sigma2_temp
+        self.accepted[i, j] = accepted
+
+    def repeat(self, i, j):
+        """La proposition de la chaîne j est rejetée : l'état i est une copie de l'état i - 1."""
+        self.params[i, j] = self.params[i - 1, j]
+        self.energy[i, j] = self.energy[i - 1, j]
+        self.sigma2_temp[i, j] = self.sigma2_temp[i - 1, j]
+        self.accepted[i, j] = False
+
+    def best(self):
+        """Indices (i, j) de l'état d'énergie minimale."""
+        return np.unravel_index(np.nanargmin(self.energy), self.energy.shape)
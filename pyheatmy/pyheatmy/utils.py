@@ -20,8 +20,15 @@ from numpy import (
     pi,
     sin,
     full,
+    asarray,
+    conj,
+    minimum,
+    nonzero,
+    nan,
+    log10,
 )
 
+from numpy.fft import rfft, irfft
 from numpy.linalg import solve
 
 # import numpy as np
@@ -99,6 +106,83 @@ def gelman_rubin(nb_current_iter, nb_param, nb_layer, chains, threshold=1.2):
     return all(R < threshold)
 
 
+class GelmanRubinAccumulator:
+    """
+    Critère de Gelman-Rubin calculé au fil des itérations, sans conserver l'historique des chaînes.
+    Les moyennes et sommes des carrés des écarts de chaque paramètre de chaque couche de chaque chaîne
+    sont mises à jour par l'algorithme de Welford, en O(nb_chain * nb_layer * nb_param) par itération.
+    Les valeurs de R sont celles de gelman_rubin appelée sur tout l'historique (aux arrondis près).
+    """
+
+    def __init__(self, nb_chain, nb_layer, nb_param):
+        self.nb_current_iter = 0
+        self.means = zeros((nb_chain, nb_layer, nb_param))
+        self.M2 = zeros((nb_chain, nb_layer, nb_param))
+
+    def update(self, X):
+        """Ajoute l'état courant X (nb_chain, nb_layer, nb_param) des chaînes."""
+        self.nb_current_iter += 1
+        delta = X - self.means
+        self.means += delta / self.nb_current_iter
+        self.M2 += delta * (X - self.means)
+
+    def R(self):
+        """Indicateur de Gelman-Rubin de chaque paramètre de chaque couche, tableau (nb_layer, nb_param)."""
+        n = self.nb_current_iter
+        # Moyenne des variances intra-chaîne
+        var_intra = mean(self.M2 / n, axis=0)
+        # Variance entre les moyennes des chaînes, dite inter-chaînes
+        var_inter = var(self.means, axis=0)
+
+        R = full(var_intra.shape, 2.0)
+        is_var_intra_null = isclose(var_intra, 0)
+        R[~is_var_intra_null] = sqrt(
+            var_inter[~is_var_intra_null]
+            / var_intra[~is_var_intra_null]
+            * (n - 1)
+            / n
+            + 1
+        )
+        return R
+
+    def has_converged(self, threshold=1.2):
+        # On considère que la phase de burn-in est terminée dès que R < threshold
+        return all(self.R() < threshold)
+
+
+def effective_sample_size(chains):
+    """
+    Taille d'échantillon effective de chaque paramètre pour des chaînes chains (nb_iter, nb_chain, ...),
+    estimée comme dans Vehtari et al. (2021) : autocorrélations combinées des chaînes (calculées par FFT),
+    sommées par paires jusqu'à la première paire négative et rendues décroissantes (séquence initiale de Geyer).
+    Renvoie un tableau de la forme chains.shape[2:], NaN pour un paramètre constant.
+    """
+    chains = asarray(chains, dtype=float)
+    n, m = chains.shape[:2]
+    param_shape = chains.shape[2:]
+    chains = chains.reshape(n, m, -1)
+    centered = chains - mean(chains, axis=0)
+
+    # autocovariances de chaque chaîne pour les décalages 0 à n - 1
+    spectrum = rfft(centered, 2 * n, axis=0)
+    acov = irfft(spectrum * conj(spectrum), axis=0)[:n] / n
+    var_intra = mean(var(chains, axis=0, ddof=1), axis=0)
+    var_plus = var_intra * (n - 1) / n
+    if m > 1:
+        var_plus = var_plus + var(mean(chains, axis=0), axis=0, ddof=1)
+
+    ess = full(chains.shape[2], nan)
+    for p in nonzero(var_plus > 0)[0]:
+        rho = 1 - (var_intra[p] - mean(acov[:, :, p], axis=1)) / var_plus[p]
+        rho[0] = 1.0
+        pairs = rho[: n - n % 2].reshape(-1, 2).sum(axis=1)
+        negative = nonzero(pairs < 0)[0]
+        pairs = minimum.accumulate(pairs[: negative[0] if len(negative) else len(pairs)])
+        tau = max(-1 + 2 * sum(pairs), 1 / log10(n * m))
+        ess[p] = n * m / tau
+    return ess.reshape(param_shape)
+
+
 # Les fonctions suivantes (compute_Mu, compute_H_stratified, compute_T_stratified, compute_HTK_stratified) ne sont plus utilisées dans le core, elles ont été déplacées et remises en forme dans le fichier linear_system.py
 # On les supprimera lorsque la nouvelle version sera validée (branche 2024-77-linear-system)
 
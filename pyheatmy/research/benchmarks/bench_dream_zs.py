@@ -0,0 +1,74 @@
+"""
+Comparaison de DREAM et de DREAM(ZS) (compute_mcmc(dream_zs=True)) à nombre de modèles directs égal :
+taille d'échantillon effective (ESS) des paramètres par modèle direct, et temps de calcul.
+
+    python bench_dream_zs.py [nb_times] [nb_cells] [nb_solves]
+
+DREAM tourne avec NB_CHAIN_DREAM chaînes, DREAM(ZS) avec NB_CHAIN_ZS chaînes (avec et sans mises à jour
+snooker) : les seconds font donc des chaînes plus longues pour le même nombre de modèles directs nb_solves
+(burn-in compris). L'ESS est calculée par utils.effective_sample_size sur la seconde moitié des états
+échantillonnés de chaque paramètre variable.
+"""
+
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+
+from pyheatmy.utils import effective_sample_size
+from synthetic_column import synthetic_column
+
+NB_CHAIN_DREAM = 10
+NB_CHAIN_ZS = 3
+NB_BURNING = 50
+
+
+def run(label, nb_times, nb_cells, nb_solves, nb_chain, **kwargs):
+    col = synthetic_column(nb_times, nb_cells)
+    np.random.seed(0)
+    nb_iter = nb_solves // nb_chain - NB_BURNING
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        col.compute_mcmc(
+            nb_iter=nb_iter,
+            nb_chain=nb_chain,
+            nitmaxburning=NB_BURNING,
+            quantile_mode="online",
+            **kwargs,
+        )
+    elapsed = time.perf_counter() - start
+
+    # modèles directs réellement calculés : burn-in (éventuellement interrompu) et échantillonnage
+    solves = nb_chain * (min(col.nb_burn_in_iter + 1, NB_BURNING) + nb_iter)
+    params = col._trace.params[1 + nb_iter // 2 :]
+    ess = effective_sample_size(params)
+    ess = ess[~np.isnan(ess)]
+    print(
+        f"{label:<28} {nb_chain:3d} chaînes x {nb_iter:5d} it.  {elapsed:7.1f} s"
+        f"   ESS min {ess.min():7.1f}  médiane {np.median(ess):7.1f}"
+        f"   ESS min / 1000 modèles {1e3 * ess.min() / solves:6.2f}"
+        f"   acceptation {np.mean(col._trace.accepted[1:]):.2f}"
+    )
+
+
+def main(nb_times=1000, nb_cells=40, nb_solves=6000):
+    print(f"nb_times = {nb_times}, nb_cells = {nb_cells}, modèles directs = {nb_solves}")
+    run("DREAM", nb_times, nb_cells, nb_solves, NB_CHAIN_DREAM)
+    run("DREAM(ZS)", nb_times, nb_cells, nb_solves, NB_CHAIN_ZS, dream_zs=True)
+    run(
+        "DREAM(ZS), snooker 0.1",
+        nb_times,
+        nb_cells,
+        nb_solves,
+        NB_CHAIN_ZS,
+        dream_zs=True,
+        snooker=0.1,
+    )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""
+Mesure de l'effet des tableaux de résultats réutilisés (compute_solve_transi(reuse_buffers=True)
+et SolverContext.solve_batch) sur le temps par appel et sur le pic de mémoire allouée.
+
+    python bench_result_buffers.py [nb_times] [nb_cells] [nb_chain]
+
+Le pic est mesuré par tracemalloc (allocations numpy comprises) sur une série d'appels, et le RSS
+du processus par psutil à la fin de chaque série.
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import psutil
+
+from pyheatmy.solver_context import SolverContext
+from synthetic_column import synthetic_column
+
+NB_CALLS = 20
+
+
+def measure(label, call):
+    call()  # compilation numba et premières allocations hors mesure
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(NB_CALLS):
+        call()
+    elapsed = (time.perf_counter() - start) / NB_CALLS
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = psutil.Process().memory_info().rss
+    print(
+        f"{label:<40} {1e3 * elapsed:8.2f} ms/appel"
+        f"   pic alloué {peak / 1e6:8.2f} Mo   RSS {rss / 1e6:8.1f} Mo"
+    )
+
+
+def main(nb_times=2000, nb_cells=100, nb_chain=10):
+    print(f"nb_times = {nb_times}, nb_cells = {nb_cells}, nb_chain = {nb_chain}")
+    col = synthetic_column(nb_times, nb_cells)
+
+    measure(
+        "compute_solve_transi",
+        lambda: col.compute_solve_transi(verbose=False),
+    )
+    measure(
+        "compute_solve_transi(reuse_buffers=True)",
+        lambda: col.compute_solve_transi(verbose=False, reuse_buffers=True),
+    )
+
+    X = []
+    for _ in range(nb_chain):
+        col.sample_params_from_priors()
+        X.append(col._get_list_mcmc_params())
+    X = np.array(X, np.float32)
+    solver_context = SolverContext(col)
+    measure("compute_solve_transi_batch", lambda: col.compute_solve_transi_batch(X))
+    measure("SolverContext.solve_batch", lambda: solver_context.solve_batch(X))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
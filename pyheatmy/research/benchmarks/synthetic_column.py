@@ -0,0 +1,60 @@
+"""
+Colonne synthétique (rivière et aquifère sinusoïdaux, capteurs bruités) pour les scripts de
+mesure de performance de ce dossier. Pas de temps de 15 min, colonne de 40 cm.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from pyheatmy import Column, Layer
+
+PRIORS = {
+    "Prior_IntrinK": ((1e-14, 1e-11), 5e-14),
+    "Prior_n": ((0.01, 0.25), 0.0125),
+    "Prior_lambda_s": ((1, 10), 0.5),
+    "Prior_rhos_cs": ((1e6, 1e7), 9e5),
+    "Prior_q_s": ((-1e-7, 1e-7), 1e-9),
+}
+
+
+def synthetic_column(
+    nb_times=2000, nb_cells=100, two_layers=False, seed=0, rac="/tmp/pyheatmy_bench"
+):
+    rng = np.random.default_rng(seed)
+    t0 = datetime(2024, 1, 1)
+    times = [t0 + timedelta(minutes=15 * i) for i in range(nb_times)]
+    phase = 2 * np.pi * np.arange(nb_times) * 900.0 / 86400.0
+
+    dH = 0.05 + 0.02 * np.sin(phase)
+    T_riv = 285 + 3 * np.sin(phase)
+    T_aq = np.full(nb_times, 283.0)
+    T_sensors = np.stack(
+        [
+            284.5 + 1.5 * np.sin(phase - 0.5),
+            284.0 + 0.8 * np.sin(phase - 1.0),
+            283.5 + 0.3 * np.sin(phase - 1.5),
+        ],
+        axis=1,
+    ) + rng.normal(0, 0.05, (nb_times, 3))
+
+    col = Column(
+        river_bed=1.0,
+        depth_sensors=[0.1, 0.2, 0.3, 0.4],
+        offset=0.0,
+        dH_measures=list(zip(times, zip(dH, T_riv))),
+        T_measures=list(zip(times, np.column_stack([T_sensors, T_aq]))),
+        nb_cells=nb_cells,
+        rac=rac,
+    )
+    if two_layers:
+        layers = [
+            Layer("c1", 0.2, 1e-12, 0.1, 2.0, 4e6, 0.0),
+            Layer("c2", 0.4, 1e-13, 0.15, 3.0, 3e6, 1e-8),
+        ]
+    else:
+        layers = [Layer("h", 0.4, 1e-12, 0.1, 2.0, 4e6, 1e-8)]
+    for layer in layers:
+        layer.set_priors_from_dict(PRIORS)
+    col.set_layers(layers if two_layers else layers[0])
+    return col
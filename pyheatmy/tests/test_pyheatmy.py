@@ -1,5 +1,702 @@
+from datetime import datetime, timedelta
+import random
+
+import numpy as np
+import pytest
+
 import pyheatmy
+from pyheatmy import Column, Layer
+from pyheatmy.core import _evaluate_chains, compute_energy
+from pyheatmy.config import ALPHA
+from pyheatmy.linear_system import (
+    H_stratified,
+    T_stratified,
+    allocate_HT_buffers,
+    solve_HT_sensors_batch,
+    solve_HT_stratified,
+    solve_HT_stratified_batch,
+)
+from pyheatmy.solver import (
+    solver,
+    tri_factorize,
+    tri_product,
+    tri_product_into,
+    tri_solve_factorized,
+    tri_solve_factorized_batch,
+)
+from pyheatmy.solver_context import SolverContext
+from pyheatmy.snapshot import load_state, save_state
+from pyheatmy.state import McmcTrace
+from pyheatmy.quantiles import P2Quantiles
+from pyheatmy.sample_store import (
+    DiskSampleStore,
+    load_mcmc_samples,
+    quantiles_by_time_chunks,
+)
+from pyheatmy.utils import (
+    GelmanRubinAccumulator,
+    effective_sample_size,
+    gelman_rubin,
+)
 
 # fill this file with tests
 def test_pyheatmy():
     assert True
+
+
+def test_prefactorised_solver_matches_solver():
+    rng = np.random.default_rng(0)
+    n = 30
+    a, c = rng.normal(size=n - 1), rng.normal(size=n - 1)
+    b = 4 + rng.random(n)  # diagonale dominante
+    m, u = np.zeros(n - 1, np.float32), np.zeros(n, np.float32)
+    tri_factorize(a, b, c, m, u)
+    x = np.zeros(n, np.float32)
+    res = np.zeros(n, np.float32)
+    for _ in range(3):  # une factorisation, plusieurs seconds membres
+        d = rng.normal(size=n)
+        tri_solve_factorized(m, u, c, d, x)
+        np.testing.assert_array_equal(x, solver(a, b, c, d))
+        tri_product_into(a, b, c, d, res)
+        np.testing.assert_array_equal(res, tri_product(a, b, c, d))
+
+
+def test_batch_sweep_matches_single_solves():
+    rng = np.random.default_rng(1)
+    n_batch, n = 4, 30
+    a, c = rng.normal(size=(n_batch, n - 1)), rng.normal(size=(n_batch, n - 1))
+    b = 4 + rng.random((n_batch, n))
+    d = rng.normal(size=(n_batch, n))
+    m, u = np.zeros((n_batch, n - 1), np.float32), np.zeros((n_batch, n), np.float32)
+    for k in range(n_batch):
+        tri_factorize(a[k], b[k], c[k], m[k], u[k])
+    x = np.full((n_batch, n), -1.0, np.float32)
+    active = np.array([True, False, True, True])
+    tri_solve_factorized_batch(m, u, c, d, x, active)
+    for k in range(n_batch):
+        if active[k]:
+            np.testing.assert_array_equal(x[k], solver(a[k], b[k], c[k], d[k]))
+        else:  # système retiré du lot : non modifié
+            np.testing.assert_array_equal(x[k], -1.0)
+
+
+def _small_H_stratified(n_cell=20, n_times=50, IntrinK=1e-12, n=0.1, H_res=None):
+    dz = 0.4 / n_cell
+    z_solve = dz / 2 + dz * np.arange(n_cell)
+    t = np.arange(n_times) * 900.0
+    H_riv = 0.05 + 0.02 * np.sin(2 * np.pi * t / 86400.0)
+    ones = np.ones(n_cell)
+    return H_stratified(
+        Ss_list=0.1 * ones / 0.4,
+        IntrinK_list=IntrinK * ones,
+        n_list=n * ones,
+        lambda_s_list=2.0 * ones,
+        rhos_cs_list=4e6 * ones,
+        all_dt=np.full(n_times - 1, 900.0),
+        q_s_list=1e-8 * ones,
+        dz=dz,
+        H_init=H_riv[0] * (1 - z_solve / 0.4),
+        H_riv=H_riv,
+        H_aq=np.zeros(n_times),
+        T_init=np.linspace(285.0, 283.0, n_cell),
+        array_K=np.array([1e-5, 1e-5]),
+        array_Ss=np.array([0.25, 0.25]),
+        list_zLow=np.array([0.2]),
+        z_solve=z_solve,
+        inter_cara=np.array([[n_cell // 2, 0]]),
+        isdtconstant=np.array(True),
+        alpha=ALPHA,
+        H_res=H_res,
+    )
+
+
+def test_compiled_march_matches_python_loop():
+    H_strat = _small_H_stratified()
+    n_times = H_strat.n_times
+    t = np.arange(n_times) * 900.0
+    T_riv = 285.0 + 3 * np.sin(2 * np.pi * t / 86400.0)
+    T_aq = np.full(n_times, 283.0)
+
+    # référence : boucle Python pas à pas historique
+    ref = _small_H_stratified()
+    lA, dA, uA, lB, dB, uB = ref.compute_constant_dt_diagonals()
+    for j in range(n_times - 1):
+        rhs = tri_product(lB, dB, uB, ref.H_res[:, j]) + ref.compute_c(j)
+        ref.H_res[:, j + 1] = solver(lA, dA, uA, rhs)
+    T_ref = T_stratified(
+        ref.nablaH(), ref.Ss_list, ref.IntrinK_list, ref.n_list, ref.lambda_s_list,
+        ref.rhos_cs_list, ref.all_dt, ref.q_s_list, ref.dz, ref.H_init, ref.H_riv,
+        ref.H_aq, ref.T_init, T_riv, T_aq,
+    )
+    T_ref.T_res = np.zeros((ref.n_cell, n_times), np.float32)
+    T_ref.T_res[:, 0] = ref.T_init
+    for j, dt in enumerate(ref.all_dt):
+        rhs = tri_product(
+            T_ref._compute_lower_diagonal(j),
+            T_ref._compute_diagonal(j, dt),
+            T_ref._compute_upper_diagonal(j),
+            T_ref.T_res[:, j],
+        ) + T_ref._compute_c(j)
+        T_ref.T_res[:, j + 1] = solver(*T_ref._compute_A_diagonals(j, dt), rhs)
+
+    H_res, nablaH, T_res, _ = solve_HT_stratified(H_strat, T_riv, T_aq)
+
+    np.testing.assert_allclose(H_res, ref.H_res, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(nablaH, T_ref.nablaH, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(T_res, T_ref.T_res, rtol=1e-5)
+
+
+def test_heat_march_steady_flow_matches_python_loop():
+    # écoulement permanent et dt constant par morceaux : la factorisation de A n'est refaite qu'au changement de dt
+    H_strat = _small_H_stratified()
+    n_cell, n_times = H_strat.n_cell, H_strat.n_times
+    t = np.arange(n_times) * 900.0
+    nablaH = np.tile(np.linspace(-0.2, 0.1, n_cell, dtype=np.float32)[:, None], (1, n_times))
+    all_dt = np.where(np.arange(n_times - 1) < 20, 900.0, 450.0)
+    T_strat = T_stratified(
+        nablaH, H_strat.Ss_list, H_strat.IntrinK_list, H_strat.n_list,
+        H_strat.lambda_s_list, H_strat.rhos_cs_list, all_dt, H_strat.q_s_list,
+        H_strat.dz, H_strat.H_init, H_strat.H_riv, H_strat.H_aq, H_strat.T_init,
+        285.0 + 3 * np.sin(2 * np.pi * t / 86400.0), np.full(n_times, 283.0),
+    )
+    T_res = T_strat.compute_T_stratified()
+
+    T_ref = np.zeros((n_cell, n_times), np.float32)
+    T_ref[:, 0] = T_strat.T_init
+    for j, dt in enumerate(all_dt):
+        rhs = tri_product(
+            T_strat._compute_lower_diagonal(j),
+            T_strat._compute_diagonal(j, dt),
+            T_strat._compute_upper_diagonal(j),
+            T_ref[:, j],
+        ) + T_strat._compute_c(j)
+        T_ref[:, j + 1] = solver(*T_strat._compute_A_diagonals(j, dt), rhs)
+    np.testing.assert_array_equal(T_res, T_ref)
+
+
+def test_batch_march_matches_single_solves():
+    params = [(1e-12, 0.1), (5e-13, 0.2), (2e-12, 0.05)]
+    n_times = 50
+    t = np.arange(n_times) * 900.0
+    T_riv = 285.0 + 3 * np.sin(2 * np.pi * t / 86400.0)
+    T_aq = np.full(n_times, 283.0)
+
+    batch = solve_HT_stratified_batch(
+        [_small_H_stratified(IntrinK=K, n=n) for K, n in params], T_riv, T_aq
+    )
+    for k, (K, n) in enumerate(params):
+        single = solve_HT_stratified(_small_H_stratified(IntrinK=K, n=n), T_riv, T_aq)
+        for res_batch, res_single in zip(batch, single):
+            np.testing.assert_array_equal(res_batch[k], res_single)
+
+
+def test_march_stops_when_misfit_budget_exceeded():
+    params = [(1e-12, 0.1), (5e-13, 0.2), (2e-12, 0.05)]
+    n_times = 50
+    t = np.arange(n_times) * 900.0
+    T_riv = 285.0 + 3 * np.sin(2 * np.pi * t / 86400.0)
+    T_aq = np.full(n_times, 283.0)
+    ind_ref = [5, 10, 15]
+
+    full = solve_HT_stratified_batch(
+        [_small_H_stratified(IntrinK=K, n=n) for K, n in params], T_riv, T_aq
+    )
+    temp_ref = full[2][0][ind_ref].astype(np.float64) + 0.1  # mesures proches du premier jeu
+    exact = np.array(
+        [np.sum((temp_ref - full[2][k][ind_ref]) ** 2) for k in range(len(params))]
+    )
+    budget = np.array([exact[0] * 1.01, exact[1] * 0.99, np.inf])
+
+    *res, misfit = solve_HT_stratified_batch(
+        [_small_H_stratified(IntrinK=K, n=n) for K, n in params],
+        T_riv,
+        T_aq,
+        ind_ref=ind_ref,
+        temp_ref=temp_ref,
+        misfit_budget=budget,
+    )
+    assert misfit[1] == np.inf  # interrompu : le budget est dépassé avant la fin
+    np.testing.assert_allclose(misfit[[0, 2]], exact[[0, 2]], rtol=1e-10)
+    for k in (0, 2):  # les marches complètes ne sont pas modifiées
+        for res_budget, res_full in zip(res, full):
+            np.testing.assert_array_equal(res_budget[k], res_full[k])
+
+
+def test_sensor_mode_matches_full_solve():
+    params = [(1e-12, 0.1), (5e-13, 0.2)]
+    n_times = 50
+    t = np.arange(n_times) * 900.0
+    T_riv = 285.0 + 3 * np.sin(2 * np.pi * t / 86400.0)
+    T_aq = np.full(n_times, 283.0)
+    ind_ref = [5, 10, 15]
+    temp_ref = np.full((len(ind_ref), n_times), 284.0)
+    K_flows = np.array([[1e-5 * K / 1e-12] * 20 for K, _ in params])
+
+    _, nablaH, T_res, _, misfit = solve_HT_stratified_batch(
+        [_small_H_stratified(IntrinK=K, n=n) for K, n in params],
+        T_riv,
+        T_aq,
+        ind_ref=ind_ref,
+        temp_ref=temp_ref,
+        misfit_budget=np.inf,
+    )
+    T_sensors, misfit_sensors, T_sous_ech, flows_sous_ech = solve_HT_sensors_batch(
+        [
+            _small_H_stratified(IntrinK=K, n=n, H_res=np.empty((20, 1), np.float32))
+            for K, n in params
+        ],
+        T_riv,
+        T_aq,
+        ind_ref,
+        temp_ref,
+        K_flows=K_flows,
+        sous_ech=(3, 4),
+    )
+    np.testing.assert_array_equal(T_sensors, T_res[:, ind_ref])
+    np.testing.assert_array_equal(misfit_sensors, misfit)
+    np.testing.assert_array_equal(T_sous_ech, T_res[:, ::3, ::4])
+    np.testing.assert_array_equal(
+        flows_sous_ech,
+        (-K_flows[:, :, None] * nablaH).astype(np.float32)[:, ::3, ::4],
+    )
+
+
+def test_result_buffers_overwritten_in_place():
+    params = [(1e-12, 0.1), (5e-13, 0.2)]
+    n_times = 50
+    t = np.arange(n_times) * 900.0
+    T_riv = 285.0 + 3 * np.sin(2 * np.pi * t / 86400.0)
+    T_aq = np.full(n_times, 283.0)
+
+    out = allocate_HT_buffers(20, n_times)
+    out_batch = allocate_HT_buffers(20, n_times, n_batch=len(params))
+    for K, n in params:  # le second appel écrase entièrement les résultats du premier
+        res = solve_HT_stratified(
+            _small_H_stratified(IntrinK=K, n=n, H_res=out[0]), T_riv, T_aq, out=out
+        )
+        assert all(r is o for r, o in zip(res, out))
+        expected = solve_HT_stratified(_small_H_stratified(IntrinK=K, n=n), T_riv, T_aq)
+        for res_out, res_new in zip(out, expected):
+            np.testing.assert_array_equal(res_out, res_new)
+
+        res_batch = solve_HT_stratified_batch(
+            [_small_H_stratified(IntrinK=K, n=n), _small_H_stratified(IntrinK=K, n=n)],
+            T_riv,
+            T_aq,
+            out=out_batch,
+        )
+        for res_out, res_new in zip(res_batch, expected):
+            np.testing.assert_array_equal(res_out[1], res_new)
+
+
+def test_gelman_rubin_accumulator_matches_history():
+    rng = np.random.default_rng(0)
+    nb_chain, nb_layer, nb_param = 8, 2, 5
+    history = rng.normal(size=(30, nb_chain, nb_layer, nb_param)).astype(np.float32)
+    history[:, :, :, 2] = 1.0  # paramètre fixe : variance intra-chaîne nulle
+    history += np.arange(nb_chain, dtype=np.float32)[:, None, None] * 0.3
+
+    accumulator = GelmanRubinAccumulator(nb_chain, nb_layer, nb_param)
+    for i, X in enumerate(history):
+        accumulator.update(X)
+        for threshold in (1.05, 1.2, 1.5):
+            assert accumulator.has_converged(threshold) == gelman_rubin(
+                i + 1, nb_param, nb_layer, history[: i + 1], threshold=threshold
+            )
+    R = accumulator.R()
+    assert np.all(R[:, 2] == 2)
+    var_intra = np.mean(np.var(history, axis=0), axis=0)
+    var_inter = np.var(np.mean(history, axis=0), axis=0)
+    n = len(history)
+    np.testing.assert_allclose(
+        R[:, [0, 1, 3, 4]],
+        np.sqrt(var_inter / var_intra * (n - 1) / n + 1)[:, [0, 1, 3, 4]],
+        rtol=1e-5,
+    )
+
+
+def test_p2_quantiles_close_to_exact():
+    rng = np.random.default_rng(0)
+    samples = 283.0 + rng.normal(size=(2000, 4, 6)) * np.linspace(0.5, 2.0, 6)
+    quantiles = (0.05, 0.5, 0.95)
+
+    estimator = P2Quantiles(quantiles, (4, 6))
+    for i, sample in enumerate(samples):
+        estimator.update(sample)
+        if i < 4:  # les premières observations sont conservées : quantiles exacts
+            np.testing.assert_allclose(
+                estimator.get_quantile(0.5), np.quantile(samples[: i + 1], 0.5, axis=0)
+            )
+
+    for quant, res in estimator.get_quantiles().items():
+        assert res.shape == (4, 6)
+        np.testing.assert_allclose(
+            res, np.quantile(samples, quant, axis=0), atol=0.25
+        )
+
+
+def test_disk_sample_store_quantiles(tmp_path):
+    rng = np.random.default_rng(0)
+    quantiles = [0.05, 0.5, 0.95]
+    store = DiskSampleStore(tmp_path, info={"nb_iter": 4, "nb_chain": 3})
+    trace = McmcTrace(5, 3, 2, 5, allocate=store.create)
+    temperatures = store.create("temperatures", (12, 5, 40))
+    temperatures[:] = rng.normal(283.0, 1.0, (12, 5, 40))
+    trace.record(0, 1, np.ones((2, 5)), 12.5, 0.5)
+    trace.repeat(1, 1)
+    store.flush()
+
+    # quantiles par blocs de 3 pas de temps, identiques à np.quantile sur tout le tableau
+    res = quantiles_by_time_chunks(
+        temperatures, quantiles, 1, max_chunk_bytes=3 * 12 * 5 * 4
+    )
+    expected = np.quantile(np.asarray(temperatures), quantiles, axis=0)
+    for iq, quant in enumerate(quantiles):
+        np.testing.assert_array_equal(res[quant], expected[iq])
+
+    info, arrays = load_mcmc_samples(tmp_path)
+    assert info == {"nb_iter": 4, "nb_chain": 3}
+    np.testing.assert_array_equal(arrays["temperatures"], temperatures)
+    assert arrays["energy"][1, 1] == 12.5 and not arrays["accepted"][1, 1]
+    np.testing.assert_array_equal(arrays["params"][1, 1], np.ones((2, 5)))
+    assert np.isnan(arrays["energy"][2:]).all()
+
+
+def _small_column(n_times=60, nb_cells=20, start=0):
+    # mesures des temps start à start + n_times - 1 d'un même enregistrement
+    t0 = datetime(2024, 1, 1)
+    times = [t0 + timedelta(minutes=15 * i) for i in range(start, start + n_times)]
+    t = np.arange(start, start + n_times) * 900.0
+    T_riv = 285.0 + 3 * np.sin(2 * np.pi * t / 86400.0)
+    T_measures = np.stack(
+        [284.5 + np.sin(2 * np.pi * t / 86400.0 - k) for k in (0.5, 1.0, 1.5)]
+        + [np.full(n_times, 283.0)],
+        axis=1,
+    )
+    column = Column(
+        river_bed=1.0,
+        depth_sensors=[0.1, 0.2, 0.3, 0.4],
+        offset=0.0,
+        dH_measures=list(zip(times, zip(0.05 + 0 * t, T_riv))),
+        T_measures=list(zip(times, T_measures)),
+        nb_cells=nb_cells,
+    )
+    column.set_layers(
+        Layer.from_dict(
+            dict(name="l", zLow=0.4, IntrinK=1e-12, n=0.1, lambda_s=2.0, rhos_cs=4e6, q_s=0.0)
+        )
+    )
+    return column
+
+
+def test_coarse_model_energies_and_budget():
+    column = _small_column()
+    coarse = SolverContext(column, nb_cells=10, n_sous_ech_time=3)
+    assert coarse.temp_ref.shape == (3, 20) and coarse.time_ratio == 3.0
+
+    X = np.array([[[1e-12, 0.1, 2.0, 4e6, 0.0]], [[5e-13, 0.2, 3.0, 3e6, 0.0]]])  # couche sans prior
+    sigma2, density = np.full(2, 0.01), np.full(2, 0.5)
+    args = (coarse, X, sigma2, density, coarse.id_sensors, coarse.temp_ref)
+    energies, _, _ = _evaluate_chains(*args, energy_scale=coarse.time_ratio)
+
+    # énergie du modèle grossier : écart aux mesures sous-échantillonnées, ramené au nombre de temps de la colonne
+    T_sensors = coarse.solve_batch_sensors(X, coarse.id_sensors, coarse.temp_ref)[0]
+    expected = [
+        3.0 * compute_energy(T, coarse.temp_ref, 0.01, lambda _: 1) - np.log(0.5)
+        for T in T_sensors
+    ]
+    np.testing.assert_allclose(energies, expected, rtol=1e-6)
+
+    # un budget d'énergie juste suffisant ne change pas l'énergie, un budget insuffisant interrompt le calcul
+    budgeted, _, _ = _evaluate_chains(
+        *args, energy_budget=energies + 1e-3, energy_scale=coarse.time_ratio
+    )
+    np.testing.assert_array_equal(budgeted, energies)
+    budgeted, _, _ = _evaluate_chains(
+        *args, energy_budget=energies - 1.0, energy_scale=coarse.time_ratio
+    )
+    assert np.all(budgeted == np.inf)
+
+
+def test_coarse_burn_in_transfers_chain_to_full_model():
+    column = _small_column()
+    column.all_layers[0].set_priors_from_dict(
+        {
+            "Prior_IntrinK": ((1e-14, 1e-11), 5e-14),
+            "Prior_n": ((0.01, 0.25), 0.0125),
+            "Prior_lambda_s": ((1, 10), 0.5),
+            "Prior_rhos_cs": ((1e6, 1e7), 9e5),
+            "Prior_q_s": ((0, 0), 0),
+        }
+    )
+    column.compute_mcmc(
+        nb_iter=5,
+        nb_chain=1,
+        nitmaxburning=4,
+        coarse_burn_in=True,
+        coarse_nb_cells=10,
+        coarse_n_sous_ech_time=3,
+        verbose=False,
+    )
+
+    # l'énergie de l'état initial de l'échantillonnage est celle du modèle complet (sigma2 fixe, de densité 1)
+    context = SolverContext(column)
+    energy, _, _ = _evaluate_chains(
+        context,
+        column._trace.params[0, :1],
+        column._trace.sigma2_temp[0, :1],
+        np.ones(1),
+        context.id_sensors,
+        context.temp_ref,
+    )
+    np.testing.assert_allclose(column._trace.energy[0, 0], energy[0], rtol=1e-6)
+
+
+def test_vectorised_dream_proposals_match_per_chain_proposals():
+    nb_chain, nb_layer, nb_param, delta, n_draws = 10, 2, 5, 3, 1000
+    X = np.random.default_rng(1).normal(size=(nb_chain, nb_layer, nb_param)).astype(np.float32)
+    ranges = np.tile(np.array([-3.0, 3.0]), (nb_layer, nb_param, 1))
+    ranges[0, 2] = [0.5, 0.5]  # paramètre fixe
+    is_param_fixed = ranges[:, :, 1] == ranges[:, :, 0]
+    X[:, 0, 2] = 0.5
+    cr_vec = np.arange(1, 4) / 3
+    pcr = np.array([[0.2, 0.3, 0.5], [0.6, 0.3, 0.1]])
+
+    np.random.seed(0)
+    dX_loop = np.zeros((n_draws, nb_chain, nb_layer, nb_param))
+    for n in range(n_draws):
+        id_layer = np.zeros(nb_layer, np.int32)
+        for j in range(nb_chain):
+            _, dX_loop[n, j], id_layer = Column.perturbation_DREAM(
+                None, nb_chain, nb_layer, nb_param, X, id_layer, j, delta, 3, 0.1, 1e-12,
+                cr_vec, pcr, ranges, is_param_fixed,
+            )
+
+    rng = np.random.default_rng(0)
+    dX = np.zeros((n_draws, nb_chain, nb_layer, nb_param))
+    id_layer_chain = np.zeros((n_draws, nb_chain, nb_layer), np.int32)
+    for n in range(n_draws):
+        X_proposal, dX[n], id_layer_chain[n] = Column.perturbation_DREAM_chains(
+            rng, X, delta, 0.1, 1e-12, cr_vec, pcr, ranges, is_param_fixed
+        )
+        assert np.all((X_proposal >= ranges[:, :, 0]) & (X_proposal <= ranges[:, :, 1]))
+
+    # même loi que les propositions tirées chaîne par chaîne
+    for l in range(nb_layer):
+        np.testing.assert_allclose(
+            np.bincount(id_layer_chain[:, :, l].ravel(), minlength=3) / (n_draws * nb_chain),
+            pcr[l],
+            atol=0.02,
+        )
+    assert np.all(dX[:, :, 0, 2] == 0) and np.all(np.any(dX != 0, axis=3))
+    np.testing.assert_allclose(
+        np.mean(dX != 0, axis=0), np.mean(dX_loop != 0, axis=0), atol=0.08
+    )
+    np.testing.assert_allclose(
+        np.std(dX, axis=(0, 1)), np.std(dX_loop, axis=(0, 1)), rtol=0.1, atol=1e-3
+    )
+
+
+def test_dream_zs_moves_sample_gaussian_target():
+    # Metropolis à 3 chaînes sur une loi normale de variances (1, 4), sauts DREAM(ZS) et snooker tirés dans une archive
+    rng = np.random.default_rng(0)
+    std = np.array([1.0, 2.0])
+    ranges = np.tile(np.array([-50.0, 50.0]), (1, 2, 1))
+    is_param_fixed = np.zeros((1, 2), bool)
+    Z = (rng.normal(size=(200, 1, 2)) * std).astype(np.float32)
+    cr_vec, pcr = np.arange(1, 4) / 3, np.ones((1, 3)) / 3
+
+    def energy(X):
+        return 0.5 * np.sum((X[:, 0] / std) ** 2, axis=1)
+
+    X = Z[:3].copy()
+    samples = []
+    for _ in range(6000):
+        X_proposal, _, _ = Column.perturbation_DREAM_chains(
+            rng, X, 1, 0.1, 1e-6, cr_vec, pcr, ranges, is_param_fixed, Z
+        )
+        is_snooker, log_snooker = Column._snooker_proposals(
+            rng, 0.3, X, X_proposal, Z, ranges, is_param_fixed
+        )
+        assert is_snooker.any() or np.all(log_snooker == 0)
+        accept = np.log(rng.random(3)) < energy(X) - energy(X_proposal) + log_snooker
+        X[accept] = X_proposal[accept]
+        samples.append(X[:, 0].copy())
+    samples = np.concatenate(samples[1000:])
+    np.testing.assert_allclose(np.mean(samples, axis=0), 0.0, atol=0.15)
+    np.testing.assert_allclose(np.std(samples, axis=0), std, rtol=0.1)
+
+
+def test_effective_sample_size():
+    rng = np.random.default_rng(0)
+    noise = rng.normal(size=(4000, 3))
+    ar = np.zeros_like(noise)
+    for t in range(1, len(noise)):
+        ar[t] = 0.5 * ar[t - 1] + noise[t]
+    # pour un AR(1) de coefficient 0.5, ESS = n (1 - 0.5) / (1 + 0.5)
+    np.testing.assert_allclose(effective_sample_size(ar[:, :, None]), [4000.0], rtol=0.15)
+    assert np.isnan(effective_sample_size(np.ones((100, 3))))
+
+
+def test_restart_from_end_state_matches_full_simulation():
+    full = _small_column(n_times=80)
+    full.compute_solve_transi(verbose=False)
+    first = _small_column(n_times=51)
+    first.compute_solve_transi(verbose=False)
+
+    # la seconde colonne commence au dernier temps de la première et repart de son état final
+    second = _small_column(n_times=30, start=50)
+    second.set_initial_state(first.get_end_state())
+    second.compute_solve_transi(verbose=False)
+    np.testing.assert_allclose(
+        second.temperatures_solve, full.temperatures_solve[:, 50:], rtol=1e-6
+    )
+    np.testing.assert_allclose(second.flows_solve, full.flows_solve[:, 50:], rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        full.set_initial_state(first.get_end_state())
+
+
+def test_restart_from_saved_state_over_time_subrange(tmp_path):
+    full = _small_column(n_times=80)
+    full.compute_solve_transi(verbose=False)
+    path = str(tmp_path / "state.npz")
+    save_state(path, full.get_state(full.times_solve[40]))
+
+    # simulation des temps 40 à 60 seulement, depuis l'état enregistré
+    restart = full.time_subrange(end=full.times_solve[60], initial_state=load_state(path))
+    restart.compute_solve_transi(verbose=False)
+    assert restart.times_solve == full.times_solve[40:61]
+    np.testing.assert_allclose(
+        restart.temperatures_solve, full.temperatures_solve[:, 40:61], rtol=1e-6
+    )
+
+    with pytest.raises(ValueError):
+        full.get_state(full.times_solve[40] + timedelta(minutes=1))
+
+
+def test_resume_from_checkpoint_matches_uninterrupted_run(tmp_path):
+    def run(**kwargs):
+        column = _small_column()
+        column.all_layers[0].set_priors_from_dict(
+            {
+                "Prior_IntrinK": ((1e-14, 1e-11), 5e-14),
+                "Prior_n": ((0.01, 0.25), 0.0125),
+                "Prior_lambda_s": ((1, 10), 0.5),
+                "Prior_rhos_cs": ((1e6, 1e7), 9e5),
+                "Prior_q_s": ((0, 0), 0),
+            }
+        )
+        column.compute_mcmc(
+            nb_iter=8, nb_chain=7, nitmaxburning=4, threshold=0.0, **kwargs
+        )
+        return column
+
+    checkpoint = str(tmp_path / "mcmc.ckpt")
+    np.random.seed(0)
+    random.seed(0)
+    reference = run(checkpoint=checkpoint, checkpoint_every=3)
+
+    # le dernier point de reprise est celui du début de l'itération 6 : la reprise, quels que soient les
+    # états des générateurs aléatoires au moment de l'appel, refait les itérations 6 et 7 à l'identique
+    np.random.seed(1)
+    random.seed(1)
+    resumed = run(resume_from=checkpoint)
+    np.testing.assert_array_equal(resumed._trace.params, reference._trace.params)
+    np.testing.assert_array_equal(resumed._trace.energy, reference._trace.energy)
+    for quant, temperatures in reference._quantiles_temperatures.items():
+        np.testing.assert_array_equal(resumed._quantiles_temperatures[quant], temperatures)
+
+    with pytest.raises(ValueError):
+        run(resume_from=checkpoint, n_CR=2)
+
+
+def test_warm_start_continues_previous_chains():
+    def column_with_priors():
+        column = _small_column()
+        column.all_layers[0].set_priors_from_dict(
+            {
+                "Prior_IntrinK": ((1e-14, 1e-11), 5e-14),
+                "Prior_n": ((0.01, 0.25), 0.0125),
+                "Prior_lambda_s": ((1, 10), 0.5),
+                "Prior_rhos_cs": ((1e6, 1e7), 9e5),
+                "Prior_q_s": ((0, 0), 0),
+            }
+        )
+        return column
+
+    previous = column_with_priors()
+    previous.compute_mcmc(nb_iter=6, nb_chain=7, nitmaxburning=2)
+    chains = previous.get_chains_mcmc_params()
+    assert chains.shape == (6, 7, 1, 5)
+
+    column = column_with_priors()
+    column.compute_mcmc(nb_iter=3, nb_chain=7, nitmaxburning=2, warm_start=chains)
+    # chaque chaîne repart du dernier état de la chaîne correspondante, avec l'énergie de cet état
+    np.testing.assert_array_equal(column._trace.params[0], chains[-1])
+    assert np.all(column._trace.energy[0] < 1e6)
+
+
+def _small_column_with_priors():
+    column = _small_column()
+    column.all_layers[0].set_priors_from_dict(
+        {
+            "Prior_IntrinK": ((1e-14, 1e-11), 5e-14),
+            "Prior_n": ((0.01, 0.25), 0.0125),
+            "Prior_lambda_s": ((1, 10), 0.5),
+            "Prior_rhos_cs": ((1e6, 1e7), 9e5),
+            "Prior_q_s": ((0, 0), 0),
+        }
+    )
+    return column
+
+
+def test_worker_pool_matches_single_process():
+    def run(n_workers):
+        np.random.seed(0)
+        random.seed(0)
+        column = _small_column_with_priors()
+        column.compute_mcmc(
+            nb_iter=4, nb_chain=7, nitmaxburning=3, threshold=0.0, n_workers=n_workers
+        )
+        return column
+
+    reference, pooled = run(1), run(2)
+    # les processus ne font qu'évaluer les propositions : les tirages et les acceptations restent ceux du
+    # processus principal
+    np.testing.assert_array_equal(pooled._trace.params, reference._trace.params)
+    np.testing.assert_array_equal(pooled._trace.energy, reference._trace.energy)
+    np.testing.assert_array_equal(pooled._trace.accepted, reference._trace.accepted)
+    for quant, temperatures in reference._quantiles_temperatures.items():
+        np.testing.assert_array_equal(pooled._quantiles_temperatures[quant], temperatures)
+
+
+def test_delayed_acceptance_with_coarse_burn_in_and_workers():
+    np.random.seed(0)
+    random.seed(0)
+    column = _small_column_with_priors()
+    nb_iter, nb_chain = 6, 7
+    column.compute_mcmc(
+        nb_iter=nb_iter,
+        nb_chain=nb_chain,
+        nitmaxburning=3,
+        threshold=0.0,
+        delayed_acceptance=True,
+        coarse_burn_in=True,
+        coarse_nb_cells=10,
+        coarse_n_sous_ech_time=3,
+        n_workers=2,
+    )
+    assert np.isfinite(column._trace.params).all()
+    assert np.isfinite(column._trace.energy).all()
+    # un état issu d'une proposition rejetée (par le modèle grossier ou le modèle fin) répète l'état précédent de la chaîne
+    rejected = ~column._trace.accepted[1:]
+    np.testing.assert_array_equal(
+        column._trace.params[1:][rejected], column._trace.params[:-1][rejected]
+    )
+    np.testing.assert_array_equal(
+        column._trace.energy[1:][rejected], column._trace.energy[:-1][rejected]
+    )
+    assert np.all((column.all_acceptance_ratio >= 0) & (column.all_acceptance_ratio <= 1))
+    for temperatures in column._quantiles_temperatures.values():
+        assert np.isfinite(temperatures).all()